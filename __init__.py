@@ -30,50 +30,121 @@ eg.RegisterPlugin(
 )
 
 from eg.WinApi.Dynamic import RegisterWindowMessage
+import threading
 import imon, actions
 from imon import DSPNotifyCode, DSPNInitResult, DSPType
 
 # Registers a custom message type for the windows event system
 WM_IMON_DISPLAY = RegisterWindowMessage("IMON_DISPLAY")
 
+# Layer priorities of the clock and templates, under the layers actions show (0 by default)
+CLOCK_PRIORITY = -20
+TEMPLATE_PRIORITY = -10
+
+# With layers, the VFD actions write into this layer
+ACTIONS_LAYER = "actions"
+ACTIONS_PRIORITY = 0
+
 class imonHandler(object):
+    """
+    Dispatches the notifications iMON sends to the handler method named
+    after their DSPNotifyCode.
+
+    Attributes
+    ----------
+    dispatch : dict
+        Bound handler methods by raw notification code, see compile.
+    unhandled : dict
+        How many notifications without a handler arrived, by raw code.
+
+    """
 
     def __init__(self, plugin):
         self.plugin = plugin
+        self.unhandled = {}
+        self.compile()
+
+    def compile(self):
+        """
+        Builds the dispatch table, so handling a notification is a single
+        dict lookup on the raw wParam.
+        """
+        self.dispatch = dict(
+            (member.value, getattr(self, name))
+            for name, member in DSPNotifyCode.members.iteritems()
+            if hasattr(self, name)
+        )
 
-    def handle(self, notifyCode, payload):
+    def handle(self, wParam, payload):
+        """
+        Calls the handler of a notification.
+
+        Parameters
+        ----------
+        wParam : int
+            The raw notification code.
+        payload : int
+            The lParam of the notification.
+
+        """
         try:
-            notify = getattr(self, notifyCode.name)
-        except AttributeError:
-            self.plugin.PrintError("Unhandled Display Notification: " + str(notifyCode.name))
-        else:
-            notify(payload)
+            notify = self.dispatch[wParam]
+        except (KeyError, TypeError):
+            # counted, not printed, so a burst of them stays cheap
+            self.unhandled[wParam] = self.unhandled.get(wParam, 0) + 1
+            return
+        notify(payload)
 
     def DSPNM_PLUGIN_SUCCEED(self, payload):
         displayType = DSPType(payload)
+        self.plugin.connection.pluginSucceed()
+        # writes the last frame again if the display was lost, off this thread
+        self.plugin.display.submit(self.plugin.supervisor.succeeded)
         self.plugin.TriggerEvent("imon.connected")
 
     def DSPNM_PLUGIN_FAILED(self, payload):
         cause = DSPNInitResult(payload)
+        self.plugin.connection.pluginFailed()
+        self.plugin.supervisor.lost(cause.name)
         self.plugin.PrintError("iMON Plugin Failure: " + str(cause.name))
         self.plugin.TriggerEvent("failure")
 
     def DSPNM_IMON_RESTARTED(self, payload):
         displayType = DSPType(payload)
+        # iMON redraws its own screen on restart, so our shadow is stale.
+        imon.invalidateShadow()
+        self.plugin.connection.imonRestarted()
+        self.plugin.supervisor.lost("DSPNM_IMON_RESTARTED")
+        if self.plugin.connection.isConnected():
+            # still in plugin mode, no DSPNM_PLUGIN_SUCCEED is coming
+            self.plugin.display.submit(self.plugin.supervisor.succeeded)
         self.plugin.TriggerEvent("imon.restarted", str(displayType.name))
 
     def DSPNM_IMON_CLOSED(self, payload):
+        self.plugin.connection.imonClosed()
+        self.plugin.supervisor.lost("DSPNM_IMON_CLOSED")
         self.plugin.TriggerEvent("imon.disconnected")
 
     def DSPNM_HW_CONNECTED(self, payload):
         displayType = DSPType(payload)
+        # freshly connected hardware starts out blank.
+        imon.invalidateShadow()
+        self.plugin.connection.hwConnected()
+        if self.plugin.connection.isConnected():
+            self.plugin.display.submit(self.plugin.supervisor.succeeded)
+        else:
+            self.plugin.supervisor.retryNow()
         self.plugin.TriggerEvent("hardware.connected")
 
     def DSPNM_HW_DISCONNECTED(self, payload):
         cause = DSPNInitResult(payload)
+        self.plugin.connection.hwDisconnected()
+        self.plugin.supervisor.lost("DSPNM_HW_DISCONNECTED")
         self.plugin.TriggerEvent("hardware.disconnected")
 
     def DSPNM_LCD_TEXT_SCROLL_DONE(self, payload):
+        # push the next queued text before anything else
+        self.plugin.lcdQueue.scrollDone()
         self.plugin.TriggerEvent("scroll.complete")
 
 
@@ -91,9 +162,14 @@ class IMONDisplay(eg.PluginBase):
 
     """
 
+    # Choices of the confirmation event settings, in EventMode order
+    eventModes = ("Event for every write", "No events", "Periodic summary event")
+
     def __init__(self):
         """Constructor. Initializes the plugin."""
         self.imonHandler = imonHandler(self)
+        # cached connection state, so actions don't need to ask the DLL.
+        self.connection = imon.Connection(imon)
         #include imon so for actions
         self.imon = imon
         # Set up actions
@@ -104,30 +180,372 @@ class IMONDisplay(eg.PluginBase):
         vfdGroup.AddAction(actions.vfd.SetVfdText)
         vfdGroup.AddAction(actions.vfd.SetVfdEqData)
         vfdGroup.AddAction(actions.vfd.ShowTime)
+        vfdGroup.AddAction(actions.vfd.ScrollVfdText)
+        vfdGroup.AddAction(actions.vfd.StartClock)
+        vfdGroup.AddAction(actions.vfd.StopClock)
+        lcdGroup = self.AddGroup(
+            "LCD Displays",
+            "Actions specifically for LCD Type Displays"
+        )
+        lcdGroup.AddAction(actions.lcd.QueueLcdText)
+        templateGroup = self.AddGroup(
+            "Templates",
+            "Actions showing text templates kept up to date from event payloads"
+        )
+        templateGroup.AddAction(actions.template.SetDisplayTemplates)
+        templateGroup.AddAction(actions.template.UpdateTemplateVariables)
+        layerGroup = self.AddGroup(
+            "Layers",
+            "Actions showing content in priority layers, such as overlays that expire by themselves"
+        )
+        layerGroup.AddAction(actions.layer.ShowLayer)
+        layerGroup.AddAction(actions.layer.RemoveLayer)
+        statsGroup = self.AddGroup(
+            "Diagnostics",
+            "Actions for measuring the display"
+        )
+        statsGroup.AddAction(actions.stats.DumpStats)
 
-    def __start__(self):
+    def __start__(self, maxFps=30, backend="", lcdQueueTimeout=15, rateLimit=True,
+                  instrument=False, statsInterval=0, recordPath="", confirmEvents=0, summaryInterval=5,
+                  composeLayers=False):
         """Called when the plugin is actived."""
+        # blank means the default, the IMON_BACKEND environment variable or the DLL
+        imon.useBackend(backend or None)
+        # writes every api call and notification to a log, for replay
+        if recordPath:
+            try:
+                imon.useRecorder(imon.Recorder(recordPath))
+            except Exception, msg:
+                eg.PrintError("Unable to record display traffic: " + str(msg))
+        # records call counts, errors and latencies of every DLL call
+        imon.useInstrumentation(instrument)
+        self.statsInterval = statsInterval
+        self.statsTimer = None
+        if instrument and statsInterval:
+            self.ScheduleStatsEvent()
+        # keeps bursts of triggers from flooding iMON Manager
+        if rateLimit:
+            imon.useRateLimiter(imon.RateLimiter(onError=self.OnRateLimitError))
+        # events confirming writes, or summaries of them
+        self.events = imon.EventBatcher(self.TriggerEvent, imon.EventMode(confirmEvents), summaryInterval)
+        # makes the actions' writes, so action threads never wait on the DLL
+        self.display = imon.DisplayWorker(imon)
+        self.display.start()
+        # The render loop lets scripts post high frequency updates (such as eq
+        # data from an audio source) without blocking on the DLL. Its thread
+        # starts with the first post.
+        self.renderer = imon.RenderLoop(imon, maxFps, self.OnRenderError)
+        self.renderer.start(lazy=True)
+        # priority layers, resolved into what the display shows
+        self.compositor = imon.Compositor(imon, self.OnCompositorError, self.OnLayerExpired)
+        # with layers, the clock and templates are layers under the ones
+        # actions show, instead of giving way to every other write
+        self.composeLayers = composeLayers
+        if composeLayers:
+            self.compositor.start()
+        # what the VFD actions write through, see ClaimVfd
+        self.vfd = self.compositor.target(ACTIONS_LAYER, ACTIONS_PRIORITY, None) if composeLayers else imon
+        # scrolls VFD lines too long for the display, its frames don't keep
+        # the actions layer showing
+        self.scroller = imon.VfdScroller(
+            self.compositor.target(ACTIONS_LAYER, ACTIONS_PRIORITY, None, renew=False) if composeLayers else imon,
+            onError=self.OnScrollError)
+        # a clock that redraws itself when its text changes
+        self.clock = imon.VfdClock(self.compositor.target("clock", CLOCK_PRIORITY) if composeLayers else imon,
+                                   onError=self.OnClockError, onResume=self.OnClockResumed)
+        self.clockResumeAfter = 0
+        # bar graph meters of Set VFD Text, by their settings
+        self.meters = {}
+        # LCD text shown one after the other, as each finishes scrolling
+        self.lcdQueue = imon.LcdTextQueue(imon, lcdQueueTimeout, self.OnLcdQueueError)
+        # text templates, written again as the variables they use change
+        self.templates = imon.DisplayTemplates(
+            self.compositor.target("templates", TEMPLATE_PRIORITY) if composeLayers else imon)
+        # calls init again whenever the display is lost, and restores it
+        self.supervisor = imon.ReconnectSupervisor(imon, self.connection, eg.messageReceiver.hwnd,
+            WM_IMON_DISPLAY, self.OnRecovered, self.OnRestoreError)
         # Set up the message receiver in order to watch for messages from imon manager
         eg.messageReceiver.AddHandler(WM_IMON_DISPLAY, self.imonWndProc)
         # Attempt to connect tp imon
 
         try:
+            displayBackend = imon.getBackend()
+            if hasattr(displayBackend, 'onNotify'):
+                # backends that can't post window messages (the simulator) call us directly
+                displayBackend.onNotify = self.OnBackendNotify
             result = imon.init(eg.messageReceiver.hwnd, WM_IMON_DISPLAY)
+            self.connection.initialized()
             self.TriggerEvent("init", result.name)
         except Exception, msg:
             eg.PrintError("Unable to Initialize Display API: " + str(msg))
+            self.supervisor.lost(str(msg))
 
     def __stop__(self):
         """Called when the plugin is deactivated."""
+        # no more notifications, their handlers submit to the display worker stopped below
+        eg.messageReceiver.RemoveHandler(WM_IMON_DISPLAY, self.imonWndProc)
+        displayBackend = imon.getBackend()
+        if getattr(displayBackend, 'onNotify', None) == self.OnBackendNotify:
+            displayBackend.onNotify = None
+        self.supervisor.stop()
+        # write whatever is still pending before letting go of the display.
+        self.renderer.stop()
+        self.scroller.stop()
+        self.clock.stop()
+        self.compositor.stop()
+        self.lcdQueue.stop()
+        self.display.stop()
+        self.events.stop()
+        imon.useRateLimiter(None)
+        if self.statsTimer is not None:
+            self.statsTimer.cancel()
+            self.statsTimer = None
         # Make sure to disconnect.
         try:
             result = imon.unInit()
+            self.connection.uninitialized()
             self.TriggerEvent("uninit", result.name)
         except Exception, msg:
             eg.PrintError(str(msg))
+        imon.useRecorder(None)
 
-        #destroy the handler
-        eg.messageReceiver.RemoveHandler(WM_IMON_DISPLAY, self.imonWndProc)
+        unhandled = self.imonHandler.unhandled
+        if unhandled:
+            self.PrintError("Unhandled Display Notifications (code: count): " +
+                ", ".join("%s: %d" % item for item in sorted(unhandled.items())))
+            unhandled.clear()
+
+    def Configure(self, maxFps=30, backend="", lcdQueueTimeout=15, rateLimit=True,
+                  instrument=False, statsInterval=0, recordPath="", confirmEvents=0, summaryInterval=5,
+                  composeLayers=False):
+        panel = eg.ConfigPanel()
+        maxFpsControl = panel.SpinIntCtrl(maxFps, min=1, max=100)
+        backendControl = panel.TextCtrl(backend)
+        lcdQueueTimeoutControl = panel.SpinIntCtrl(lcdQueueTimeout, min=1, max=600)
+        rateLimitControl = panel.CheckBox(rateLimit, "Limit how often each display function is called")
+        instrumentControl = panel.CheckBox(instrument, "Record call counts, errors and latencies")
+        statsIntervalControl = panel.SpinIntCtrl(statsInterval, min=0, max=86400)
+        recordPathControl = panel.FileBrowseButton(recordPath, fileMask="*.imonrec")
+        confirmEventsControl = panel.Choice(confirmEvents, self.eventModes)
+        summaryIntervalControl = panel.SpinIntCtrl(summaryInterval, min=1, max=3600)
+        composeLayersControl = panel.CheckBox(composeLayers, "Show the clock and templates as layers")
+
+        renderBox = panel.BoxedGroup(
+            "Render Loop",
+            ("Max Frames per Second", maxFpsControl),
+            ("Rate Limiting", rateLimitControl),
+        )
+        eg.EqualizeWidths(renderBox.GetColumnItems(0))
+        panel.sizer.Add(renderBox, 0, wx.EXPAND)
+
+        backendBox = panel.BoxedGroup(
+            "Display API Backend (blank for default)",
+            ("Backend", backendControl),
+        )
+        eg.EqualizeWidths(backendBox.GetColumnItems(0))
+        panel.sizer.Add(backendBox, 0, wx.EXPAND)
+
+        statsBox = panel.BoxedGroup(
+            "Instrumentation",
+            ("Instrument", instrumentControl),
+            ("Seconds between stats events (0 = none)", statsIntervalControl),
+            ("Record display traffic to (blank = off)", recordPathControl),
+        )
+        eg.EqualizeWidths(statsBox.GetColumnItems(0))
+        panel.sizer.Add(statsBox, 0, wx.EXPAND)
+
+        eventsBox = panel.BoxedGroup(
+            "Write Confirmation Events",
+            ("Events", confirmEventsControl),
+            ("Seconds between summary events", summaryIntervalControl),
+        )
+        eg.EqualizeWidths(eventsBox.GetColumnItems(0))
+        panel.sizer.Add(eventsBox, 0, wx.EXPAND)
+
+        layersBox = panel.BoxedGroup(
+            "Layers",
+            ("Clock and Templates", composeLayersControl),
+        )
+        eg.EqualizeWidths(layersBox.GetColumnItems(0))
+        panel.sizer.Add(layersBox, 0, wx.EXPAND)
+
+        lcdQueueBox = panel.BoxedGroup(
+            "LCD Text Queue",
+            ("Seconds to wait for scrolling to finish", lcdQueueTimeoutControl),
+        )
+        eg.EqualizeWidths(lcdQueueBox.GetColumnItems(0))
+        panel.sizer.Add(lcdQueueBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                maxFpsControl.GetValue(),
+                backendControl.GetValue(),
+                lcdQueueTimeoutControl.GetValue(),
+                rateLimitControl.GetValue(),
+                instrumentControl.GetValue(),
+                statsIntervalControl.GetValue(),
+                recordPathControl.GetValue(),
+                confirmEventsControl.GetValue(),
+                summaryIntervalControl.GetValue(),
+                composeLayersControl.GetValue()
+            )
+
+    def ClaimVfd(self, layer=ACTIONS_LAYER):
+        """
+        Called by actions about to write to the VFD, stops scrolling and
+        pauses the clock, which comes back after clockResumeAfter seconds.
+
+        With layers, the clock keeps running underneath instead, and the
+        actions writing through self.vfd show in the actions layer, for
+        clockResumeAfter seconds (0 = until the clock or templates take the
+        VFD again).
+
+        Parameters
+        ----------
+        layer : string
+            The layer the caller writes into with layers, "clock" or
+            "templates" drop the actions layer so it shows.
+
+        """
+        self.scroller.stop()
+        if not self.composeLayers:
+            self.clock.pause(self.clockResumeAfter)
+        elif layer == ACTIONS_LAYER:
+            # shows for clockResumeAfter seconds from now
+            self.compositor.put(ACTIONS_LAYER, {}, ACTIONS_PRIORITY, self.clockResumeAfter)
+        else:
+            self.compositor.remove(ACTIONS_LAYER)
+
+    def SubmitWrite(self, eventName, errorMessage, eventMode, function, *args):
+        """
+        Makes an api write on the display worker thread, through the
+        connection so it gets retried if need be, without waiting for it.
+
+        Parameters
+        ----------
+        eventName : string
+            Confirms the write once it succeeded, see EventBatcher.
+        errorMessage : string
+            Printed, followed by the error, if it failed.
+        eventMode : EnumMember
+            The EventMode of the confirmation, None for the plugin setting.
+        function : callable
+            The api function.
+        *args :
+            The arguments passed to the function.
+
+        Returns
+        -------
+        DisplayFuture
+
+        """
+        def done(future):
+            exception = future.exception()
+            if exception is not None:
+                self.PrintError(errorMessage + str(exception))
+                self.events.error(eventName, eventMode)
+            else:
+                self.events.confirm(eventName, args, eventMode)
+        future = self.display.submit(self.connection.call, function, *args)
+        future.addDoneCallback(done)
+        return future
+
+    def OnRenderError(self, function, msg):
+        """Called from the render loop thread when a posted write fails."""
+        self.PrintError("Unable to render " + function + ": " + str(msg))
+
+    def OnScrollError(self, msg):
+        """Called from the scroller thread when a write fails."""
+        self.PrintError("Unable to scroll text: " + str(msg))
+
+    def OnRecovered(self, recovery):
+        """
+        Called once the display is back after being lost, triggers the
+        imon.recovered event with the recovery (seconds, attempts, restored
+        and cause) as its payload.
+        """
+        # queued LCD text that failed while the display was gone
+        self.lcdQueue.retry()
+        self.TriggerEvent("imon.recovered", recovery)
+
+    def OnRestoreError(self, msg):
+        """Called when the last frame can't be written again after a recovery."""
+        self.PrintError("Unable to restore the display: " + str(msg))
+
+    def OnCompositorError(self, msg):
+        """Called from the compositor thread when a write fails."""
+        self.PrintError("Unable to show layers: " + str(msg))
+
+    def OnLayerExpired(self, name):
+        """
+        Called from the compositor thread when a layer expires. Once the
+        actions layer does, the text it was scrolling stops.
+        """
+        if name == ACTIONS_LAYER:
+            self.scroller.stop()
+
+    def OnClockError(self, msg):
+        """Called from the clock thread when a write fails."""
+        self.PrintError("Unable to update the clock: " + str(msg))
+
+    def OnClockResumed(self):
+        """
+        Called from the clock thread when it comes back after
+        clockResumeAfter seconds, stops the text scrolling in its place.
+        """
+        self.scroller.stop()
+
+    def OnLcdQueueError(self, msg):
+        """Called when queued LCD text can't be shown."""
+        self.PrintError("Unable to display queued text: " + str(msg))
+
+    def OnRateLimitError(self, entryPoint, msg):
+        """Called when a write held back by the rate limiter fails."""
+        self.PrintError("Unable to write to " + entryPoint + ": " + str(msg))
+
+    def GetRateLimitStats(self):
+        """
+        Returns
+        -------
+        dict
+            Throttled counts and effective rates by entry point, empty when
+            rate limiting is off.
+
+        """
+        limiter = imon.getRateLimiter()
+        if limiter is None:
+            return {}
+        return limiter.getStats()
+
+    def ScheduleStatsEvent(self):
+        """Triggers the stats event statsInterval seconds from now."""
+        self.statsTimer = threading.Timer(self.statsInterval, self.OnStatsTimer)
+        self.statsTimer.daemon = True
+        self.statsTimer.start()
+
+    def OnStatsTimer(self):
+        """Triggers the stats event, its payload the instrumentation summary."""
+        stats = imon.getCallStats()
+        if stats is None or self.statsTimer is None:
+            return
+        calls, errors = stats.totals()
+        self.TriggerEvent("stats", {'calls': calls, 'errors': errors, 'functions': stats.summary()})
+        self.ScheduleStatsEvent()
+
+    def GetRenderStats(self):
+        """
+        Returns
+        -------
+        dict
+            Frames posted / flushed / dropped statistics of the render loop.
+
+        """
+        return self.renderer.getStats()
+
+    def OnBackendNotify(self, wParam, lParam):
+        """Receives notifications from backends that don't send window messages."""
+        self.imonWndProc(None, None, wParam, lParam)
 
     def imonWndProc(self, dummyHwnd, dummyMesg, wParam=None, lParam=None):
         """
@@ -152,7 +570,7 @@ class IMONDisplay(eg.PluginBase):
 
         """
 
-        notifyCode = DSPNotifyCode(wParam)
-        self.imonHandler.handle(notifyCode, lParam)
+        imon.recordNotification(wParam, lParam)
+        self.imonHandler.handle(wParam, lParam)
 
         return 1
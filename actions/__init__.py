@@ -1 +1,5 @@
 import vfd
+import lcd
+import stats
+import template
+import layer
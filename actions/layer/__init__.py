@@ -0,0 +1,2 @@
+from showlayer import ShowLayer
+from removelayer import RemoveLayer
@@ -0,0 +1,22 @@
+class RemoveLayer(eg.ActionBase):
+    name = "Remove Layer"
+    description = "Removes a layer shown by Show Layer, showing the layers underneath again"
+    iconFile = "icon_display"
+
+    def __call__(self, layer="overlay"):
+        self.plugin.compositor.remove(layer)
+
+    def Configure(self, layer="overlay"):
+
+        panel = eg.ConfigPanel()
+        layerControl = panel.TextCtrl(layer)
+
+        layerBox = panel.BoxedGroup(
+            "Layer",
+            ("Name", layerControl),
+        )
+        eg.EqualizeWidths(layerBox.GetColumnItems(0))
+        panel.sizer.Add(layerBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(layerControl.GetValue())
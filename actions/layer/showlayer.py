@@ -0,0 +1,65 @@
+class ShowLayer(eg.ActionBase):
+    name = "Show Layer"
+    description = (
+        "Shows text in a named layer. The layer with the highest priority shows, "
+        "and a layer with a time to live goes away by itself, showing the layers underneath again"
+    )
+    iconFile = "icon_display"
+
+    def __call__(self, layer="overlay", priority=10, ttl=5, line1="", line2="", lcdText=""):
+        contents = {}
+        if line1:
+            contents['vfdLine1'] = line1
+        if line2:
+            contents['vfdLine2'] = line2
+        if lcdText:
+            contents['lcdText'] = lcdText
+        try:
+            if not self.plugin.composeLayers:
+                # the other actions write around the compositor, an expired
+                # layer would blank what they wrote instead of showing it again
+                raise Exception, "Layers are off, check \"Show the clock and templates as layers\" in the plugin settings"
+            if self.plugin.connection.isConnected():
+                self.plugin.compositor.put(layer, contents, priority, ttl)
+            else:
+                raise Exception, "Not Connected"
+        except Exception, msg:
+            self.PrintError("Unable to show layer: " + str(msg))
+
+    def Configure(self, layer="overlay", priority=10, ttl=5, line1="", line2="", lcdText=""):
+
+        panel = eg.ConfigPanel()
+        layerControl = panel.TextCtrl(layer)
+        priorityControl = panel.SpinIntCtrl(priority, min=-100, max=100)
+        ttlControl = panel.SpinIntCtrl(ttl, min=0, max=86400)
+        line1Control = panel.TextCtrl(line1)
+        line2Control = panel.TextCtrl(line2)
+        lcdTextControl = panel.TextCtrl(lcdText)
+
+        layerBox = panel.BoxedGroup(
+            "Layer",
+            ("Name", layerControl),
+            ("Priority", priorityControl),
+            ("Seconds to show (0 = until removed)", ttlControl),
+        )
+        eg.EqualizeWidths(layerBox.GetColumnItems(0))
+        panel.sizer.Add(layerBox, 0, wx.EXPAND)
+
+        contentsBox = panel.BoxedGroup(
+            "Text (blank = show the layers underneath)",
+            ("VFD Line 1", line1Control),
+            ("VFD Line 2", line2Control),
+            ("LCD Text", lcdTextControl),
+        )
+        eg.EqualizeWidths(contentsBox.GetColumnItems(0))
+        panel.sizer.Add(contentsBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                layerControl.GetValue(),
+                priorityControl.GetValue(),
+                ttlControl.GetValue(),
+                line1Control.GetValue(),
+                line2Control.GetValue(),
+                lcdTextControl.GetValue()
+            )
@@ -0,0 +1 @@
+from queuelcdtext import QueueLcdText
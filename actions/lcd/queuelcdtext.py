@@ -0,0 +1,36 @@
+class QueueLcdText(eg.ActionBase):
+    name = "Queue LCD Text"
+    description = "Queues Text for an LCD Display, shown once the text before it is done scrolling"
+    iconFile = "icon_display"
+
+    def __call__(self, text="", priority=0, ttl=0):
+        try:
+            if self.plugin.connection.isConnected():
+                self.plugin.lcdQueue.push(text, priority, ttl or None)
+            else:
+                raise Exception, "Not Connected"
+        except Exception, msg:
+            self.PrintError("Unable to queue text: " + str(msg))
+
+    def Configure(self, text="", priority=0, ttl=0):
+
+        panel = eg.ConfigPanel()
+        textControl = panel.TextCtrl(text)
+        priorityControl = panel.SpinIntCtrl(priority, min=-100, max=100)
+        ttlControl = panel.SpinIntCtrl(ttl, min=0, max=86400)
+
+        queueBox = panel.BoxedGroup(
+            "Queued Text",
+            ("Text", textControl),
+            ("Priority (higher first)", priorityControl),
+            ("Drop if not shown within (seconds, 0 = never)", ttlControl),
+        )
+        eg.EqualizeWidths(queueBox.GetColumnItems(0))
+        panel.sizer.Add(queueBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                textControl.GetValue(),
+                priorityControl.GetValue(),
+                ttlControl.GetValue()
+            )
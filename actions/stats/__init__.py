@@ -0,0 +1 @@
+from dumpstats import DumpStats
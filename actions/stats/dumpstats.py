@@ -0,0 +1,45 @@
+import json
+
+class DumpStats(eg.ActionBase):
+    name = "Dump Display Stats"
+    description = "Writes call counts, errors and latencies of every display function to the log or a JSON file"
+    iconFile = "icon_display"
+
+    def __call__(self, toFile=False, path=""):
+        try:
+            stats = self.plugin.imon.getCallStats()
+            if stats is None:
+                raise Exception, "Instrumentation is turned off in the plugin settings"
+            summary = stats.summary()
+            if toFile:
+                with open(path, 'w') as statsFile:
+                    json.dump(summary, statsFile, indent=2, sort_keys=True)
+                return summary
+            for entryPoint in sorted(summary):
+                entry = summary[entryPoint]
+                eg.Print("%s: %d calls, mean %.2f ms, p95 %.2f ms, max %.2f ms, errors %s" % (
+                    entryPoint, entry['calls'], entry['meanMs'], entry['p95Ms'], entry['maxMs'],
+                    ", ".join("%s %d" % error for error in sorted(entry['errors'].items())) or "none"))
+            return summary
+        except Exception, msg:
+            self.PrintError("Unable to dump stats: " + str(msg))
+
+    def Configure(self, toFile=False, path=""):
+
+        panel = eg.ConfigPanel()
+        toFileControl = panel.CheckBox(toFile, "Write to a JSON file instead of the log")
+        pathControl = panel.FileBrowseButton(path, fileMask="*.json")
+
+        statsBox = panel.BoxedGroup(
+            "Output",
+            ("JSON File", toFileControl),
+            ("Path", pathControl),
+        )
+        eg.EqualizeWidths(statsBox.GetColumnItems(0))
+        panel.sizer.Add(statsBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                toFileControl.GetValue(),
+                pathControl.GetValue()
+            )
@@ -0,0 +1,2 @@
+from setdisplaytemplates import SetDisplayTemplates
+from updatetemplatevariables import UpdateTemplateVariables
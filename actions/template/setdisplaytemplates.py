@@ -0,0 +1,43 @@
+class SetDisplayTemplates(eg.ActionBase):
+    name = "Set Display Templates"
+    description = (
+        "Shows templates such as {artist} or {elapsed!t:%M:%S} {volume}% on the VFD lines and the LCD, "
+        "kept up to date by Update Template Variables"
+    )
+    iconFile = "icon_display"
+
+    def __call__(self, vfd1="", vfd2="", lcd=""):
+        try:
+            if self.plugin.connection.isConnected():
+                if vfd1 or vfd2:
+                    # the templates replace anything scrolling, and the clock
+                    self.plugin.ClaimVfd("templates")
+                self.plugin.SubmitWrite("template.setTemplates", "Unable to display templates: ", None,
+                                        self.plugin.templates.setTemplates, vfd1, vfd2, lcd)
+            else:
+                raise Exception, "Not Connected"
+        except Exception, msg:
+            self.PrintError("Unable to display templates: " + str(msg))
+
+    def Configure(self, vfd1="", vfd2="", lcd=""):
+
+        panel = eg.ConfigPanel()
+        vfd1Control = panel.TextCtrl(vfd1)
+        vfd2Control = panel.TextCtrl(vfd2)
+        lcdControl = panel.TextCtrl(lcd)
+
+        templatesBox = panel.BoxedGroup(
+            "Templates (blank = leave alone)",
+            ("VFD Line 1", vfd1Control),
+            ("VFD Line 2", vfd2Control),
+            ("LCD Text", lcdControl),
+        )
+        eg.EqualizeWidths(templatesBox.GetColumnItems(0))
+        panel.sizer.Add(templatesBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                vfd1Control.GetValue(),
+                vfd2Control.GetValue(),
+                lcdControl.GetValue()
+            )
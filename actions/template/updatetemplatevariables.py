@@ -0,0 +1,55 @@
+class UpdateTemplateVariables(eg.ActionBase):
+    name = "Update Template Variables"
+    description = (
+        "Sets template variables from the payload of the event, or a value, "
+        "writing only the lines using the ones that changed"
+    )
+    iconFile = "icon_display"
+
+    def __call__(self, variable="", value="", usePayload=True):
+        try:
+            if usePayload:
+                payload = eg.event.payload
+                if isinstance(payload, dict) and not variable:
+                    # a dict payload sets every variable in it
+                    values = payload
+                elif variable:
+                    values = {variable: payload}
+                else:
+                    raise Exception, "The payload isn't a dict, and no variable is given"
+            elif variable:
+                values = {variable: eg.ParseString(value)}
+            else:
+                raise Exception, "No variable is given"
+            if self.plugin.connection.isConnected():
+                if self.plugin.templates.usesVfd(values):
+                    self.plugin.ClaimVfd("templates")
+                self.plugin.SubmitWrite("template.update", "Unable to update templates: ", None,
+                                        self.plugin.templates.update, values)
+            else:
+                raise Exception, "Not Connected"
+        except Exception, msg:
+            self.PrintError("Unable to update templates: " + str(msg))
+
+    def Configure(self, variable="", value="", usePayload=True):
+
+        panel = eg.ConfigPanel()
+        variableControl = panel.TextCtrl(variable)
+        valueControl = panel.TextCtrl(value)
+        usePayloadControl = panel.CheckBox(usePayload, "Use the event payload as the value")
+
+        variablesBox = panel.BoxedGroup(
+            "Variable (blank to set every variable of a dict payload)",
+            ("Variable", variableControl),
+            ("Value", valueControl),
+            ("Payload", usePayloadControl),
+        )
+        eg.EqualizeWidths(variablesBox.GetColumnItems(0))
+        panel.sizer.Add(variablesBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                variableControl.GetValue(),
+                valueControl.GetValue(),
+                usePayloadControl.GetValue()
+            )
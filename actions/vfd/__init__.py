@@ -1,3 +1,6 @@
 from setvfdeq import SetVfdEqData
 from setvfdtext import SetVfdText
 from showtime import ShowTime
+from scrollvfdtext import ScrollVfdText
+from startclock import StartClock
+from stopclock import StopClock
@@ -0,0 +1,55 @@
+class ScrollVfdText(eg.ActionBase):
+    name = "Scroll VFD Text"
+    description = "Displays Text on a VFD Display, scrolling lines longer than 16 characters"
+    iconFile = "icon_display"
+
+    modes = ("Marquee", "Bounce", "Page")
+
+    def __call__(self, line1="", line2="", mode1=0, mode2=0, rate1=4.0, rate2=4.0):
+        try:
+            if self.plugin.connection.isConnected():
+                self.plugin.ClaimVfd()
+                scroller = self.plugin.scroller
+                scroller.setLine(0, line1, self.plugin.imon.ScrollMode(mode1), rate1)
+                scroller.setLine(1, line2, self.plugin.imon.ScrollMode(mode2), rate2)
+                self.plugin.events.confirm("vfd.setVfdText", (line1, line2))
+            else:
+                raise Exception, "Not Connected"
+        except Exception, msg:
+            self.PrintError("Unable to display text: " + str(msg))
+
+    def Configure(self, line1="", line2="", mode1=0, mode2=0, rate1=4.0, rate2=4.0):
+
+        panel = eg.ConfigPanel()
+        line1Control = panel.TextCtrl(line1)
+        mode1Control = panel.Choice(mode1, self.modes)
+        rate1Control = panel.SpinNumCtrl(rate1, min=0.1, max=50, increment=0.5, fractionWidth=1)
+        line2Control = panel.TextCtrl(line2)
+        mode2Control = panel.Choice(mode2, self.modes)
+        rate2Control = panel.SpinNumCtrl(rate2, min=0.1, max=50, increment=0.5, fractionWidth=1)
+
+        line1Box = panel.BoxedGroup(
+            "Line 1",
+            ("Text", line1Control),
+            ("Scroll Mode", mode1Control),
+            ("Frames per Second", rate1Control),
+        )
+        line2Box = panel.BoxedGroup(
+            "Line 2",
+            ("Text", line2Control),
+            ("Scroll Mode", mode2Control),
+            ("Frames per Second", rate2Control),
+        )
+        eg.EqualizeWidths(line1Box.GetColumnItems(0) + line2Box.GetColumnItems(0))
+        panel.sizer.Add(line1Box, 0, wx.EXPAND)
+        panel.sizer.Add(line2Box, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                line1Control.GetValue(),
+                line2Control.GetValue(),
+                mode1Control.GetSelection(),
+                mode2Control.GetSelection(),
+                rate1Control.GetValue(),
+                rate2Control.GetValue()
+            )
@@ -19,7 +19,8 @@ class SetVfdEqData(eg.ActionBase):
                   eq13=0,
                   eq14=0,
                   eq15=0,
-                  eq16=0):
+                  eq16=0,
+                  events=0):
         eqdata = {
             1:eq1,
             2:eq2,
@@ -39,9 +40,12 @@ class SetVfdEqData(eg.ActionBase):
             16:eq16
         }
         try:
-            if self.plugin.imon.isInited() and self.plugin.imon.isPluginModeEnabled():
-                result = self.plugin.imon.setVfdEqData(eqdata)
-                self.plugin.TriggerEvent("vfd.setVfdEqData")
+            if self.plugin.connection.isConnected():
+                # the equalizer replaces anything scrolling, and the clock
+                self.plugin.ClaimVfd()
+                eventMode = self.plugin.imon.EventMode(events - 1) if events else None
+                self.plugin.SubmitWrite("vfd.setVfdEqData", "Unable to display eq: ", eventMode,
+                                        self.plugin.vfd.setVfdEqData, eqdata)
             else:
                 raise Exception, "Not Connected"
         except Exception, msg:
@@ -63,7 +67,8 @@ class SetVfdEqData(eg.ActionBase):
                   eq13=0,
                   eq14=0,
                   eq15=0,
-                  eq16=0):
+                  eq16=0,
+                  events=0):
 
         panel = eg.ConfigPanel()
         eqctl1 = panel.SpinIntCtrl(eq1, min=0, max=100)
@@ -82,6 +87,7 @@ class SetVfdEqData(eg.ActionBase):
         eqctl14 = panel.SpinIntCtrl(eq14, min=0, max=100)
         eqctl15 = panel.SpinIntCtrl(eq15, min=0, max=100)
         eqctl16 = panel.SpinIntCtrl(eq16, min=0, max=100)
+        eventsControl = panel.Choice(events, ("Plugin default",) + self.plugin.eventModes)
 
         bandsBox = panel.BoxedGroup(
             "Bands (1-16)",
@@ -105,6 +111,13 @@ class SetVfdEqData(eg.ActionBase):
         eg.EqualizeWidths(bandsBox.GetColumnItems(0))
         panel.sizer.Add(bandsBox, 0, wx.EXPAND)
 
+        eventsBox = panel.BoxedGroup(
+            "Events",
+            ("Confirmation Event", eventsControl),
+        )
+        eg.EqualizeWidths(eventsBox.GetColumnItems(0))
+        panel.sizer.Add(eventsBox, 0, wx.EXPAND)
+
         while panel.Affirmed():
             panel.SetResult(
                 eqctl1.GetValue(),
@@ -122,5 +135,6 @@ class SetVfdEqData(eg.ActionBase):
                 eqctl13.GetValue(),
                 eqctl14.GetValue(),
                 eqctl15.GetValue(),
-                eqctl16.GetValue()
+                eqctl16.GetValue(),
+                eventsControl.GetValue()
             )
@@ -1,35 +1,83 @@
 class SetVfdText(eg.ActionBase):
     name = "Set VFD Text"
-    description = "Displays Text on a VFD Display"
+    description = "Displays Text on a VFD Display, or text and a bar graph meter of a value"
     iconFile = "icon_display"
 
-    def __call__(self, line1="", line2=""):
+    # Choices of the mode setting
+    modes = ("Text", "Meter on line 2 (line 2 is its label)")
+
+    def __call__(self, line1="", line2="", events=0, mode=0, value="", minimum=0, maximum=100, glyphs=0, percent=True):
         try:
-            if self.plugin.imon.isInited() and self.plugin.imon.isPluginModeEnabled():
-                result = self.plugin.imon.setVfdText(line1, line2)
-                self.plugin.TriggerEvent("vfd.setVfdText")
+            if self.plugin.connection.isConnected():
+                if mode == 1:
+                    meter = self.GetMeter(line2, minimum, maximum, glyphs, percent)
+                    text = meter.update(eg.ParseString(value))
+                    if text is None and self.plugin.imon.shadow.get('vfdText') == (line1, meter.text):
+                        # no glyph changed, nothing to write
+                        return
+                    line2 = meter.text
+                # static text replaces anything scrolling, and the clock
+                self.plugin.ClaimVfd()
+                eventMode = self.plugin.imon.EventMode(events - 1) if events else None
+                self.plugin.SubmitWrite("vfd.setVfdText", "Unable to display text: ", eventMode,
+                                        self.plugin.vfd.setVfdText, line1, line2)
             else:
                 raise Exception, "Not Connected"
         except Exception, msg:
             self.PrintError("Unable to display text: " + str(msg))
 
-    def Configure(self, line1="", line2=""):
+    def GetMeter(self, label, minimum, maximum, glyphs, percent):
+        """The plugin's meter of these settings, its glyph tables are built only once."""
+        key = (label, minimum, maximum, glyphs, percent)
+        meter = self.plugin.meters.get(key)
+        if meter is None:
+            meter = self.plugin.meters[key] = self.plugin.imon.VfdMeter(
+                label, minimum, maximum, self.plugin.imon.GLYPH_SETS[glyphs][1], percent)
+        return meter
+
+    def Configure(self, line1="", line2="", events=0, mode=0, value="", minimum=0, maximum=100, glyphs=0, percent=True):
 
         panel = eg.ConfigPanel()
         line1Control = panel.TextCtrl(line1)
         line2Control = panel.TextCtrl(line2)
+        eventsControl = panel.Choice(events, ("Plugin default",) + self.plugin.eventModes)
+        modeControl = panel.Choice(mode, self.modes)
+        valueControl = panel.TextCtrl(value)
+        minimumControl = panel.SpinIntCtrl(minimum, min=-1000000, max=1000000)
+        maximumControl = panel.SpinIntCtrl(maximum, min=-1000000, max=1000000)
+        glyphsControl = panel.Choice(glyphs, [name for name, dummyGlyphs in self.plugin.imon.GLYPH_SETS])
+        percentControl = panel.CheckBox(percent, "Show the percentage")
 
         displayBox = panel.BoxedGroup(
             "Display Text",
             ("Line 1", line1Control),
             ("Line 2", line2Control),
+            ("Confirmation Event", eventsControl),
         )
         eg.EqualizeWidths(displayBox.GetColumnItems(0))
         panel.sizer.Add(displayBox, 0, wx.EXPAND)
 
+        meterBox = panel.BoxedGroup(
+            "Meter",
+            ("Mode", modeControl),
+            ("Value (such as {eg.event.payload})", valueControl),
+            ("Minimum", minimumControl),
+            ("Maximum", maximumControl),
+            ("Glyphs", glyphsControl),
+            ("Percentage", percentControl),
+        )
+        eg.EqualizeWidths(meterBox.GetColumnItems(0))
+        panel.sizer.Add(meterBox, 0, wx.EXPAND)
+
         while panel.Affirmed():
             panel.SetResult(
                 line1Control.GetValue(),
-                line2Control.GetValue()
+                line2Control.GetValue(),
+                eventsControl.GetValue(),
+                modeControl.GetValue(),
+                valueControl.GetValue(),
+                minimumControl.GetValue(),
+                maximumControl.GetValue(),
+                glyphsControl.GetValue(),
+                percentControl.GetValue()
             )
-
@@ -5,14 +5,34 @@ class ShowTime(eg.ActionBase):
     description = "Displays Time"
     iconFile = "icon_display"
 
-    def __call__(self):
+    def __call__(self, events=0):
         line1 = time.strftime("%x")
         line2 = time.strftime("%I:%M %p")
         try:
-            if self.plugin.imon.isInited() and self.plugin.imon.isPluginModeEnabled():
-                result = self.plugin.imon.setVfdText(line1, line2)
-                self.plugin.TriggerEvent("vfd.setVfdText")
+            if self.plugin.connection.isConnected():
+                # static text replaces anything scrolling, and the clock
+                self.plugin.ClaimVfd()
+                eventMode = self.plugin.imon.EventMode(events - 1) if events else None
+                self.plugin.SubmitWrite("vfd.setVfdText", "Unable to display text: ", eventMode,
+                                        self.plugin.vfd.setVfdText, line1, line2)
             else:
                 raise Exception, "Not Connected"
         except Exception, msg:
             self.PrintError("Unable to display text: " + str(msg))
+
+    def Configure(self, events=0):
+
+        panel = eg.ConfigPanel()
+        eventsControl = panel.Choice(events, ("Plugin default",) + self.plugin.eventModes)
+
+        eventsBox = panel.BoxedGroup(
+            "Events",
+            ("Confirmation Event", eventsControl),
+        )
+        eg.EqualizeWidths(eventsBox.GetColumnItems(0))
+        panel.sizer.Add(eventsBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                eventsControl.GetValue()
+            )
@@ -0,0 +1,39 @@
+class StartClock(eg.ActionBase):
+    name = "Start Clock"
+    description = "Keeps the date and time on a VFD Display, updating it whenever the shown text changes"
+    iconFile = "icon_display"
+
+    def __call__(self, dateFormat="%x", timeFormat="%I:%M %p", resumeAfter=0):
+        try:
+            if self.plugin.connection.isConnected():
+                # the clock takes over the display from anything scrolling
+                self.plugin.ClaimVfd("clock")
+                self.plugin.clockResumeAfter = resumeAfter
+                self.plugin.clock.start(dateFormat, timeFormat)
+            else:
+                raise Exception, "Not Connected"
+        except Exception, msg:
+            self.PrintError("Unable to start the clock: " + str(msg))
+
+    def Configure(self, dateFormat="%x", timeFormat="%I:%M %p", resumeAfter=0):
+
+        panel = eg.ConfigPanel()
+        dateFormatControl = panel.TextCtrl(dateFormat)
+        timeFormatControl = panel.TextCtrl(timeFormat)
+        resumeAfterControl = panel.SpinIntCtrl(resumeAfter, min=0, max=86400)
+
+        clockBox = panel.BoxedGroup(
+            "Clock (strftime formats)",
+            ("Line 1", dateFormatControl),
+            ("Line 2", timeFormatControl),
+            ("Show again this many seconds after another action (0 = never)", resumeAfterControl),
+        )
+        eg.EqualizeWidths(clockBox.GetColumnItems(0))
+        panel.sizer.Add(clockBox, 0, wx.EXPAND)
+
+        while panel.Affirmed():
+            panel.SetResult(
+                dateFormatControl.GetValue(),
+                timeFormatControl.GetValue(),
+                resumeAfterControl.GetValue()
+            )
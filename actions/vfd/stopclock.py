@@ -0,0 +1,10 @@
+class StopClock(eg.ActionBase):
+    name = "Stop Clock"
+    description = "Stops the clock started by Start Clock, leaving the display as it is"
+    iconFile = "icon_display"
+
+    def __call__(self):
+        self.plugin.clock.stop()
+        if self.plugin.composeLayers:
+            # the layers underneath show in place of the clock
+            self.plugin.compositor.remove("clock")
@@ -0,0 +1,169 @@
+"""
+Benchmark suite for the imon_api call path.
+
+Measures calls/sec and p50/p99 latency of every imon_api display function,
+and breaks the cost of a call down into its parts (argument marshalling,
+bandInfoToCType, DSPEQDATA construction, the DSPResult restype lookup and
+the exception path).
+
+No hardware is needed, the calls go to a stand-in backend ('null' by
+default, or 'sim' for the simulated device). Every call alternates between
+two different argument sets so the shadow framebuffer never skips a write,
+except for the 'suppressed' cases, which measure exactly that skip. The
+'instrumented' case measures the overhead of imon_stats.
+
+Usage
+-----
+    python benchmarks/bench_api.py [--backend null] [--iterations 20000] [--output results.json]
+
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+from array import array
+from ctypes import c_int, c_wchar_p
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+import imon
+from imon import DSPResult, DSPEQDATA, bandInfoToCType
+
+timer = timeit.default_timer
+
+EQ_A = dict((band, band * 6) for band in range(1, 17))
+EQ_B = dict((band, 100 - band * 6) for band in range(1, 17))
+EQ_ARRAY_A = array('i', [EQ_A[band] for band in range(1, 17)])
+EQ_ARRAY_B = array('i', [EQ_B[band] for band in range(1, 17)])
+
+# name, function, first argument set, second argument set
+API_CASES = [
+    ('setVfdText', imon.setVfdText, ("Now Playing", "Track 01"), ("Now Playing", "Track 02")),
+    ('setVfdEqData', imon.setVfdEqData, (EQ_A,), (EQ_B,)),
+    ('setVfdEqData (list)', imon.setVfdEqData, (list(EQ_ARRAY_A),), (list(EQ_ARRAY_B),)),
+    ('setVfdEqData (array)', imon.setVfdEqData, (EQ_ARRAY_A,), (EQ_ARRAY_B,)),
+    ('setLcdText', imon.setLcdText, (u"Artist - Title",), (u"Artist - Other Title",)),
+    ('setLcdEqData', imon.setLcdEqData, (EQ_A, EQ_B), (EQ_B, EQ_A)),
+    ('setLcdEqData (array)', imon.setLcdEqData, (EQ_ARRAY_A, EQ_ARRAY_B), (EQ_ARRAY_B, EQ_ARRAY_A)),
+    ('setLcdAllIcons', imon.setLcdAllIcons, (True,), (False,)),
+    ('setLcdOrangeIcon', imon.setLcdOrangeIcon, (True, True), (False, False, True)),
+    ('setLcdMediaTypeIcon', imon.setLcdMediaTypeIcon, (True,), (False, True)),
+    ('setLcdSpeakerIcon', imon.setLcdSpeakerIcon, (True, True, True), (True, False, True)),
+    ('setLcdVideoCodecIcon', imon.setLcdVideoCodecIcon, (True,), (False, True)),
+    ('setLcdAudioCodecIcon', imon.setLcdAudioCodecIcon, (True,), (False, True)),
+    ('setLcdAspectRatioIcon', imon.setLcdAspectRatioIcon, (True,), (False, True)),
+    ('setLcdEtcIcon', imon.setLcdEtcIcon, (True,), (False, True)),
+    ('setLcdProgress', imon.setLcdProgress, (10, 100), (11, 100)),
+]
+
+def percentile(ordered, fraction):
+    """The value at fraction (0 - 1) of an already sorted list."""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def measure(function, argSets, iterations):
+    """
+    Calls function iterations times, cycling through argSets, timing each call.
+
+    Returns
+    -------
+    dict
+        callsPerSec, p50Us and p99Us.
+
+    """
+    latencies = [0.0] * iterations
+    count = len(argSets)
+    start = timer()
+    for i in xrange(iterations):
+        args = argSets[i % count]
+        t = timer()
+        function(*args)
+        latencies[i] = timer() - t
+    total = timer() - start
+    latencies.sort()
+    return {
+        'callsPerSec': round(iterations / total, 1),
+        'p50Us': round(percentile(latencies, 0.50) * 1e6, 3),
+        'p99Us': round(percentile(latencies, 0.99) * 1e6, 3),
+    }
+
+def raising(function, *args):
+    """Calls function, swallowing the exception the failing backend causes."""
+    try:
+        function(*args)
+    except Exception:
+        pass
+
+def benchApi(iterations):
+    results = {}
+    for name, function, argsA, argsB in API_CASES:
+        imon.invalidateShadow()
+        results[name] = measure(function, (argsA, argsB), iterations)
+    # the same content over and over, skipped by the shadow framebuffer
+    imon.invalidateShadow()
+    results['setVfdText (suppressed)'] = measure(imon.setVfdText, (("Now Playing", "Track 01"),), iterations)
+    results['setVfdEqData (suppressed)'] = measure(imon.setVfdEqData, ((EQ_A,),), iterations)
+    # the cost of recording stats for every call
+    imon.useInstrumentation(True)
+    try:
+        results['setVfdText (instrumented)'] = measure(imon.setVfdText, (("Now Playing", "Track 01"), ("Now Playing", "Track 02")), iterations)
+    finally:
+        imon.useInstrumentation(False)
+    return results
+
+def benchBreakdown(iterations):
+    cEqData = bandInfoToCType(EQ_A)
+    succeeded = DSPResult.DSP_SUCCEEDED.value
+    results = {
+        'marshal LPCTSTR x2': measure(lambda a, b: (c_wchar_p(a), c_wchar_p(b)), (("Now Playing", "Track 01"),), iterations),
+        'marshal c_int x2': measure(lambda a, b: (c_int(a), c_int(b)), ((10, 100),), iterations),
+        'bandInfoToCType': measure(bandInfoToCType, ((EQ_A,),), iterations),
+        'DSPEQDATA construction': measure(DSPEQDATA, ((cEqData,),), iterations),
+        'DSPResult restype lookup': measure(DSPResult, ((succeeded,),), iterations),
+    }
+    # the exception path, against a backend where every call fails
+    backend = imon.getBackend()
+    imon.useBackend(imon.Backend())
+    try:
+        results['exception path (setVfdText)'] = measure(raising, ((imon.setVfdText, "a", "b"),), iterations)
+    finally:
+        imon.useBackend(backend)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the imon_api call path")
+    parser.add_argument('--backend', default='null', help="backend to call into (default: null)")
+    parser.add_argument('--iterations', type=int, default=20000, help="calls per measurement")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    options = parser.parse_args()
+
+    imon.useBackend(imon.createBackend(options.backend))
+    imon.init(0, 0)
+    if options.backend == 'sim':
+        # skip waiting for the connect notification
+        imon.getBackend().pluginMode = True
+
+    results = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'backend': options.backend,
+        'iterations': options.iterations,
+        'api': benchApi(options.iterations),
+        'breakdown': benchBreakdown(options.iterations),
+        'writeStats': imon.getWriteStats(),
+    }
+    imon.unInit()
+
+    for section in ('api', 'breakdown'):
+        print section
+        for name in sorted(results[section]):
+            stats = results[section][name]
+            print "  %-32s %12.1f calls/s  p50 %8.3f us  p99 %8.3f us" % (
+                name, stats['callsPerSec'], stats['p50Us'], stats['p99Us'])
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
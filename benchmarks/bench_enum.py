@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for ImonEnum reverse lookups and EnumMember compares.
+
+Both run on every DLL call, since DSPResult is the restype of every
+IMON_Display_* function, and on every window message received from iMON.
+The old linear-scan lookup and tuple-building compare are reproduced here so
+the per-call saving can be measured on the same machine.
+
+Usage
+-----
+    python benchmarks/bench_enum.py [loops]
+
+"""
+
+import sys
+import timeit
+from ctypes import c_int
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "imon")))
+from imon_message import DSPResult, DSPNotifyCode
+
+def legacyLookup(enum, byValue):
+    """The reverse lookup ImonEnum used to do: a scan of every member."""
+    byValue = c_int(byValue).value
+    found = []
+    for name, member in enum.members.iteritems():
+        if member.value == byValue:
+            found.append(member)
+    if len(found) > 1:
+        raise LookupError, "Too many results found with a matching value"
+    if len(found) < 1:
+        raise LookupError, "No matching items with a matching value"
+    return found[0]
+
+def legacyEquals(a, b):
+    """The compare EnumMember used to do."""
+    return ((a.name, a.value) == (b.name, b.value))
+
+def bench(label, func, loops):
+    best = min(timeit.repeat(func, number=loops, repeat=5))
+    perCall = best / loops * 1e9
+    print "%-34s %8.1f ns/call" % (label, perCall)
+    return perCall
+
+def main(loops=200000):
+    succeeded = DSPResult.DSP_SUCCEEDED
+    notPluginMode = DSPResult.DSP_S_NOT_IN_PLUGIN_MODE.value
+    scrollDone = DSPNotifyCode.DSPNM_LCD_TEXT_SCROLL_DONE.value
+
+    print "Reverse lookup (DSPResult restype)"
+    old = bench("  linear scan", lambda: legacyLookup(DSPResult, notPluginMode), loops)
+    new = bench("  indexed", lambda: DSPResult(notPluginMode), loops)
+    print "  saving: %.1f ns/call (%.1fx)" % (old - new, old / new)
+
+    print "Reverse lookup (DSPNotifyCode wParam)"
+    old = bench("  linear scan", lambda: legacyLookup(DSPNotifyCode, scrollDone), loops)
+    new = bench("  indexed", lambda: DSPNotifyCode(scrollDone), loops)
+    print "  saving: %.1f ns/call (%.1fx)" % (old - new, old / new)
+
+    print "result == DSPResult.DSP_SUCCEEDED"
+    result = DSPResult(0)
+    old = bench("  tuple compare", lambda: legacyEquals(result, succeeded), loops)
+    new = bench("  int compare", lambda: result == succeeded, loops)
+    print "  saving: %.1f ns/call (%.1fx)" % (old - new, old / new)
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,111 @@
+"""
+Counts the ctypes objects made per LCD stereo EQ frame, comparing the old
+path (two BANDINFO arrays, two DSPEQDATA structures and two byrefs built
+for every call) with imon_api's preallocated, double buffered EqBuffers.
+
+Instantiations are counted by hooking DSPEQDATA's and BANDINFO's
+constructors and byref while the frames run, so this works on Python 2,
+which has no tracemalloc. Field accesses such as DSPEQDATA.BandData return
+views sharing the structure's memory and aren't counted.
+tests/test_eq_alloc.py uses the same counter to fail if a frame allocates
+again.
+
+Usage
+-----
+    python benchmarks/bench_eq_alloc.py [frames]
+
+"""
+
+import sys
+import timeit
+import ctypes
+from array import array
+from ctypes import byref
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+import imon
+from imon import imon_api, DSPEQDATA, BANDINFO, bandInfoToCType
+
+LEFT = [dict((band, (band * 7 + frame) % 100) for band in range(1, 17)) for frame in range(2)]
+RIGHT = [dict((band, (band * 5 + frame) % 100) for band in range(1, 17)) for frame in range(2)]
+
+def legacyFrame(backend, left, right):
+    """What setLcdEqData used to do for every frame."""
+    dspEqDataLeft = DSPEQDATA(bandInfoToCType(left))
+    dspEqDataRight = DSPEQDATA(bandInfoToCType(right))
+    return backend.IMON_Display_SetLcdEqData(byref(dspEqDataLeft), byref(dspEqDataRight))
+
+def bufferedFrame(backend, left, right):
+    """The current, preallocated path."""
+    return imon.setLcdEqData(left, right)
+
+class InstanceCounter(object):
+    """
+    Counts the DSPEQDATA structures, BANDINFO arrays and byrefs made while
+    it is active.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        counter = self
+
+        def newStructure(cls, *args, **kwargs):
+            counter.count += 1
+            return ctypes.Structure.__new__(cls)
+
+        def newArray(cls, *args, **kwargs):
+            counter.count += 1
+            return ctypes.Array.__new__(cls)
+
+        def countedByref(obj, *args):
+            counter.count += 1
+            return ctypes.byref(obj, *args)
+
+        DSPEQDATA.__new__ = staticmethod(newStructure)
+        BANDINFO.__new__ = staticmethod(newArray)
+        imon_api.byref = globals()['byref'] = countedByref
+        return self
+
+    def __exit__(self, *excInfo):
+        del DSPEQDATA.__new__
+        del BANDINFO.__new__
+        imon_api.byref = globals()['byref'] = ctypes.byref
+
+def instancesPerFrame(frame, backend, inputs, frames):
+    """Average number of ctypes objects each frame makes."""
+    with InstanceCounter() as counter:
+        for i in range(frames):
+            left, right = inputs[i % len(inputs)]
+            frame(backend, left, right)
+    return counter.count / float(frames)
+
+def timePerFrame(frame, backend, inputs, frames):
+    start = timeit.default_timer()
+    for i in range(frames):
+        left, right = inputs[i % len(inputs)]
+        frame(backend, left, right)
+    return (timeit.default_timer() - start) / frames * 1e6
+
+def main(frames=2000):
+    backend = imon.useBackend(imon.createBackend('null'))
+    imon.init(0, 0)
+    dictInputs = list(zip(LEFT, RIGHT))
+    arrayInputs = [(array('i', [left[band] for band in range(1, 17)]),
+                    array('i', [right[band] for band in range(1, 17)])) for left, right in dictInputs]
+
+    cases = [
+        ('legacy, dict input', legacyFrame, dictInputs),
+        ('buffered, dict input', bufferedFrame, dictInputs),
+        ('buffered, array input', bufferedFrame, arrayInputs),
+    ]
+    for label, frame, inputs in cases:
+        print "%-24s %8.2f us/frame  %5.1f ctypes objects/frame" % (
+            label, timePerFrame(frame, backend, inputs, frames),
+            instancesPerFrame(frame, backend, inputs, frames))
+    imon.unInit()
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,138 @@
+"""
+Benchmarks sync calls against calls handed to the DisplayWorker, with
+several producer threads writing at once.
+
+For each mode every producer makes --calls setVfdText writes, against the
+simulated device with --latency seconds per DLL call. Reported are the
+submit rate (how fast producers got their calls off their hands), the
+completion rate (how fast the writes reached the backend), and the p50/p99
+time a producer was blocked per call.
+
+Usage
+-----
+    python benchmarks/bench_worker.py [--producers 4] [--calls 2000] [--latency 0.0002] [--output results.json]
+
+"""
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+import imon
+
+timer = timeit.default_timer
+
+def percentile(ordered, fraction):
+    """The value at fraction (0 - 1) of an already sorted list."""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run(producers, calls, submit):
+    """
+    Runs producers threads each making calls writes through submit.
+
+    Returns
+    -------
+    tuple
+        (start time, seconds until every producer was done submitting,
+        sorted per call blocking times)
+
+    """
+    blocked = []
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def producer(index):
+        times = [0.0] * calls
+        start.wait()
+        for i in xrange(calls):
+            t = timer()
+            submit("Producer %d" % index, "Write %d" % i)
+            times[i] = timer() - t
+        with lock:
+            blocked.extend(times)
+
+    threads = [threading.Thread(target=producer, args=(index,)) for index in range(producers)]
+    for thread in threads:
+        thread.start()
+    began = timer()
+    start.set()
+    for thread in threads:
+        thread.join()
+    submitted = timer() - began
+    blocked.sort()
+    return began, submitted, blocked
+
+def summarize(total, began, submitted, completed, blocked):
+    return {
+        'submitPerSec': round(total / submitted, 1),
+        'completePerSec': round(total / (completed - began), 1),
+        'blockedP50Us': round(percentile(blocked, 0.50) * 1e6, 3),
+        'blockedP99Us': round(percentile(blocked, 0.99) * 1e6, 3),
+    }
+
+def benchSync(producers, calls):
+    # the DLL isn't thread safe, direct callers have to take turns
+    dllLock = threading.Lock()
+
+    def submit(line1, line2):
+        with dllLock:
+            imon.setVfdText(line1, line2)
+
+    began, submitted, blocked = run(producers, calls, submit)
+    return summarize(producers * calls, began, submitted, timer(), blocked)
+
+def benchWorker(producers, calls):
+    worker = imon.DisplayWorker(imon)
+    worker.start()
+    futures = []
+
+    def submit(line1, line2):
+        futures.append(worker.submit('setVfdText', line1, line2))
+
+    began, submitted, blocked = run(producers, calls, submit)
+    for future in futures:
+        future.result()
+    completed = timer()
+    worker.stop()
+    return summarize(producers * calls, began, submitted, completed, blocked)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks sync vs. worker thread display writes")
+    parser.add_argument('--producers', type=int, default=4, help="concurrent producer threads")
+    parser.add_argument('--calls', type=int, default=2000, help="writes per producer")
+    parser.add_argument('--latency', type=float, default=0.0002, help="simulated seconds per DLL call")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    options = parser.parse_args()
+
+    backend = imon.SimulatorBackend(latency=options.latency)
+    imon.useBackend(backend)
+    imon.init(0, 0)
+    # skip waiting for the connect notification
+    backend.pluginMode = True
+
+    results = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'producers': options.producers,
+        'calls': options.calls,
+        'latency': options.latency,
+        'sync': benchSync(options.producers, options.calls),
+        'worker': benchWorker(options.producers, options.calls),
+    }
+    imon.unInit()
+
+    for mode in ('sync', 'worker'):
+        stats = results[mode]
+        print "%-8s submit %10.1f calls/s  complete %10.1f calls/s  blocked p50 %9.3f us  p99 %9.3f us" % (
+            mode, stats['submitPerSec'], stats['completePerSec'], stats['blockedP50Us'], stats['blockedP99Us'])
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Replays a display log recorded by imon_record through imon_api against a
+backend, and reports how long it took and how the results compared to the
+recording.
+
+Usage
+-----
+    python benchmarks/replay.py display.imonrec [--backend sim] [--speed 1] [--output results.json]
+
+--speed 1 keeps the recorded timing, 10 replays ten times as fast and 0 as
+fast as the backend allows.
+
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+import imon
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a recorded display log")
+    parser.add_argument('log', help="the log to replay")
+    parser.add_argument('--backend', default='null', help="backend to replay into (default: null)")
+    parser.add_argument('--speed', type=float, default=1.0, help="1 for the recorded timing, 0 for max speed")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    options = parser.parse_args()
+
+    records = list(imon.readLog(options.log))
+    calls = Counter(record[2] for record in records if record[0] == 'call')
+    duration = records[-1][1] if records else 0.0
+
+    backend = imon.createBackend(options.backend)
+    if options.backend == 'sim':
+        # replayed writes shouldn't depend on the simulated connect delay
+        backend.pluginMode = True
+    imon.useBackend(backend)
+    stats = imon.replay(options.log, imon, options.speed)
+    writes = imon.getWriteStats()
+
+    results = {
+        'log': options.log,
+        'backend': options.backend,
+        'speed': options.speed,
+        'recordedSeconds': duration,
+        'callsByEntryPoint': dict(calls),
+        'replay': stats,
+        'writes': writes,
+        'callsPerSec': stats['calls'] / stats['seconds'] if stats['seconds'] else 0.0,
+    }
+    print "%d calls and %d notifications recorded over %.3f s" % (sum(calls.values()), stats['notifications'], duration)
+    for function, count in calls.most_common():
+        print "  %-36s %8d" % (function, count)
+    print "replayed in %.3f s, %.1f calls/s, %d results differ from the recording" % (
+        stats['seconds'], results['callsPerSec'], stats['mismatched'])
+    print "%(sent)d writes sent to the backend, %(suppressed)d suppressed by the shadow framebuffer" % writes
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
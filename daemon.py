@@ -0,0 +1,118 @@
+"""
+Runs the display daemon, owning the iMON display for its clients, see
+imon_daemon.
+
+Usage
+-----
+    python daemon.py [--address 127.0.0.1:47410] [--backend dll]
+
+Applications then use the 'client' backend, such as the EventGhost plugin
+with its Display API Backend set to client. IMON_DAEMON_ADDRESS,
+IMON_DAEMON_NAME and IMON_DAEMON_PRIORITY set where clients connect, and
+their name and priority.
+
+"""
+
+import argparse
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(abspath(__file__)))
+import imon
+
+def createMessageWindow(onMessage):
+    """
+    Creates a message-only window receiving iMON's notifications.
+
+    Returns
+    -------
+    tuple
+        The window and the message iMON sends, to pass to init, and the
+        window class, which has to be kept for as long as the window is used.
+
+    """
+    from ctypes import windll, byref, WINFUNCTYPE, Structure, c_int, c_void_p
+    from ctypes.wintypes import HWND, UINT, WPARAM, LPARAM, HINSTANCE, LPCWSTR
+
+    WNDPROC = WINFUNCTYPE(LPARAM, HWND, UINT, WPARAM, LPARAM)
+
+    class WNDCLASS(Structure):
+        _fields_ = [
+            ('style', UINT),
+            ('lpfnWndProc', WNDPROC),
+            ('cbClsExtra', c_int),
+            ('cbWndExtra', c_int),
+            ('hInstance', HINSTANCE),
+            ('hIcon', c_void_p),
+            ('hCursor', c_void_p),
+            ('hbrBackground', c_void_p),
+            ('lpszMenuName', LPCWSTR),
+            ('lpszClassName', LPCWSTR),
+        ]
+
+    user32 = windll.user32
+    user32.DefWindowProcW.argtypes = [HWND, UINT, WPARAM, LPARAM]
+    user32.DefWindowProcW.restype = LPARAM
+    user32.CreateWindowExW.restype = HWND
+    wm = user32.RegisterWindowMessageW(u"IMON_DISPLAY")
+
+    def wndProc(hwnd, message, wParam, lParam):
+        if message == wm:
+            onMessage(wParam, lParam)
+            return 0
+        return user32.DefWindowProcW(hwnd, message, wParam, lParam)
+
+    wndClass = WNDCLASS()
+    # kept alive by the class, the window calls it for as long as it exists
+    wndClass.lpfnWndProc = WNDPROC(wndProc)
+    wndClass.hInstance = windll.kernel32.GetModuleHandleW(None)
+    wndClass.lpszClassName = u"iMONDisplayDaemon"
+    user32.RegisterClassW(byref(wndClass))
+    HWND_MESSAGE = HWND(-3)
+    hwnd = user32.CreateWindowExW(0, wndClass.lpszClassName, u"iMON Display Daemon", 0, 0, 0, 0, 0,
+                                  HWND_MESSAGE, None, wndClass.hInstance, None)
+    return hwnd, wm, wndClass
+
+def pumpMessages():
+    """Dispatches the window messages waiting, without blocking."""
+    from ctypes import windll, byref
+    from ctypes.wintypes import MSG
+    PM_REMOVE = 1
+    msg = MSG()
+    user32 = windll.user32
+    while user32.PeekMessageW(byref(msg), None, 0, 0, PM_REMOVE):
+        user32.TranslateMessage(byref(msg))
+        user32.DispatchMessageW(byref(msg))
+
+def log(message):
+    print time.strftime("%H:%M:%S"), message
+
+def main():
+    parser = argparse.ArgumentParser(description="Shares the iMON display between applications")
+    parser.add_argument('--address', default="", help="host:port to listen on (default: 127.0.0.1:%d)" % imon.DEFAULT_ADDRESS[1])
+    parser.add_argument('--backend', default="", help="backend of the display (default: IMON_BACKEND or dll)")
+    options = parser.parse_args()
+
+    imon.useBackend(options.backend or None)
+    # backends that can't post window messages (the simulator) notify the daemon directly
+    windows = sys.platform == 'win32' and not hasattr(imon.getBackend(), 'onNotify')
+    daemon = None
+    hwnd, wm, wndClass = None, 0, None
+    if windows:
+        hwnd, wm, wndClass = createMessageWindow(lambda wParam, lParam: daemon.notify(wParam, lParam))
+    daemon = imon.DisplayDaemon(imon, imon.parseAddress(options.address), hwnd, wm, log)
+    daemon.start()
+    log("Listening on %s:%d" % daemon.address)
+    try:
+        while True:
+            if windows:
+                pumpMessages()
+            time.sleep(0.02)
+    except KeyboardInterrupt:
+        pass
+    daemon.stop()
+    log("%(clients)d clients, %(calls)d calls, %(notifications)d notifications" % daemon.stats)
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,20 @@
 from imon_api import *
+from imon_icons import *
 from imon_message import *
+from imon_render import *
+from imon_connection import *
+from imon_backend import *
+from imon_simulator import *
+from imon_scroll import *
+from imon_lcdqueue import *
+from imon_ratelimit import *
+from imon_stats import *
+from imon_record import *
+from imon_worker import *
+from imon_events import *
+from imon_clock import *
+from imon_supervisor import *
+from imon_template import *
+from imon_compositor import *
+from imon_meter import *
+from imon_daemon import *
@@ -2,70 +2,482 @@
 This module wraps the IMON Display API DLL to
 integrate with LCD / VFD devices
 
+The DLL is not loaded until the first call is made, and can be swapped for
+any other backend, see imon_backend and useBackend.
+
+Writes can be rate limited per entry point, see imon_ratelimit and
+useRateLimiter, every call can be timed, see imon_stats and
+useInstrumentation, and recorded, see imon_record and useRecorder.
+
 """
 
-from ctypes import CDLL, c_int, CFUNCTYPE, POINTER, byref, c_wchar_p
-from ctypes.wintypes import HWND, UINT, BOOL, BYTE
-from os.path import dirname, join, abspath
-from imon_message import DSPResult, DSPEQDATA, bandInfoToCType
+import functools
+import inspect
+import threading
+from ctypes import c_int, byref
+from imon_message import DSPResult, DSPEQDATA, fillEqData
+from imon_icons import ICON_GROUPS, ICON_LAYOUTS, ICON_ENTRY_POINTS
+from imon_backend import HWND, UINT, BOOL, BYTE, LPCTSTR, SerializedBackend, createBackend
+from imon_stats import CallStats, InstrumentedBackend
+
+# Backend ###################################
+
+class LazyBackend(object):
+    """
+    Stands in for the backend until the api is first used, at which point
+    the real backend is created and takes its place.
+    """
+
+    def __getattr__(self, name):
+        if not name.startswith('IMON_Display_'):
+            raise AttributeError, name
+        return getattr(_createBackend(), name)
+
+# The backend every call goes through, see useBackend.
+imonDll = LazyBackend()
+
+# The backend name to create on first use, None for the default.
+backendName = None
+
+# Held for every DLL call. The render loop, scroller, clock, compositor, LCD
+# queue, rate limiter and reconnect supervisor all write from threads of
+# their own, and the DLL must only be called from one thread at a time.
+dllLock = threading.RLock()
+
+def useBackend(backend):
+    """
+    Switches the backend all calls go through.
+
+    Parameters
+    ----------
+    backend : Backend or string
+        A backend instance, or the name of a backend to create the first time
+        the api is used. None selects the default (IMON_BACKEND or the DLL).
+
+    Returns
+    -------
+    Backend
+        The backend in use, or the LazyBackend placeholder.
+
+    """
+    global imonDll, backendName
+    if backend is None or isinstance(backend, basestring):
+        backendName = backend
+        imonDll = LazyBackend()
+    else:
+        imonDll = _wrap(backend)
+    invalidateShadow()
+    lastFrame.clear()
+    return imonDll
+
+def getBackend():
+    """
+    Returns
+    -------
+    Backend
+        The backend in use, creating it if it was not used yet.
 
-# Type required for setting text
-LPCTSTR = c_wchar_p
+    """
+    return _unwrap(_createBackend())
 
-# Load the imon display DLL into memory.
-imonDll = CDLL(abspath(join(dirname(__file__), "iMONDisplay.dll")))
+def _createBackend():
+    """
+    Creates the backend named by backendName if it was not created yet.
+    Several threads can make their first call at once, the lock makes sure
+    only one backend (one DLL load, one daemon session) is created.
 
-# DLL Function Setup
-imonDll.IMON_Display_Init.argtypes = [HWND, UINT]
-imonDll.IMON_Display_Init.restype  = DSPResult
+    Returns
+    -------
+    Backend
+        The backend in use.
 
-imonDll.IMON_Display_Uninit.argtypes = []
-imonDll.IMON_Display_Uninit.restype  = DSPResult
+    """
+    backend = imonDll
+    if not isinstance(backend, LazyBackend):
+        return backend
+    with dllLock:
+        if isinstance(imonDll, LazyBackend):
+            useBackend(createBackend(backendName))
+        return imonDll
+
+def _wrap(backend):
+    """
+    Puts the instrumentation in front of backend if it is on, and the DLL
+    lock in front of that, so latencies don't count waiting for the lock.
+    """
+    if callStats is not None:
+        backend = InstrumentedBackend(backend, callStats)
+    return SerializedBackend(backend, dllLock)
 
-imonDll.IMON_Display_IsInited.argtypes = []
-imonDll.IMON_Display_IsInited.restype  = DSPResult
+def _unwrap(backend):
+    """The backend behind whatever _wrap put in front of it."""
+    while isinstance(backend, (InstrumentedBackend, SerializedBackend)):
+        backend = backend.backend
+    return backend
 
-imonDll.IMON_Display_IsPluginModeEnabled.argtypes = []
-imonDll.IMON_Display_IsPluginModeEnabled.restype  = DSPResult
+def _rewrap():
+    """Applies a change of the instrumentation to the backend in use."""
+    global imonDll
+    if not isinstance(imonDll, LazyBackend):
+        imonDll = _wrap(_unwrap(imonDll))
 
-imonDll.IMON_Display_SetVfdText.argtypes = [LPCTSTR, LPCTSTR]
-imonDll.IMON_Display_SetVfdText.restype = DSPResult
+# Instrumentation ###################################
 
-imonDll.IMON_Display_SetVfdEqData.argtypes = [POINTER(DSPEQDATA)]
-imonDll.IMON_Display_SetVfdEqData.restype = DSPResult
+# The CallStats every backend call is recorded into, None when not instrumented.
+callStats = None
 
-imonDll.IMON_Display_SetLcdText.argtypes = [LPCTSTR]
-imonDll.IMON_Display_SetLcdText.restype = DSPResult
+def useInstrumentation(enabled):
+    """
+    Turns recording of call counts, errors and latencies on or off.
 
-imonDll.IMON_Display_SetLcdAllIcons.argtypes = [BOOL]
-imonDll.IMON_Display_SetLcdAllIcons.restype = DSPResult
+    Parameters
+    ----------
+    enabled : bool
 
-imonDll.IMON_Display_SetLcdOrangeIcon.argtypes = [BYTE, BYTE]
-imonDll.IMON_Display_SetLcdOrangeIcon.restype = DSPResult
+    Returns
+    -------
+    CallStats
+        The stats being recorded into, None when turned off. Turning it on
+        while it is on keeps the counts recorded so far.
 
-imonDll.IMON_Display_SetLcdMediaTypeIcon.argtypes = [BYTE]
-imonDll.IMON_Display_SetLcdMediaTypeIcon.restype = DSPResult
+    """
+    global callStats
+    if enabled and callStats is None:
+        callStats = CallStats()
+        _rewrap()
+    elif not enabled and callStats is not None:
+        callStats = None
+        _rewrap()
+    return callStats
+
+def getCallStats():
+    """
+    Returns
+    -------
+    CallStats
+        The stats being recorded, None if instrumentation is off.
 
-imonDll.IMON_Display_SetLcdSpeakerIcon.argtypes = [BYTE, BYTE]
-imonDll.IMON_Display_SetLcdSpeakerIcon.restype = DSPResult
+    """
+    return callStats
 
-imonDll.IMON_Display_SetLcdVideoCodecIcon.argtypes = [BYTE]
-imonDll.IMON_Display_SetLcdVideoCodecIcon.restype = DSPResult
+# Recording ###################################
 
-imonDll.IMON_Display_SetLcdAudioCodecIcon.argtypes = [BYTE]
-imonDll.IMON_Display_SetLcdAudioCodecIcon.restype = DSPResult
+# The Recorder every api call and notification is written to, None when not recording.
+recorder = None
 
-imonDll.IMON_Display_SetLcdAspectRatioIcon.argtypes = [BYTE]
-imonDll.IMON_Display_SetLcdAspectRatioIcon.restype = DSPResult
+def _recorded(function):
+    """
+    Records every call of an api function, with its arguments and its
+    result, while a recorder is on. The function itself is kept as the
+    unrecorded attribute, for the calls the rate limiter makes again later.
+    """
+    name = function.__name__
+    argNames = tuple(inspect.getargspec(function).args)
+
+    @functools.wraps(function)
+    def recorded(*args, **kwargs):
+        if recorder is None:
+            return function(*args, **kwargs)
+        if kwargs:
+            # recorded as positional args, like the log stores them
+            args = _bindArgs(name, argNames, args, kwargs)
+        try:
+            result = function(*args)
+        except Exception, msg:
+            recorder.call(name, args, msg)
+            raise
+        recorder.call(name, args, result)
+        return result
+    recorded.unrecorded = function
+    return recorded
 
-imonDll.IMON_Display_SetLcdEtcIcon.argtypes = [BYTE]
-imonDll.IMON_Display_SetLcdEtcIcon.restype = DSPResult
+def _bindArgs(name, argNames, args, kwargs):
+    """
+    Returns
+    -------
+    tuple
+        The args and keyword args of a call, as positional args.
 
-imonDll.IMON_Display_SetLcdProgress.argtypes = [c_int, c_int]
-imonDll.IMON_Display_SetLcdProgress.restype = DSPResult
+    Raises
+    ------
+    TypeError
+        Raised if an argument is missing or unknown, like the call would.
+
+    """
+    args = list(args)
+    for argName in argNames[len(args):]:
+        if argName not in kwargs:
+            raise TypeError, "%s() takes exactly %d arguments (%d given)" % (name, len(argNames), len(args) + len(kwargs))
+        args.append(kwargs.pop(argName))
+    if kwargs:
+        raise TypeError, "%s() got an unexpected keyword argument '%s'" % (name, kwargs.keys()[0])
+    return tuple(args)
+
+def useRecorder(newRecorder):
+    """
+    Starts or stops recording the display traffic.
+
+    Parameters
+    ----------
+    newRecorder : Recorder
+        See imon_record. None stops recording. The previous recorder is closed.
+
+    Returns
+    -------
+    Recorder
+        The previous recorder, or None.
+
+    """
+    global recorder
+    previous = recorder
+    recorder = newRecorder
+    if previous is not None:
+        previous.close()
+    return previous
+
+def recordNotification(wParam, lParam):
+    """Records a notification received from iMON, if recording."""
+    if recorder is not None:
+        recorder.notification(wParam, lParam)
+
+# Shadow Framebuffer ###################################
+
+# Holds a copy of the last content successfully written to each part of the
+# display, keyed by region. Writes matching the shadow never reach the DLL.
+shadow = {}
+
+# Counters for writes sent to the DLL vs. writes skipped because the display
+# already showed the requested content.
+writeStats = {'sent': 0, 'suppressed': 0}
+
+# Icon group regions, cleared together whenever setLcdAllIcons is used.
+ICON_REGIONS = tuple(group + 'Icon' for group in ICON_GROUPS)
+
+# The entry point writing each region, for the rate limiter.
+REGION_ENTRY_POINTS = dict(
+    [(group + 'Icon', ICON_ENTRY_POINTS[group]) for group in ICON_GROUPS] + [
+    ('vfdText', 'IMON_Display_SetVfdText'),
+    ('vfdEq', 'IMON_Display_SetVfdEqData'),
+    ('lcdText', 'IMON_Display_SetLcdText'),
+    ('lcdEq', 'IMON_Display_SetLcdEqData'),
+    ('allIcons', 'IMON_Display_SetLcdAllIcons'),
+    ('progress', 'IMON_Display_SetLcdProgress'),
+])
+
+def _isShown(region, content):
+    """
+    Returns True, and counts a suppressed write, if the shadow says the
+    display region already shows the content.
+    """
+    if region in shadow and shadow[region] == content:
+        writeStats['suppressed'] += 1
+        if rateLimiter is not None:
+            # a held call would now overwrite newer content
+            rateLimiter.discard(REGION_ENTRY_POINTS[region])
+        return True
+    return False
+
+# Regions sharing the same glass, writing one replaces the other: the VFD
+# shows either its 2 lines of text or the equalizer.
+OVERLAPPING_REGIONS = {'vfdText': 'vfdEq', 'vfdEq': 'vfdText'}
+
+# The last content written to each region, like the shadow, but kept when
+# the shadow is invalidated, so it can be written again, see restoreLastFrame.
+lastFrame = {}
+
+def _shown(region, content):
+    """Records a successful write of content to the display region."""
+    if region in ICON_REGIONS:
+        # a single group changed, so the icons are no longer all on/off.
+        shadow.pop('allIcons', None)
+        lastFrame.pop('allIcons', None)
+    elif region in OVERLAPPING_REGIONS:
+        # the other region isn't shown any more, writing it again must go through
+        shadow.pop(OVERLAPPING_REGIONS[region], None)
+        lastFrame.pop(OVERLAPPING_REGIONS[region], None)
+    shadow[region] = content
+    lastFrame[region] = content
+    writeStats['sent'] += 1
+
+def invalidateShadow(region=None):
+    """
+    Forgets everything known about the display contents, so the next write to
+    every region goes to the DLL. Should be called whenever the display may
+    have been cleared behind our back, such as iMON restarting or the hardware
+    being reconnected.
+
+    Parameters
+    ----------
+    region : string
+        Only forget this region, such as 'lcdText', so the same content can be
+        sent again on purpose.
+
+    """
+    if region is None:
+        shadow.clear()
+    else:
+        shadow.pop(region, None)
+
+def restoreLastFrame():
+    """
+    Writes the last content of every region again, in one burst, such as
+    after iMON came back from a restart with a blank display. The VFD gets
+    back whichever of its text and EQ was written last.
+
+    Returns
+    -------
+    int
+        The number of regions written.
+
+    Raises
+    ------
+    Exception
+        Whatever the first failed write raised. The regions before it are
+        written, the ones after it are not.
+
+    """
+    frame = dict(lastFrame)
+    invalidateShadow()
+    writes = []
+    # lastFrame holds only the VFD mode written last, text or EQ, see OVERLAPPING_REGIONS
+    if 'vfdText' in frame:
+        writes.append((setVfdText,) + frame['vfdText'])
+    elif 'vfdEq' in frame:
+        writes.append((setVfdEqData, vfdEqBuffer.front()))
+    if 'lcdText' in frame:
+        writes.append((setLcdText, frame['lcdText']))
+    if 'lcdEq' in frame:
+        writes.append((setLcdEqData, lcdEqLeftBuffer.front(), lcdEqRightBuffer.front()))
+    if 'allIcons' in frame:
+        writes.append((setLcdAllIcons, frame['allIcons']))
+    for group in ICON_GROUPS:
+        if group + 'Icon' in frame:
+            writes.append((setLcdIconBytes, group, frame[group + 'Icon']))
+    if 'progress' in frame:
+        writes.append((setLcdProgress,) + frame['progress'])
+    for write in writes:
+        write[0](*write[1:])
+    return len(writes)
+
+def getWriteStats():
+    """
+    Returns
+    -------
+    dict
+        A copy of the write counters, 'sent' and 'suppressed'.
+    """
+    return dict(writeStats)
+
+def resetWriteStats():
+    """Resets the sent and suppressed write counters to 0."""
+    writeStats['sent'] = 0
+    writeStats['suppressed'] = 0
+
+# Rate Limiting ###################################
+
+# The RateLimiter writes go through, None for no limits, see useRateLimiter.
+rateLimiter = None
+
+def useRateLimiter(limiter):
+    """
+    Switches the rate limiter writes go through.
+
+    Parameters
+    ----------
+    limiter : RateLimiter
+        See imon_ratelimit. None turns rate limiting off. Calls held by the
+        previous limiter are dropped.
+
+    Returns
+    -------
+    RateLimiter
+        The previous limiter, or None.
+
+    """
+    global rateLimiter
+    previous = rateLimiter
+    rateLimiter = limiter
+    if previous is not None:
+        previous.stop()
+    return previous
+
+def getRateLimiter():
+    """
+    Returns
+    -------
+    RateLimiter
+        The limiter in use, None if writes are not limited.
+
+    """
+    return rateLimiter
+
+def _held(region, function, *args):
+    """
+    Returns True if the rate limiter held the write back, to be made by
+    calling function with args once the region's entry point has budget.
+    """
+    # the call was recorded when it was held, not again when it is made
+    function = getattr(function, 'unrecorded', function)
+    return rateLimiter is not None and not rateLimiter.admit(REGION_ENTRY_POINTS[region], function, args)
+
+# EQ Buffers ###################################
+
+class EqBuffer(object):
+    """
+    A preallocated, double buffered DSPEQDATA.
+
+    A frame is filled into the back structure while the front one holds the
+    last frame successfully sent to the display. The two only trade places
+    once the DLL accepted the back one, so a frame under construction is never
+    visible to anyone reading the front structure.
+
+    Each structure has its byref and a buffer over its memory made once, so
+    sending and comparing frames allocates nothing.
+
+    Attributes
+    ----------
+    lock : Lock
+        Serializes writers of this buffer.
+
+    """
+
+    __slots__ = ('structs', 'refs', 'views', 'frontIndex', 'lock')
+
+    def __init__(self):
+        self.structs = (DSPEQDATA(), DSPEQDATA())
+        self.refs = (byref(self.structs[0]), byref(self.structs[1]))
+        self.views = (buffer(self.structs[0]), buffer(self.structs[1]))
+        self.frontIndex = 0
+        self.lock = threading.Lock()
+
+    def fill(self, eqData):
+        """Fills the back structure with eqData, see imon_message.fillEqData."""
+        fillEqData(self.structs[1 - self.frontIndex], eqData)
+
+    def backRef(self):
+        """The cached byref of the back structure, to hand to the DLL."""
+        return self.refs[1 - self.frontIndex]
+
+    def front(self):
+        """The structure holding the last frame sent."""
+        return self.structs[self.frontIndex]
+
+    def isChanged(self):
+        """Returns True if the back structure differs from the front one."""
+        return self.views[0] != self.views[1]
+
+    def swap(self):
+        """Makes the back structure the front one."""
+        self.frontIndex = 1 - self.frontIndex
+
+# Equalizer frames are built in these, instead of new structures per call.
+vfdEqBuffer = EqBuffer()
+lcdEqLeftBuffer = EqBuffer()
+lcdEqRightBuffer = EqBuffer()
 
 # Main Functions ###################################
 
+@_recorded
 def init(hwnd, wm):
     """
     This function should be called to use other functions in iMON Display API.
@@ -95,9 +507,11 @@ def init(hwnd, wm):
     """
     result = imonDll.IMON_Display_Init(HWND(hwnd), UINT(wm))
     if (result == DSPResult.DSP_SUCCEEDED):
+        invalidateShadow()
         return result
     raise Exception, result.name
 
+@_recorded
 def unInit():
     """
     This function should be called when the caller application need not use this API any more.
@@ -117,6 +531,7 @@ def unInit():
     """
     result =  imonDll.IMON_Display_Uninit()
     if (result == DSPResult.DSP_SUCCEEDED):
+        invalidateShadow()
         return result
     raise Exception, result.name
 
@@ -156,6 +571,7 @@ def isPluginModeEnabled():
 
 # VFD Functions ###################################
 
+@_recorded
 def setVfdText(line1, line2):
     """
     This function can be used when the caller application wants to display text data on VFD module.
@@ -182,24 +598,31 @@ def setVfdText(line1, line2):
         It doesn't support multi-byte character and if string data is longer than 16 characters, it displays 16 characters from the first.
 
     """
+    if _isShown('vfdText', (line1, line2)) or _held('vfdText', setVfdText, line1, line2):
+        return DSPResult.DSP_SUCCEEDED
     result = imonDll.IMON_Display_SetVfdText(LPCTSTR(line1), LPCTSTR(line2))
     if (result == DSPResult.DSP_SUCCEEDED):
+        _shown('vfdText', (line1, line2))
         return result
     raise Exception, result.name
 
+@_recorded
 def setVfdEqData(eqData):
     """
     This function can be used when the caller application wants to display equalizer data on VFD module.
 
     Parameters
     ----------
-    eqData: dict
+    eqData: dict, sequence or buffer
         Accepts a dictionary container bands 1 - 16. for example:{1: 14, 2: 50, etc...}
+        Also accepts a sequence of 16 bands, or an array('i'), memoryview or NumPy int32
+        array of 16 bands, which is handed to the DLL without any per band work.
 
     Notes
     -----
     Any missing bands not defined will be defaulted to 0. Each band should range from 0 - 100. The key for each being 1 - 16
     (starts at 1 not 0)
+    See imon_message.fillEqData for the accepted forms.
 
     Returns
     -------
@@ -212,15 +635,62 @@ def setVfdEqData(eqData):
         DSP_E_POINTER, DSP_E_NOT_INITED or DSP_E_FAIL can be returned if failed.
 
     """
-    cEqData = bandInfoToCType(eqData)
-    dspEqData = DSPEQDATA(cEqData)
-    result = imonDll.IMON_Display_SetVfdEqData(byref(dspEqData))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
+    with vfdEqBuffer.lock:
+        vfdEqBuffer.fill(eqData)
+        # the front buffer is the shadow, it holds what the display shows
+        if 'vfdEq' in shadow and not vfdEqBuffer.isChanged():
+            writeStats['suppressed'] += 1
+            if rateLimiter is not None:
+                rateLimiter.discard('IMON_Display_SetVfdEqData')
+            return DSPResult.DSP_SUCCEEDED
+        if _held('vfdEq', setVfdEqData, eqData):
+            return DSPResult.DSP_SUCCEEDED
+        result = imonDll.IMON_Display_SetVfdEqData(vfdEqBuffer.backRef())
+        if (result == DSPResult.DSP_SUCCEEDED):
+            vfdEqBuffer.swap()
+            _shown('vfdEq', vfdEqBuffer)
+            return result
     raise Exception, result.name
 
+def setVfdLine(index, text):
+    """
+    Displays text on one line of the VFD module, keeping whatever the shadow
+    says the other line shows.
+
+    Parameters
+    ----------
+    index : int
+        0 for the 1st line, 1 for the 2nd line.
+    text : string
+        This string data will be displayed on that line.
+
+    Returns
+    -------
+    DSPResult
+        DSP_SUCCEEDED will be returned if succeeded.
+
+    Raises
+    ------
+    Exception
+        DSP_E_POINTER, DSP_E_NOT_INITED or DSP_E_FAIL can be raised if failed.
+
+    Notes
+    -----
+        The DLL always takes both lines. If nothing was written yet, the other line is left blank.
+        If the rate limiter holds a write, its other line is kept instead.
+
+    """
+    # a held write is newer than what the display shows
+    lines = rateLimiter is not None and rateLimiter.pending('IMON_Display_SetVfdText')
+    if not lines:
+        lines = shadow.get('vfdText', (u"", u""))
+    if index == 0:
+        return setVfdText(text, lines[1])
+    return setVfdText(lines[0], text)
+
 # LCD Functions ###################################
 
+@_recorded
 def setLcdText(line):
     """
     This function can be used when the caller application wants to display text data on LCD module.
@@ -246,11 +716,15 @@ def setLcdText(line):
         When text scrolling is finished, API will notify it with DSPNotifyCode enumeration value, DSPNM_LCD_TEXT_SCROLL_DONE.
 
     """
+    if _isShown('lcdText', line) or _held('lcdText', setLcdText, line):
+        return DSPResult.DSP_SUCCEEDED
     result = imonDll.IMON_Display_SetLcdText(LPCTSTR(line))
     if (result == DSPResult.DSP_SUCCEEDED):
+        _shown('lcdText', line)
         return result
     raise Exception, result.name
 
+@_recorded
 def setLcdAllIcons(state):
     """
     This function can be used when the caller application wants to turn on/off all icons on LCD module.
@@ -271,8 +745,54 @@ def setLcdAllIcons(state):
          DSP_E_NOT_INITED or DSP_E_FAIL can be raised if failed.
 
     """
+    state = bool(state)
+    if _isShown('allIcons', state) or _held('allIcons', setLcdAllIcons, state):
+        return DSPResult.DSP_SUCCEEDED
     result = imonDll.IMON_Display_SetLcdAllIcons(BOOL(state))
     if (result == DSPResult.DSP_SUCCEEDED):
+        # every icon group was overwritten, so their shadows are stale.
+        for region in ICON_REGIONS:
+            shadow.pop(region, None)
+            lastFrame.pop(region, None)
+        _shown('allIcons', state)
+        return result
+    raise Exception, result.name
+
+@_recorded
+def setLcdIconBytes(group, data):
+    """
+    Sets one LCD icon group from its packed bytes. The setLcd*Icon functions
+    and LcdIconState all end up here.
+
+    Parameters
+    ----------
+    group : string
+        One of imon_icons.ICON_GROUPS.
+    data : sequence
+        The packed bytes, 2 for the orange and speaker groups, 1 for the others.
+        See imon_icons.ICON_LAYOUTS for the bit layouts.
+
+    Returns
+    -------
+    DSPResult
+        DSP_SUCCEEDED will be returned if succeeded.
+
+    Raises
+    ------
+    Exception
+        DSP_E_NOT_INITED or DSP_E_FAIL can be raised if failed.
+
+    """
+    region = group + 'Icon'
+    data = tuple(data)
+    if _isShown(region, data) or _held(region, setLcdIconBytes, group, data):
+        return DSPResult.DSP_SUCCEEDED
+    if len(data) == 1:
+        result = getattr(imonDll, ICON_ENTRY_POINTS[group])(BYTE(data[0]))
+    else:
+        result = getattr(imonDll, ICON_ENTRY_POINTS[group])(BYTE(data[0]), BYTE(data[1]))
+    if (result == DSPResult.DSP_SUCCEEDED):
+        _shown(region, data)
         return result
     raise Exception, result.name
 
@@ -313,15 +833,7 @@ def setLcdOrangeIcon(peel=False, slice1=False, slice2=False, slice3=False, slice
         DSP_E_NOT_INITED or DSP_E_FAIL can be returned if failed.
 
     """
-    # No Idea if this will work.
-    slices = [slice1, slice2, slice3, slice4, slice5, slice6, slice7, slice8]
-    peel = [peel, False, False, False, False, False, False, False]
-    byte1 = int(''.join([str(int(x)) for x in slices]), 2)
-    byte2 = int(''.join([str(int(x)) for x in peel]), 2)
-    result = imonDll.IMON_Display_SetLcdOrangeIcon(BYTE(byte1), BYTE(byte2))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
-    raise Exception, result.name
+    return setLcdIconBytes('orange', ICON_LAYOUTS['orange'].pack((slice1, slice2, slice3, slice4, slice5, slice6, slice7, slice8, peel)))
 
 def setLcdMediaTypeIcon(music=False, movie=False, photo=False, cd=False, tv=False, web=False, news=False):
     """
@@ -352,15 +864,9 @@ def setLcdMediaTypeIcon(music=False, movie=False, photo=False, cd=False, tv=Fals
         DSP_E_NOT_INITED or DSP_E_FAIL can be returned if failed.
 
     """
-    # No Idea if this will work.
-    bits = [music, movie, photo, cd, tv, web, news, False]
-    byte = int(''.join([str(int(x)) for x in bits]), 2)
-    result = imonDll.IMON_Display_SetLcdMediaTypeIcon(BYTE(byte))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
-    raise Exception, result.name
+    return setLcdIconBytes('mediaType', ICON_LAYOUTS['mediaType'].pack((music, movie, photo, cd, tv, web, news)))
 
-def setLcdSpeakerIcon(l=False, c=False, r=False, sl=False, lfe=False, sr=False, spdif=False, rr=False):
+def setLcdSpeakerIcon(l=False, c=False, r=False, sl=False, lfe=False, sr=False, spdif=False, rr=False, rl=False):
     """
     This function can be used when the caller application wants to turn on/off speaker icons on the upper right part of LCD module.
 
@@ -381,7 +887,9 @@ def setLcdSpeakerIcon(l=False, c=False, r=False, sl=False, lfe=False, sr=False,
     spdif : bool
         SPDIF Digital
     rr : bool
-        I don't know.
+        Rear Right
+    rl : bool
+        Rear Left
 
     Notes
     -----
@@ -399,15 +907,7 @@ def setLcdSpeakerIcon(l=False, c=False, r=False, sl=False, lfe=False, sr=False,
         DSP_E_NOT_INITED or DSP_E_FAIL can be returned if failed.
 
     """
-    # No Idea if this will work
-    bits1 = [l, c, r, sl, lfe, sr, spdif]
-    bits2 = [rr, False, False, False, False, False, False, False]
-    byte1 = int(''.join([str(int(x)) for x in bits1]), 2)
-    byte2 = int(''.join([str(int(x)) for x in bits2]), 2)
-    result = imonDll.IMON_Display_SetLcdSpeakerIcon(BYTE(byte1), BYTE(byte2))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
-    raise Exception, result.name
+    return setLcdIconBytes('speaker', ICON_LAYOUTS['speaker'].pack((l, c, r, sl, lfe, sr, rl, spdif, rr)))
 
 def setLcdVideoCodecIcon(mpg=False, divx=False, xvid=False, wmv=False, mp3=False, ac3=False, dts=False, wma=False):
     """
@@ -441,13 +941,7 @@ def setLcdVideoCodecIcon(mpg=False, divx=False, xvid=False, wmv=False, mp3=False
         DSP_E_NOT_INITED or DSP_E_FAIL can be returned if failed.
 
     """
-    # No Idea if this will work.
-    bits = [mpg, divx, xvid, wmv, mp3, ac3, dts, wma]
-    byte = int(''.join([str(int(x)) for x in bits]), 2)
-    result = imonDll.IMON_Display_SetLcdVideoCodecIcon(BYTE(byte))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
-    raise Exception, result.name
+    return setLcdIconBytes('videoCodec', ICON_LAYOUTS['videoCodec'].pack((mpg, divx, xvid, wmv, mp3, ac3, dts, wma)))
 
 def setLcdAudioCodecIcon(mp3=False, ogg=False, wma=False, wav=False):
     """
@@ -475,13 +969,7 @@ def setLcdAudioCodecIcon(mp3=False, ogg=False, wma=False, wav=False):
         DSP_SUCCEEDED will be returned if succeeded.
 
     """
-    # No Idea if this works
-    bits = [mp3, ogg, wma, wav, False, False, False, False]
-    byte = int(''.join([str(int(x)) for x in bits]), 2)
-    result = imonDll.IMON_Display_SetLcdAudioCodecIcon(BYTE(byte))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
-    raise Exception, result.name
+    return setLcdIconBytes('audioCodec', ICON_LAYOUTS['audioCodec'].pack((mp3, ogg, wma, wav)))
 
 def setLcdAspectRatioIcon(src=False, fit=False, tv=False, hdtv=False, scr1=False, scr2=False):
     """
@@ -511,13 +999,7 @@ def setLcdAspectRatioIcon(src=False, fit=False, tv=False, hdtv=False, scr1=False
     Each bit represents one of aspect ratio icons. From MSB each bit represents SRC, FIT, TV, HDTV, SCR1 and SCR2 icon.
 
     """
-    # No Idea if this works
-    bits = [src, fit, tv, hdtv, scr1, scr2, False, False]
-    byte = int(''.join([str(int(x)) for x in bits]), 2)
-    result = imonDll.IMON_Display_SetLcdAspectRatioIcon(BYTE(byte))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
-    raise Exception, result.name
+    return setLcdIconBytes('aspectRatio', ICON_LAYOUTS['aspectRatio'].pack((src, fit, tv, hdtv, scr1, scr2)))
 
 def setLcdEtcIcon(repeat=False, shuffle=False, alarm=False, rec=False, vol=False, time=False):
     """
@@ -544,14 +1026,9 @@ def setLcdEtcIcon(repeat=False, shuffle=False, alarm=False, rec=False, vol=False
     Each bit represents icon. From MSB each bit represents REPEAT, SHUFFLE, ALARM, REC, VOL and TIME icon.
 
     """
-    # No Idea if this works
-    bits = [repeat, shuffle, alarm, rec, vol, time, False, False]
-    byte = int(''.join([str(int(x)) for x in bits]), 2)
-    result = imonDll.IMON_Display_SetLcdEtcIcon(BYTE(byte))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
-    raise Exception, result.name
+    return setLcdIconBytes('etc', ICON_LAYOUTS['etc'].pack((repeat, shuffle, alarm, rec, vol, time)))
 
+@_recorded
 def setLcdProgress(progress, total):
     """
     This function can be used when the caller application wants to display progress bar on the upper and lower left part of text area of LCD module.
@@ -575,29 +1052,31 @@ def setLcdProgress(progress, total):
 
     """
     # Should work
+    if _isShown('progress', (progress, total)) or _held('progress', setLcdProgress, progress, total):
+        return DSPResult.DSP_SUCCEEDED
     result = imonDll.IMON_Display_SetLcdProgress(c_int(progress), c_int(total))
     if (result == DSPResult.DSP_SUCCEEDED):
+        _shown('progress', (progress, total))
         return result
     raise Exception, result.name
 
-imonDll.IMON_Display_SetLcdEqData.argtypes = [POINTER(DSPEQDATA), POINTER(DSPEQDATA)]
-imonDll.IMON_Display_SetLcdEqData.restype = DSPResult
-
+@_recorded
 def setLcdEqData(eqDataLeft, eqDataRight):
     """
     This function can be used when the caller application wants to display equalizer data on LCD module.
 
     Parameters
     ----------
-    eqDataLeft: dict
+    eqDataLeft: dict, sequence or buffer
         Accepts a dictionary container bands 1 - 16 For the Left Channel. for example:{1: 14, 2: 50, etc...}
-    eqDataRight: dict
+    eqDataRight: dict, sequence or buffer
         Accepts a dictionary container bands 1 - 16 For the Right Channel.
 
     Notes
     -----
     Any missing bands not defined will be defaulted to 0. Each band should range from 0 - 100. The key for each being 1 - 16
     (starts at 1 not 0)
+    Like setVfdEqData, sequences of 16 bands and int32 buffers are accepted as well.
 
     Returns
     -------
@@ -614,14 +1093,23 @@ def setLcdEqData(eqDataLeft, eqDataRight):
     >>>setLcdEqData({1:21, 2:13, 3:10}, {14:21, 15:13, 16:10})
 
     """
-    cEqDataLeft = bandInfoToCType(eqDataLeft)
-    cEqDataRight = bandInfoToCType(eqDataRight)
-    dspEqDataLeft = DSPEQDATA(cEqDataLeft)
-    dspEqDataRight = DSPEQDATA(cEqDataRight)
-
-    result = imonDll.IMON_Display_SetLcdEqData(byref(dspEqDataLeft), byref(dspEqDataRight))
-    if (result == DSPResult.DSP_SUCCEEDED):
-        return result
+    # the left buffer's lock guards the pair
+    with lcdEqLeftBuffer.lock:
+        lcdEqLeftBuffer.fill(eqDataLeft)
+        lcdEqRightBuffer.fill(eqDataRight)
+        if 'lcdEq' in shadow and not lcdEqLeftBuffer.isChanged() and not lcdEqRightBuffer.isChanged():
+            writeStats['suppressed'] += 1
+            if rateLimiter is not None:
+                rateLimiter.discard('IMON_Display_SetLcdEqData')
+            return DSPResult.DSP_SUCCEEDED
+        if _held('lcdEq', setLcdEqData, eqDataLeft, eqDataRight):
+            return DSPResult.DSP_SUCCEEDED
+        result = imonDll.IMON_Display_SetLcdEqData(lcdEqLeftBuffer.backRef(), lcdEqRightBuffer.backRef())
+        if (result == DSPResult.DSP_SUCCEEDED):
+            lcdEqLeftBuffer.swap()
+            lcdEqRightBuffer.swap()
+            _shown('lcdEq', (lcdEqLeftBuffer, lcdEqRightBuffer))
+            return result
     raise Exception, result.name
 
 
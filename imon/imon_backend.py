@@ -0,0 +1,268 @@
+"""
+Backends implement the IMON_Display_* entry points from iMONDisplayAPI.h.
+imon_api makes all of its calls through a backend, which is only created the
+first time the api is used, so importing imon is cheap and works on hosts
+that don't have (or can't load) iMONDisplay.dll.
+
+The real DLL is the 'dll' backend. Other backends can be registered with
+registerBackend, and are selected with imon_api.useBackend or the IMON_BACKEND
+environment variable.
+
+Every entry point is called with the same ctypes arguments the DLL expects
+and returns a DSPResult member. imon_api puts a SerializedBackend in front
+of the backend in use, so only one entry point runs at a time, whichever
+thread calls it.
+
+Attributes
+----------
+ENTRY_POINTS : tuple
+    The names of all entry points a backend implements.
+BACKENDS : dict
+    Backend factories by name.
+
+"""
+
+import os
+from ctypes import CDLL, c_int, POINTER, c_wchar_p
+from os.path import dirname, join, abspath
+from imon_message import DSPResult, DSPEQDATA
+
+try:
+    from ctypes.wintypes import HWND, UINT, BOOL, BYTE
+except (ImportError, ValueError):
+    # ctypes.wintypes can't be imported off Windows on some python versions,
+    # these are the same definitions.
+    from ctypes import c_void_p as HWND, c_uint as UINT, c_long as BOOL, c_byte as BYTE
+
+# Type required for setting text
+LPCTSTR = c_wchar_p
+
+# The environment variable naming the backend to use
+BACKEND_ENV = "IMON_BACKEND"
+
+DEFAULT_BACKEND = "dll"
+
+ENTRY_POINTS = (
+    'IMON_Display_Init',
+    'IMON_Display_Uninit',
+    'IMON_Display_IsInited',
+    'IMON_Display_IsPluginModeEnabled',
+    'IMON_Display_SetVfdText',
+    'IMON_Display_SetVfdEqData',
+    'IMON_Display_SetLcdText',
+    'IMON_Display_SetLcdEqData',
+    'IMON_Display_SetLcdAllIcons',
+    'IMON_Display_SetLcdOrangeIcon',
+    'IMON_Display_SetLcdMediaTypeIcon',
+    'IMON_Display_SetLcdSpeakerIcon',
+    'IMON_Display_SetLcdVideoCodecIcon',
+    'IMON_Display_SetLcdAudioCodecIcon',
+    'IMON_Display_SetLcdAspectRatioIcon',
+    'IMON_Display_SetLcdEtcIcon',
+    'IMON_Display_SetLcdProgress',
+)
+
+# DLL Function signatures, (argtypes, restype)
+SIGNATURES = {
+    'IMON_Display_Init': ([HWND, UINT], DSPResult),
+    'IMON_Display_Uninit': ([], DSPResult),
+    'IMON_Display_IsInited': ([], DSPResult),
+    'IMON_Display_IsPluginModeEnabled': ([], DSPResult),
+    'IMON_Display_SetVfdText': ([LPCTSTR, LPCTSTR], DSPResult),
+    'IMON_Display_SetVfdEqData': ([POINTER(DSPEQDATA)], DSPResult),
+    'IMON_Display_SetLcdText': ([LPCTSTR], DSPResult),
+    'IMON_Display_SetLcdEqData': ([POINTER(DSPEQDATA), POINTER(DSPEQDATA)], DSPResult),
+    'IMON_Display_SetLcdAllIcons': ([BOOL], DSPResult),
+    'IMON_Display_SetLcdOrangeIcon': ([BYTE, BYTE], DSPResult),
+    'IMON_Display_SetLcdMediaTypeIcon': ([BYTE], DSPResult),
+    'IMON_Display_SetLcdSpeakerIcon': ([BYTE, BYTE], DSPResult),
+    'IMON_Display_SetLcdVideoCodecIcon': ([BYTE], DSPResult),
+    'IMON_Display_SetLcdAudioCodecIcon': ([BYTE], DSPResult),
+    'IMON_Display_SetLcdAspectRatioIcon': ([BYTE], DSPResult),
+    'IMON_Display_SetLcdEtcIcon': ([BYTE], DSPResult),
+    'IMON_Display_SetLcdProgress': ([c_int, c_int], DSPResult),
+}
+
+class Backend(object):
+    """
+    Base class for backends. Every entry point fails with DSP_E_FAIL until
+    it is overridden.
+
+    Attributes
+    ----------
+    name : string
+        The name the backend is registered under.
+
+    """
+
+    name = None
+
+    def _notImplemented(self, *args):
+        return DSPResult.DSP_E_FAIL
+
+    IMON_Display_Init = _notImplemented
+    IMON_Display_Uninit = _notImplemented
+    IMON_Display_IsInited = _notImplemented
+    IMON_Display_IsPluginModeEnabled = _notImplemented
+    IMON_Display_SetVfdText = _notImplemented
+    IMON_Display_SetVfdEqData = _notImplemented
+    IMON_Display_SetLcdText = _notImplemented
+    IMON_Display_SetLcdEqData = _notImplemented
+    IMON_Display_SetLcdAllIcons = _notImplemented
+    IMON_Display_SetLcdOrangeIcon = _notImplemented
+    IMON_Display_SetLcdMediaTypeIcon = _notImplemented
+    IMON_Display_SetLcdSpeakerIcon = _notImplemented
+    IMON_Display_SetLcdVideoCodecIcon = _notImplemented
+    IMON_Display_SetLcdAudioCodecIcon = _notImplemented
+    IMON_Display_SetLcdAspectRatioIcon = _notImplemented
+    IMON_Display_SetLcdEtcIcon = _notImplemented
+    IMON_Display_SetLcdProgress = _notImplemented
+
+class DllBackend(Backend):
+    """
+    The real thing, iMONDisplay.dll loaded through ctypes.
+    The DLL functions replace the entry points, so calls go straight to ctypes.
+    """
+
+    name = "dll"
+
+    def __init__(self, path=None):
+        """
+        Constructor. Loads the DLL into memory.
+
+        Parameters
+        ----------
+        path : string
+            Location of iMONDisplay.dll, defaults to the copy shipped in this package.
+
+        """
+        if path is None:
+            path = abspath(join(dirname(__file__), "iMONDisplay.dll"))
+        self.dll = CDLL(path)
+        for entryPoint in ENTRY_POINTS:
+            function = getattr(self.dll, entryPoint)
+            function.argtypes, function.restype = SIGNATURES[entryPoint]
+            setattr(self, entryPoint, function)
+
+class NullBackend(Backend):
+    """
+    Accepts every call and displays nothing. Handy for measuring the
+    overhead of everything above the DLL.
+    """
+
+    name = "null"
+
+    def __init__(self):
+        self.inited = False
+
+    def _succeeded(self, *args):
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_Init(self, hwnd, wm):
+        self.inited = True
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_Uninit(self):
+        self.inited = False
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_IsInited(self):
+        return DSPResult.DSP_S_INITED if self.inited else DSPResult.DSP_S_NOT_INITED
+
+    def IMON_Display_IsPluginModeEnabled(self):
+        return DSPResult.DSP_S_IN_PLUGIN_MODE if self.inited else DSPResult.DSP_S_NOT_IN_PLUGIN_MODE
+
+    IMON_Display_SetVfdText = _succeeded
+    IMON_Display_SetVfdEqData = _succeeded
+    IMON_Display_SetLcdText = _succeeded
+    IMON_Display_SetLcdEqData = _succeeded
+    IMON_Display_SetLcdAllIcons = _succeeded
+    IMON_Display_SetLcdOrangeIcon = _succeeded
+    IMON_Display_SetLcdMediaTypeIcon = _succeeded
+    IMON_Display_SetLcdSpeakerIcon = _succeeded
+    IMON_Display_SetLcdVideoCodecIcon = _succeeded
+    IMON_Display_SetLcdAudioCodecIcon = _succeeded
+    IMON_Display_SetLcdAspectRatioIcon = _succeeded
+    IMON_Display_SetLcdEtcIcon = _succeeded
+    IMON_Display_SetLcdProgress = _succeeded
+
+class SerializedBackend(object):
+    """
+    Stands in front of a backend, making its entry point calls one at a
+    time under a lock. Anything else is passed through to the backend.
+
+    The lock is only held for the call itself, and nothing else is locked
+    while it is held, so threads holding locks of their own (the EQ
+    buffers, the render loop, the clock) can't deadlock on it.
+
+    Attributes
+    ----------
+    backend : Backend
+        The backend doing the work.
+    lock : RLock
+        Held for every entry point call. Backends that report back from
+        within a call may call in again from the same thread.
+
+    """
+
+    def __init__(self, backend, lock):
+        self.backend = backend
+        self.lock = lock
+        for entryPoint in ENTRY_POINTS:
+            setattr(self, entryPoint, self._serialized(getattr(backend, entryPoint)))
+
+    def _serialized(self, function):
+        lock = self.lock
+
+        def serialized(*args):
+            with lock:
+                return function(*args)
+        return serialized
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+BACKENDS = {
+    'dll': DllBackend,
+    'null': NullBackend,
+}
+
+def registerBackend(name, factory):
+    """
+    Makes a backend selectable by name.
+
+    Parameters
+    ----------
+    name : string
+        The name used with createBackend / IMON_BACKEND.
+    factory : callable
+        Called without arguments to create the backend.
+
+    """
+    BACKENDS[name] = factory
+
+def createBackend(name=None):
+    """
+    Creates a backend.
+
+    Parameters
+    ----------
+    name : string
+        A registered backend name, or a 'module:factory' path to import.
+        Defaults to the IMON_BACKEND environment variable, or 'dll' if that is not set.
+
+    Raises
+    ------
+    LookupError
+        Raised if there is no backend with that name.
+
+    """
+    if not name:
+        name = os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    if ':' in name:
+        moduleName, factoryName = name.split(':', 1)
+        module = __import__(moduleName, fromlist=[factoryName])
+        return getattr(module, factoryName)()
+    raise LookupError, "No such backend: " + str(name)
@@ -0,0 +1,276 @@
+"""
+A clock on the VFD that keeps itself up to date.
+
+Instead of being redrawn from a periodic timer, the clock works out from its
+formats when the shown text next changes (the next second, minute, hour or
+day) and sleeps until exactly then. Each line is formatted once per change
+and kept until it is due again, so the date line is formatted once a day,
+and only a line whose text changed gets written, see imon_api.setVfdLine.
+
+Example
+-------
+>>> clock = VfdClock(imon_api, "%a %d %b", "%H:%M")
+>>> clock.start()
+>>> clock.pause(resumeAfter=10)  # something else shows on the display for a while
+>>> clock.stop()
+
+"""
+
+import re
+import threading
+import time
+
+# Seconds the text of a strftime directive stays the same, the coarsest
+# being a day. Directives not listed (dates, names) change daily.
+DIRECTIVE_PERIODS = {
+    'S': 1, 'c': 1, 'T': 1, 'X': 1, 'r': 1, 's': 1,
+    'M': 60, 'R': 60,
+    'H': 3600, 'I': 3600, 'p': 3600, 'k': 3600, 'l': 3600,
+}
+DAY = 86400
+
+_directive = re.compile(r'%[-#_0^]?([a-zA-Z%])')
+
+# How far past a change the clock wakes, so formatting sees the new time.
+WAKE_MARGIN = 0.005
+
+def formatPeriod(format):
+    """
+    Returns
+    -------
+    int
+        How many seconds the text a strftime format produces stays the same,
+        at most: 1, 60, 3600 or DAY.
+
+    """
+    return min([DIRECTIVE_PERIODS.get(code, DAY) for code in _directive.findall(format)] + [DAY])
+
+def nextChange(now, period):
+    """
+    Returns
+    -------
+    float
+        The time after now when text of the given period changes, in local
+        time.
+
+    """
+    if period == 1:
+        return int(now) + 1
+    local = time.localtime(now)
+    if period == 60:
+        return int(now) - local.tm_sec + 60
+    if period == 3600:
+        return int(now) - local.tm_min * 60 - local.tm_sec + 3600
+    # mktime normalizes the day after the last of the month
+    return time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+
+class ClockLine(object):
+    """
+    One formatted line of the clock, with the time it is good until.
+
+    Attributes
+    ----------
+    format : string
+        strftime format.
+    text : string
+        The last formatted text.
+    validUntil : float
+        When text has to be formatted again.
+
+    """
+
+    __slots__ = ('format', 'period', 'text', 'validUntil')
+
+    def __init__(self, format):
+        self.format = format
+        self.period = formatPeriod(format)
+        self.text = None
+        self.validUntil = 0.0
+
+    def render(self, now):
+        """The text of the line at now, formatted again only if it is due."""
+        if now >= self.validUntil:
+            self.text = time.strftime(self.format, time.localtime(now))
+            self.validUntil = nextChange(now, self.period)
+        return self.text
+
+class VfdClock(object):
+    """
+    Shows the date and time on the two VFD lines, from its own thread.
+
+    Attributes
+    ----------
+    onError : callable
+        Called with the exception when a write fails.
+    onResume : callable
+        Called from the clock thread when a pause ends by itself, before the
+        clock writes again, to stop whatever showed while it was paused.
+    writes : int
+        The number of writes made.
+
+    """
+
+    def __init__(self, api, dateFormat="%x", timeFormat="%I:%M %p", onError=None, onResume=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            The module used to write, normally imon_api.
+        dateFormat : string
+            strftime format of the 1st line.
+        timeFormat : string
+            strftime format of the 2nd line.
+        onError : callable
+        onResume : callable
+
+        """
+        self.api = api
+        self.onError = onError
+        self.onResume = onResume
+        self.writes = 0
+        self.lines = (ClockLine(dateFormat), ClockLine(timeFormat))
+        self.shown = [None, None]
+        self.resumeAt = None
+        self._paused = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+
+    def start(self, dateFormat=None, timeFormat=None):
+        """
+        Shows the clock, resuming it if it was paused.
+
+        Parameters
+        ----------
+        dateFormat : string
+            A new format for the 1st line, None to keep the current one.
+        timeFormat : string
+            A new format for the 2nd line, None to keep the current one.
+
+        """
+        with self._lock:
+            lines = list(self.lines)
+            if dateFormat is not None:
+                lines[0] = ClockLine(dateFormat)
+            if timeFormat is not None:
+                lines[1] = ClockLine(timeFormat)
+            self.lines = tuple(lines)
+            self.shown = [None, None]
+            self._paused = False
+            self.resumeAt = None
+            self._stop = False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="iMON VFD Clock")
+                self._thread.daemon = True
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        """Stops the clock, leaving the display as it is."""
+        with self._lock:
+            self._stop = True
+            thread = self._thread
+        self._wake.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def pause(self, resumeAfter=0):
+        """
+        Stops writing while something else owns the display.
+
+        Parameters
+        ----------
+        resumeAfter : float
+            Seconds after which the clock shows again, 0 to stay paused until
+            resume or start is called. Pausing again restarts the wait.
+
+        """
+        with self._lock:
+            if self._thread is None:
+                return
+            self._paused = True
+            self.resumeAt = time.time() + resumeAfter if resumeAfter else None
+        self._wake.set()
+
+    def resume(self):
+        """Shows the clock again after a pause, rewriting both lines."""
+        with self._lock:
+            self._paused = False
+            self.resumeAt = None
+            self.shown = [None, None]
+        self._wake.set()
+
+    def isRunning(self):
+        """Returns True if the clock is started, paused or not."""
+        return self._thread is not None
+
+    def isPaused(self):
+        """Returns True while the clock is paused."""
+        return self._paused
+
+    def step(self, now=None):
+        """
+        Writes the lines whose text changed, unless the clock is paused.
+
+        The write is made with the lock held, so a pause returning means the
+        clock won't write over whatever is shown next.
+
+        Returns
+        -------
+        float
+            When the text next changes.
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            texts = [line.render(now) for line in self.lines]
+            changed = [texts[index] != self.shown[index] for index in (0, 1)]
+            due = min(line.validUntil for line in self.lines)
+            if self._paused:
+                return due
+            try:
+                if changed[0] and changed[1]:
+                    self.api.setVfdText(texts[0], texts[1])
+                elif changed[0]:
+                    self.api.setVfdLine(0, texts[0])
+                elif changed[1]:
+                    self.api.setVfdLine(1, texts[1])
+                else:
+                    return due
+            except Exception, msg:
+                if self.onError is not None:
+                    self.onError(msg)
+                # tried again at the next change
+                return due
+            self.shown = texts
+            self.writes += 1
+        return due
+
+    def _run(self):
+        """Clock thread body."""
+        while True:
+            self._wake.clear()
+            resumed = False
+            with self._lock:
+                if self._stop:
+                    self._thread = None
+                    return
+                if self._paused and self.resumeAt is not None and time.time() >= self.resumeAt:
+                    self._paused = False
+                    self.resumeAt = None
+                    self.shown = [None, None]
+                    resumed = True
+                paused = self._paused
+                resumeAt = self.resumeAt
+            if resumed and self.onResume is not None:
+                self.onResume()
+            if paused:
+                delay = resumeAt - time.time() if resumeAt is not None else None
+            else:
+                delay = self.step() - time.time() + WAKE_MARGIN
+            if delay is None or delay > 0:
+                self._wake.wait(delay)
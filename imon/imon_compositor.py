@@ -0,0 +1,419 @@
+"""
+Priority layers for the display, so several producers (a clock, now playing,
+a volume OSD, call alerts) can share it without the last writer winning.
+
+Each producer writes into its own named layer, which has a priority and
+optionally a time to live. Whenever a layer changes or expires, the
+compositor works out, region by region (each VFD line, the EQs, the LCD text,
+each icon group and the progress bar), what the highest priority layer
+holding that region wants shown, and writes only the regions whose content
+changed. Once an overlay expires, whatever the layer underneath holds shows
+again, without its producer having to send it again.
+
+The VFD shows either text or its EQ, so the VFD lines and the VFD EQ are
+won together by the highest layer holding any of them. If it holds text,
+each line shows from the highest layer holding it, down to the first layer
+holding the VFD EQ. A region that no layer holds any more is blanked.
+
+Example
+-------
+>>> compositor = Compositor(imon_api)
+>>> compositor.start()
+>>> compositor.put("nowPlaying", {'vfdLine1': "Some Artist", 'vfdLine2': "Some Song"})
+>>> compositor.put("volume", {'vfdLine2': "Volume 40%"}, priority=10, ttl=3)
+>>> # 3 seconds later, the 2nd line shows "Some Song" again
+
+Producers written against imon_api, such as VfdClock, write into a layer
+through a LayerTarget:
+
+>>> clock = VfdClock(compositor.target("clock", priority=-10))
+
+"""
+
+import threading
+import time
+from imon_message import DSPResult
+from imon_icons import ICON_GROUPS, ICON_LAYOUTS
+
+# The regions a layer can hold. Icon groups are regions of their own.
+REGIONS = ('vfdLine1', 'vfdLine2', 'vfdEq', 'lcdText', 'lcdEq', 'progress') + \
+    tuple(group + 'Icon' for group in ICON_GROUPS)
+
+VFD_TEXT_REGIONS = ('vfdLine1', 'vfdLine2')
+
+# What a region is blanked with once no layer holds it.
+BLANK = dict([('vfdLine1', u""), ('vfdLine2', u""), ('vfdEq', (0,) * 16), ('lcdText', u""),
+              ('lcdEq', ((0,) * 16, (0,) * 16)), ('progress', (0, 0))] +
+             [(group + 'Icon', (0,) * ICON_LAYOUTS[group].size) for group in ICON_GROUPS])
+
+def _bands(eqData):
+    """A copy of eq data of any form imon_api takes, as a tuple of 16 bands."""
+    if isinstance(eqData, dict):
+        return tuple(eqData.get(band, 0) for band in range(1, 17))
+    return tuple(int(level) for level in eqData)
+
+class Layer(object):
+    """
+    Attributes
+    ----------
+    name : string
+    priority : int
+        Layers with a higher priority show over layers with a lower one.
+        Between layers of the same priority, the one changed last shows.
+    ttl : float
+        Seconds the layer shows after it last changed, 0 to keep it until
+        it is removed.
+    contents : dict
+        Content by region, the arguments of the write for the region.
+    expiresAt : float
+        When the layer is dropped, None if never.
+
+    """
+
+    __slots__ = ('name', 'priority', 'ttl', 'contents', 'expiresAt', 'serial')
+
+    def __init__(self, name, priority=0, ttl=0):
+        self.name = name
+        self.priority = priority
+        self.ttl = ttl
+        self.contents = {}
+        self.expiresAt = None
+        self.serial = 0
+
+class Compositor(object):
+    """
+    Resolves the layers into the frame shown, from its own thread.
+
+    Attributes
+    ----------
+    onError : callable
+        Called with the exception when a write fails. The region is written
+        again the next time the layers change.
+    onExpire : callable
+        Called from the compositor thread with the name of each layer that
+        expired.
+    shown : dict
+        The content last written by region.
+    writes : int
+        The number of writes made.
+
+    """
+
+    def __init__(self, api, onError=None, onExpire=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            The module used to write, normally imon_api.
+        onError : callable
+        onExpire : callable
+
+        """
+        self.api = api
+        self.onError = onError
+        self.onExpire = onExpire
+        self.layers = {}
+        self.shown = {}
+        self.writes = 0
+        self._dropped = set()
+        self._serial = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        """Starts the compositor thread, if it is not already running."""
+        with self._lock:
+            self._stop = False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="iMON Compositor")
+                self._thread.daemon = True
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        """Stops the compositor thread, leaving the display as it is."""
+        with self._lock:
+            self._stop = True
+            thread = self._thread
+        self._wake.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def isRunning(self):
+        """Returns True if the compositor thread is running."""
+        return self._thread is not None
+
+    def put(self, name, contents, priority=None, ttl=None, renew=True):
+        """
+        Changes a layer, creating it if need be.
+
+        Parameters
+        ----------
+        name : string
+        contents : dict
+            Content by region, see REGIONS. None drops the region from the
+            layer, so the layers underneath show there. The VFD shows either
+            text or its EQ, so putting VFD text drops the VFD EQ from the
+            layer, and the other way around.
+        priority : int
+            The new priority of the layer, None to keep it (0 for a new layer).
+        ttl : float
+            The new time to live of the layer, None to keep it. Either way,
+            the layer now shows for ttl seconds more.
+        renew : bool
+            False keeps when the layer expires, and drops the change if the
+            layer is gone, such as for the frames of an animation that
+            shouldn't keep the layer showing.
+
+        Returns
+        -------
+        bool
+            False if the change was dropped.
+
+        Raises
+        ------
+        KeyError
+            Raised for a region that isn't in REGIONS, nothing changes then.
+
+        """
+        for region in contents:
+            if region not in REGIONS:
+                raise KeyError, "Unknown display region: " + str(region)
+        with self._lock:
+            layer = self.layers.get(name)
+            if layer is None:
+                if not renew:
+                    return False
+                layer = self.layers[name] = Layer(name)
+            if priority is not None:
+                layer.priority = priority
+            if ttl is not None:
+                layer.ttl = ttl
+            if contents.get('vfdEq') is not None:
+                for region in VFD_TEXT_REGIONS:
+                    layer.contents.pop(region, None)
+            elif any(contents.get(region) is not None for region in VFD_TEXT_REGIONS):
+                layer.contents.pop('vfdEq', None)
+            for region, content in contents.iteritems():
+                if content is None:
+                    layer.contents.pop(region, None)
+                else:
+                    layer.contents[region] = content
+            if renew:
+                layer.expiresAt = time.time() + layer.ttl if layer.ttl else None
+            self._serial += 1
+            layer.serial = self._serial
+        self._wake.set()
+        return True
+
+    def remove(self, name):
+        """Drops a layer, the layers underneath show in its place."""
+        with self._lock:
+            if self.layers.pop(name, None) is None:
+                return
+        self._wake.set()
+
+    def refresh(self):
+        """
+        Writes every region again at the next tick, such as after the display
+        was lost while writes failed.
+        """
+        with self._lock:
+            self.shown = {}
+        self._wake.set()
+
+    def target(self, name, priority=0, ttl=0, renew=True):
+        """
+        Returns
+        -------
+        LayerTarget
+            The api write functions, writing into the layer.
+
+        """
+        return LayerTarget(self, name, priority, ttl, renew)
+
+    def resolve(self, now=None):
+        """
+        Drops the expired layers, see onExpire.
+
+        Returns
+        -------
+        dict
+            The content of the highest priority layer holding each region,
+            either VFD text or the VFD EQ.
+
+        """
+        if now is None:
+            now = time.time()
+        expired = []
+        with self._lock:
+            for name, layer in self.layers.items():
+                if layer.expiresAt is not None and layer.expiresAt <= now:
+                    del self.layers[name]
+                    expired.append(name)
+            frame = {}
+            # lowest first, so higher layers overwrite
+            for layer in sorted(self.layers.itervalues(), key=lambda layer: (layer.priority, layer.serial)):
+                if 'vfdEq' in layer.contents:
+                    for region in VFD_TEXT_REGIONS:
+                        frame.pop(region, None)
+                elif any(region in layer.contents for region in VFD_TEXT_REGIONS):
+                    frame.pop('vfdEq', None)
+                frame.update(layer.contents)
+        if self.onExpire is not None:
+            for name in expired:
+                self.onExpire(name)
+        return frame
+
+    def nextExpiry(self):
+        """Returns when the next layer expires, None if none does."""
+        with self._lock:
+            expiries = [layer.expiresAt for layer in self.layers.itervalues() if layer.expiresAt is not None]
+        return min(expiries) if expiries else None
+
+    def tick(self, now=None):
+        """
+        Writes the regions whose resolved content changed, and blanks the
+        ones no layer holds any more.
+
+        Returns
+        -------
+        int
+            The number of writes made.
+
+        """
+        frame = self.resolve(now)
+        shown = self.shown
+        changed = dict((region, content) for region, content in frame.iteritems()
+                       if region not in shown or shown[region] != content)
+        # regions to blank, and forget once blanked
+        dropped = set(region for region in shown if region not in frame)
+        if 'vfdEq' in frame:
+            # the EQ replaces the text, no need to blank it
+            for region in VFD_TEXT_REGIONS:
+                if region in dropped:
+                    dropped.discard(region)
+                    del shown[region]
+        elif 'vfdEq' in dropped:
+            del shown['vfdEq']
+            dropped.discard('vfdEq')
+            if not any(region in frame for region in VFD_TEXT_REGIONS):
+                # switching back from the EQ to blank text
+                dropped.update(VFD_TEXT_REGIONS)
+        for region in dropped:
+            changed[region] = BLANK[region]
+        self._dropped = dropped
+        writes = 0
+        if 'vfdLine1' in changed and 'vfdLine2' in changed:
+            writes += self._write(changed, ('vfdLine1', 'vfdLine2'), self.api.setVfdText,
+                                  changed['vfdLine1'], changed['vfdLine2'])
+        elif 'vfdLine1' in changed:
+            writes += self._write(changed, ('vfdLine1',), self.api.setVfdLine, 0, changed['vfdLine1'])
+        elif 'vfdLine2' in changed:
+            writes += self._write(changed, ('vfdLine2',), self.api.setVfdLine, 1, changed['vfdLine2'])
+        if 'vfdEq' in changed:
+            writes += self._write(changed, ('vfdEq',), self.api.setVfdEqData, changed['vfdEq'])
+        if 'lcdText' in changed:
+            writes += self._write(changed, ('lcdText',), self.api.setLcdText, changed['lcdText'])
+        if 'lcdEq' in changed:
+            writes += self._write(changed, ('lcdEq',), self.api.setLcdEqData, *changed['lcdEq'])
+        for group in ICON_GROUPS:
+            region = group + 'Icon'
+            if region in changed:
+                writes += self._write(changed, (region,), self.api.setLcdIconBytes, group, changed[region])
+        if 'progress' in changed:
+            writes += self._write(changed, ('progress',), self.api.setLcdProgress, *changed['progress'])
+        return writes
+
+    def _write(self, changed, regions, function, *args):
+        """
+        Makes a write, recording its regions as shown if it succeeded, or
+        forgetting them if they were blanked.
+        """
+        try:
+            function(*args)
+        except Exception, msg:
+            if self.onError is not None:
+                self.onError(msg)
+            return 0
+        for region in regions:
+            if region in self._dropped:
+                self.shown.pop(region, None)
+            else:
+                self.shown[region] = changed[region]
+        self.writes += 1
+        return 1
+
+    def _run(self):
+        """Compositor thread body."""
+        while True:
+            self._wake.clear()
+            with self._lock:
+                if self._stop:
+                    self._thread = None
+                    return
+            self.tick()
+            expiresAt = self.nextExpiry()
+            delay = expiresAt - time.time() if expiresAt is not None else None
+            if delay is None or delay > 0:
+                self._wake.wait(delay)
+
+class LayerTarget(object):
+    """
+    The imon_api write functions, writing into a layer of a Compositor
+    instead of the display. Every write succeeds right away, the compositor
+    makes the actual write when the layer shows.
+
+    Attributes
+    ----------
+    compositor : Compositor
+    name : string
+        The layer written into.
+    priority : int
+    ttl : float
+        Set on the layer with every write, None to keep the layer's.
+    renew : bool
+        See Compositor.put.
+
+    """
+
+    def __init__(self, compositor, name, priority=0, ttl=0, renew=True):
+        self.compositor = compositor
+        self.name = name
+        self.priority = priority
+        self.ttl = ttl
+        self.renew = renew
+
+    def put(self, contents):
+        """Writes content by region into the layer."""
+        self.compositor.put(self.name, contents, self.priority, self.ttl, self.renew)
+        return DSPResult.DSP_SUCCEEDED
+
+    def remove(self):
+        """Drops the layer."""
+        self.compositor.remove(self.name)
+
+    def setVfdText(self, line1, line2):
+        return self.put({'vfdLine1': line1, 'vfdLine2': line2})
+
+    def setVfdLine(self, index, text):
+        return self.put({('vfdLine1', 'vfdLine2')[index]: text})
+
+    def setVfdEqData(self, eqData):
+        return self.put({'vfdEq': _bands(eqData)})
+
+    def setLcdText(self, line):
+        return self.put({'lcdText': line})
+
+    def setLcdEqData(self, eqDataLeft, eqDataRight):
+        return self.put({'lcdEq': (_bands(eqDataLeft), _bands(eqDataRight))})
+
+    def setLcdIconBytes(self, group, data):
+        return self.put({group + 'Icon': tuple(data)})
+
+    def setLcdProgress(self, progress, total):
+        return self.put({'progress': (progress, total)})
@@ -0,0 +1,151 @@
+"""
+Keeps track of the connection to the iMON Manager, so that checking if the
+display can be written to does not cost any DLL calls.
+
+The state is fed by the results of init / unInit and by the notifications
+iMON sends to the window registered with init. The DLL is only asked again
+(probed) when a write fails because the API is not initialized, or when
+iMON or the hardware comes back.
+
+Attributes
+----------
+ConnectionState : ImonEnum
+    CONN_DISCONNECTED
+        init has not been called, or unInit was called, or iMON closed.
+    CONN_INITED
+        init succeeded, waiting for iMON to grant Display Plug-in Mode.
+    CONN_CONNECTED
+        The display is in Display Plug-in Mode and can be written to.
+    CONN_FAILED
+        iMON refused Display Plug-in Mode, or the hardware is disconnected.
+
+"""
+
+from imon_enum import ImonEnum
+from imon_message import DSPResult
+
+ConnectionState = ImonEnum(
+    ('CONN_DISCONNECTED', 0),
+    ('CONN_INITED',),
+    ('CONN_CONNECTED',),
+    ('CONN_FAILED',)
+)
+
+class Connection(object):
+    """
+    Connection state machine for the iMON Display API.
+
+    Attributes
+    ----------
+    state : EnumMember
+        The current ConnectionState.
+    probes : int
+        The number of times the DLL has been probed for the state.
+
+    """
+
+    def __init__(self, api):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            The module used to probe the state, normally imon_api.
+
+        """
+        self.api = api
+        self.state = ConnectionState.CONN_DISCONNECTED
+        self.probes = 0
+
+    def isConnected(self):
+        """Returns True if the display can be written to."""
+        return self.state == ConnectionState.CONN_CONNECTED
+
+    def probe(self):
+        """
+        Asks the DLL for the real state, and updates the cached state to match.
+
+        Returns
+        -------
+        EnumMember
+            The new ConnectionState.
+
+        """
+        self.probes += 1
+        if not self.api.isInited():
+            self.state = ConnectionState.CONN_DISCONNECTED
+        elif self.api.isPluginModeEnabled():
+            self.state = ConnectionState.CONN_CONNECTED
+        else:
+            self.state = ConnectionState.CONN_INITED
+        return self.state
+
+    def call(self, function, *args):
+        """
+        Calls an api write function. When the write fails because the API is
+        not initialized, the DLL is probed and the write is retried once if
+        the display turns out to be connected after all.
+
+        Parameters
+        ----------
+        function : callable
+            The api function to call.
+        *args :
+            The arguments passed to the function.
+
+        Returns
+        -------
+        DSPResult
+            Whatever the function returned.
+
+        Raises
+        ------
+        Exception
+            Whatever the function raised.
+
+        """
+        try:
+            return function(*args)
+        except Exception, msg:
+            if str(msg) != DSPResult.DSP_E_NOT_INITED.name:
+                raise
+            if self.probe() != ConnectionState.CONN_CONNECTED:
+                raise
+        return function(*args)
+
+    # Events ###################################
+
+    def initialized(self):
+        """init succeeded."""
+        # the plugin mode notification can beat init's return value here.
+        if self.state != ConnectionState.CONN_CONNECTED:
+            self.state = ConnectionState.CONN_INITED
+
+    def uninitialized(self):
+        """unInit was called."""
+        self.state = ConnectionState.CONN_DISCONNECTED
+
+    def pluginSucceed(self):
+        """DSPNM_PLUGIN_SUCCEED was received."""
+        self.state = ConnectionState.CONN_CONNECTED
+
+    def pluginFailed(self):
+        """DSPNM_PLUGIN_FAILED was received."""
+        self.state = ConnectionState.CONN_FAILED
+
+    def imonRestarted(self):
+        """DSPNM_IMON_RESTARTED was received."""
+        self.probe()
+
+    def imonClosed(self):
+        """DSPNM_IMON_CLOSED was received."""
+        self.state = ConnectionState.CONN_DISCONNECTED
+
+    def hwConnected(self):
+        """DSPNM_HW_CONNECTED was received."""
+        self.probe()
+
+    def hwDisconnected(self):
+        """DSPNM_HW_DISCONNECTED was received."""
+        self.state = ConnectionState.CONN_FAILED
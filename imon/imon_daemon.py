@@ -0,0 +1,721 @@
+"""
+A display daemon owning the Display Plug-in Mode session, so several
+applications can share the display. Only one application can hold the
+session (DSPN_ERR_IN_USED otherwise).
+
+Clients connect over a local socket and make the same entry point calls as
+with the DLL, see ClientBackend. Each client writes into its own layer of a
+Compositor, at the priority it asks for: the daemon batches bursts of writes
+into the diffs of the resolved frame, and a higher priority client shows
+over a lower one. When a client goes away, the clients underneath show
+again. The daemon calls init again by itself when iMON goes away, and relays
+the notifications iMON sends to the clients that subscribed to them.
+
+Python 2 has no Unix sockets on Windows, and named pipes need pywin32, so
+clients connect over TCP, to the loopback interface only.
+
+Protocol
+--------
+Every frame starts with the length of its payload (uint16) and its kind
+(byte). All values are little endian.
+
+    kind < len(ENTRY_POINTS), client to daemon
+        A call of ENTRY_POINTS[kind], its arguments encoded with
+        imon_record.ARG_CODECS. Only the calls in QUERY_ENTRY_POINTS
+        are answered, writes are not, so clients never wait on them.
+    KIND_HELLO, client to daemon, the first frame
+        The priority (int16), 1 to subscribe to notifications or 0 (byte),
+        and the client name (text).
+    KIND_RESULT, daemon to client
+        The DSPResult value of a query (uint16), in the order of the queries.
+    KIND_NOTIFY, daemon to client
+        A notification: wParam (uint32) and lParam (int32).
+
+Example
+-------
+>>> daemon = DisplayDaemon(imon_api, hwnd=hwnd, wm=wm)
+>>> daemon.start()
+>>> daemon.notify(wParam, lParam)  # from the window receiving iMON's messages
+
+Every application then uses the client backend, IMON_BACKEND=client, or:
+
+>>> imon_api.useBackend(ClientBackend(name="scripts", priority=10))
+
+"""
+
+import itertools
+import os
+import socket
+import struct
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from imon_message import DSPResult, DSPNotifyCode, DSPNInitResult
+from imon_icons import ICON_GROUPS, ICON_LAYOUTS, ICON_ENTRY_POINTS
+from imon_backend import Backend, ENTRY_POINTS, LPCTSTR, registerBackend
+from imon_record import ARG_CODECS, CALL_CODECS, ENTRY_POINT_INDEX, KIND_NOTIFY
+from imon_connection import Connection
+from imon_compositor import Compositor
+from imon_supervisor import ReconnectSupervisor
+
+DEFAULT_ADDRESS = ('127.0.0.1', 47410)
+
+# "host:port" of the daemon clients connect to, and the name and priority
+# they connect with, for ClientBackend.fromEnvironment.
+ADDRESS_ENV = "IMON_DAEMON_ADDRESS"
+NAME_ENV = "IMON_DAEMON_NAME"
+PRIORITY_ENV = "IMON_DAEMON_PRIORITY"
+
+KIND_HELLO = 0xF0
+KIND_RESULT = 0xF1
+
+MAX_PAYLOAD = 0xFFFF
+
+# Frames waiting to be sent to a client before it is taken as stalled and dropped.
+OUTBOX_SIZE = 256
+
+# The entry points the daemon answers.
+QUERY_ENTRY_POINTS = frozenset((
+    'IMON_Display_Init',
+    'IMON_Display_Uninit',
+    'IMON_Display_IsInited',
+    'IMON_Display_IsPluginModeEnabled',
+))
+
+ICON_GROUP_BY_ENTRY_POINT = dict((entryPoint, group) for group, entryPoint in ICON_ENTRY_POINTS.iteritems())
+
+_frame = struct.Struct('<HB')
+_hello = struct.Struct('<hB')
+_result = struct.Struct('<H')
+_notify = struct.Struct('<Ii')
+_encodeName, _decodeName = ARG_CODECS[LPCTSTR][:2]
+
+# Framing ###################################
+
+def parseAddress(text):
+    """
+    Returns
+    -------
+    tuple
+        (host, port) of "host:port", or DEFAULT_ADDRESS if text is blank.
+
+    """
+    if not text:
+        return DEFAULT_ADDRESS
+    host, port = text.rsplit(':', 1)
+    return host or DEFAULT_ADDRESS[0], int(port)
+
+def encodeFrame(kind, payload=''):
+    """
+    Raises
+    ------
+    ValueError
+        Raised if the payload is too long for a frame.
+
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError, "Frame payload too long: " + str(len(payload))
+    return _frame.pack(len(payload), kind) + payload
+
+def encodeCall(entryPoint, args):
+    """Encodes a call of an entry point, with its ctypes arguments."""
+    index = ENTRY_POINT_INDEX[entryPoint]
+    return encodeFrame(index, ''.join([codec[0](arg) for codec, arg in zip(CALL_CODECS[index], args)]))
+
+def decodeCall(kind, payload):
+    """
+    Returns
+    -------
+    tuple
+        The entry point and its arguments, as plain python values.
+
+    """
+    args = []
+    offset = 0
+    for codec in CALL_CODECS[kind]:
+        arg, offset = codec[1](payload, offset)
+        args.append(arg)
+    return ENTRY_POINTS[kind], args
+
+def _receive(sock, size):
+    """Reads size bytes, None if the connection closed first."""
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+def readFrame(sock):
+    """
+    Returns
+    -------
+    tuple
+        The kind and payload of the next frame, None once the connection
+        closed.
+
+    """
+    header = _receive(sock, _frame.size)
+    if header is None:
+        return None
+    length, kind = _frame.unpack(header)
+    payload = _receive(sock, length) if length else ''
+    if payload is None:
+        return None
+    return kind, payload
+
+# Daemon ###################################
+
+class DaemonClient(object):
+    """
+    A client connected to the daemon.
+
+    Attributes
+    ----------
+    name : string
+    priority : int
+        The priority of the client's layer.
+    subscribed : bool
+        True if notifications are relayed to the client.
+    inited : bool
+        True between the client's init and unInit.
+    target : LayerTarget
+        The client's layer.
+    outbox : Queue
+        The frames the writer thread sends to the client, so a client that
+        stopped reading never blocks the daemon.
+
+    """
+
+    def __init__(self, sock, number):
+        self.sock = sock
+        self.number = number
+        self.name = "client%d" % number
+        self.priority = 0
+        self.subscribed = False
+        self.inited = False
+        self.target = None
+        self.outbox = queue.Queue(OUTBOX_SIZE)
+
+    def layerName(self):
+        """Unique even if several clients have the same name."""
+        return "%s#%d" % (self.name, self.number)
+
+    def start(self):
+        """Starts the writer thread."""
+        thread = threading.Thread(target=self._write, name="iMON Daemon Client Writer")
+        thread.daemon = True
+        thread.start()
+
+    def send(self, frame):
+        """Queues a frame for the writer thread, closing the connection if the client fell too far behind."""
+        try:
+            self.outbox.put_nowait(frame)
+        except queue.Full:
+            self.close()
+
+    def _write(self):
+        """Writer thread body."""
+        while True:
+            frame = self.outbox.get()
+            if frame is None:
+                return
+            try:
+                self.sock.sendall(frame)
+            except socket.error:
+                self.close()
+                return
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+        try:
+            # stops the writer, which otherwise stops once sending fails
+            self.outbox.put_nowait(None)
+        except queue.Full:
+            pass
+
+class DisplayDaemon(object):
+    """
+    Owns the display session and serves its clients, with a reader and a
+    writer thread per client.
+
+    Attributes
+    ----------
+    address : tuple
+        (host, port) the daemon listens on, the actual port once started.
+    compositor : Compositor
+        Holds a layer for every client.
+    connection : Connection
+        The state of the daemon's own session.
+    displayType : int
+        The lParam of the last DSPNM_PLUGIN_SUCCEED, passed on to clients
+        that init later.
+    onLog : callable
+        Called with a message about clients coming and going, and errors.
+    stats : dict
+        clients (connected so far), calls and notifications.
+
+    """
+
+    def __init__(self, api, address=DEFAULT_ADDRESS, hwnd=None, wm=0, onLog=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            Normally imon_api, using the backend of the actual display.
+        address : tuple
+            (host, port) to listen on, port 0 for any free port.
+        hwnd : HWND
+        wm : UINT
+            The window receiving iMON's notifications, which are handed to
+            notify, see imon_api.init.
+        onLog : callable
+
+        """
+        self.api = api
+        self.address = address
+        self.hwnd = hwnd
+        self.wm = wm
+        self.onLog = onLog
+        self.connection = Connection(api)
+        self.compositor = Compositor(api, self.OnWriteError)
+        self.supervisor = ReconnectSupervisor(api, self.connection, hwnd, wm, self.OnRecovered, self.OnWriteError)
+        self.displayType = 0
+        self.clients = {}
+        self.stats = {'clients': 0, 'calls': 0, 'notifications': 0}
+        self._numbers = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.compile()
+
+    def compile(self):
+        """Builds the dispatch table of the notification handlers, by raw code."""
+        self.dispatch = dict(
+            (member.value, getattr(self, name))
+            for name, member in DSPNotifyCode.members.iteritems()
+            if hasattr(self, name)
+        )
+
+    def start(self):
+        """
+        Listens for clients and calls init.
+
+        Raises
+        ------
+        socket.error
+            Raised if the address can't be listened on.
+
+        """
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(self.address)
+        server.listen(8)
+        self._server = server
+        self.address = server.getsockname()
+        backend = self.api.getBackend()
+        if hasattr(backend, 'onNotify'):
+            # backends that can't post window messages (the simulator) call us directly
+            backend.onNotify = self.notify
+        self.compositor.start()
+        try:
+            self.api.init(self.hwnd, self.wm)
+            self.connection.initialized()
+        except Exception, msg:
+            self.log("Unable to initialize the display: " + str(msg))
+            self.supervisor.lost(str(msg))
+        self._thread = threading.Thread(target=self._accept, name="iMON Daemon")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Disconnects every client and lets go of the display."""
+        self.supervisor.stop()
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+        with self._lock:
+            clients = self.clients.values()
+        for client in clients:
+            client.close()
+        self.compositor.stop()
+        try:
+            self.api.unInit()
+        except Exception, msg:
+            self.log("Unable to uninitialize the display: " + str(msg))
+        self.connection.uninitialized()
+
+    def log(self, message):
+        if self.onLog is not None:
+            self.onLog(message)
+
+    def OnWriteError(self, msg):
+        self.log("Unable to write to the display: " + str(msg))
+
+    def OnRecovered(self, recovery):
+        self.log("Display back after %(seconds).1f s (%(cause)s)" % recovery)
+
+    # Clients ###################################
+
+    def _accept(self):
+        """Accept thread body."""
+        while True:
+            server = self._server
+            if server is None:
+                return
+            try:
+                sock, dummyAddress = server.accept()
+            except socket.error:
+                # closed by stop
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = DaemonClient(sock, self._numbers.next())
+            with self._lock:
+                self.clients[client.number] = client
+                self.stats['clients'] += 1
+            client.start()
+            thread = threading.Thread(target=self._serve, args=(client,), name="iMON Daemon Client")
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, client):
+        """Client thread body."""
+        try:
+            while True:
+                frame = readFrame(client.sock)
+                if frame is None:
+                    break
+                kind, payload = frame
+                if kind == KIND_HELLO:
+                    client.priority, subscribed = _hello.unpack_from(payload)
+                    client.subscribed = bool(subscribed)
+                    name = _decodeName(payload, _hello.size)[0]
+                    if name:
+                        client.name = name
+                    self.log("%s connected, priority %d" % (client.name, client.priority))
+                elif kind < len(ENTRY_POINTS):
+                    self.call(client, kind, payload)
+                else:
+                    raise ValueError, "Unknown frame kind: " + str(kind)
+        except (socket.error, struct.error, ValueError, UnicodeDecodeError), msg:
+            self.log("%s dropped: %s" % (client.name, msg))
+        finally:
+            # whatever went wrong, the client's layer must not stay on the display
+            with self._lock:
+                self.clients.pop(client.number, None)
+            self.compositor.remove(client.layerName())
+            client.close()
+            self.log(client.name + " disconnected")
+
+    def call(self, client, kind, payload):
+        """Makes a call of a client."""
+        entryPoint, args = decodeCall(kind, payload)
+        with self._lock:
+            self.stats['calls'] += 1
+        if entryPoint not in QUERY_ENTRY_POINTS:
+            if client.inited:
+                self.write(client, entryPoint, args)
+            # a write before init fails on the client, it doesn't send it
+            return
+        if entryPoint == 'IMON_Display_Init':
+            client.inited = True
+            client.target = self.compositor.target(client.layerName(), client.priority)
+            result = DSPResult.DSP_SUCCEEDED
+        elif entryPoint == 'IMON_Display_Uninit':
+            client.inited = False
+            self.compositor.remove(client.layerName())
+            result = DSPResult.DSP_SUCCEEDED
+        elif entryPoint == 'IMON_Display_IsInited':
+            result = DSPResult.DSP_S_INITED if client.inited else DSPResult.DSP_S_NOT_INITED
+        elif client.inited and self.connection.isConnected():
+            result = DSPResult.DSP_S_IN_PLUGIN_MODE
+        else:
+            result = DSPResult.DSP_S_NOT_IN_PLUGIN_MODE
+        client.send(encodeFrame(KIND_RESULT, _result.pack(result)))
+        if entryPoint == 'IMON_Display_Init' and client.subscribed and self.connection.isConnected():
+            # the daemon already is in plugin mode, no DSPNM_PLUGIN_SUCCEED is coming
+            client.send(encodeFrame(KIND_NOTIFY, _notify.pack(DSPNotifyCode.DSPNM_PLUGIN_SUCCEED.value, self.displayType)))
+
+    def write(self, client, entryPoint, args):
+        """Writes a call of a client into its layer."""
+        target = client.target
+        if entryPoint == 'IMON_Display_SetVfdText':
+            target.setVfdText(args[0] or u"", args[1] or u"")
+        elif entryPoint == 'IMON_Display_SetVfdEqData':
+            target.setVfdEqData(args[0])
+        elif entryPoint == 'IMON_Display_SetLcdText':
+            target.setLcdText(args[0] or u"")
+        elif entryPoint == 'IMON_Display_SetLcdEqData':
+            target.setLcdEqData(args[0], args[1])
+        elif entryPoint == 'IMON_Display_SetLcdProgress':
+            target.setLcdProgress(args[0], args[1])
+        elif entryPoint == 'IMON_Display_SetLcdAllIcons':
+            for group in ICON_GROUPS:
+                layout = ICON_LAYOUTS[group]
+                target.setLcdIconBytes(group, layout.full if args[0] else (0,) * layout.size)
+        else:
+            target.setLcdIconBytes(ICON_GROUP_BY_ENTRY_POINT[entryPoint], args)
+
+    # Notifications ###################################
+
+    def notify(self, wParam, lParam):
+        """
+        Handles a notification from iMON, and relays it to the subscribed
+        clients.
+
+        Parameters
+        ----------
+        wParam : int
+            The raw notification code.
+        lParam : int
+
+        """
+        with self._lock:
+            self.stats['notifications'] += 1
+        handler = self.dispatch.get(wParam)
+        if handler is not None:
+            handler(lParam)
+        frame = encodeFrame(KIND_NOTIFY, _notify.pack(wParam, lParam))
+        with self._lock:
+            clients = [client for client in self.clients.itervalues() if client.subscribed]
+        for client in clients:
+            client.send(frame)
+
+    def recover(self):
+        """Writes the last frame again, off the notification thread."""
+        def recover():
+            self.supervisor.succeeded()
+            self.compositor.refresh()
+        thread = threading.Thread(target=recover, name="iMON Daemon Recovery")
+        thread.daemon = True
+        thread.start()
+
+    def DSPNM_PLUGIN_SUCCEED(self, payload):
+        self.displayType = payload
+        self.connection.pluginSucceed()
+        self.recover()
+        self.log("Display Plug-in Mode granted")
+
+    def DSPNM_PLUGIN_FAILED(self, payload):
+        cause = DSPNInitResult(payload)
+        self.connection.pluginFailed()
+        self.supervisor.lost(cause.name)
+        self.log("iMON Plugin Failure: " + str(cause.name))
+
+    def DSPNM_IMON_RESTARTED(self, payload):
+        self.api.invalidateShadow()
+        self.connection.imonRestarted()
+        self.supervisor.lost("DSPNM_IMON_RESTARTED")
+        if self.connection.isConnected():
+            self.recover()
+
+    def DSPNM_IMON_CLOSED(self, payload):
+        self.connection.imonClosed()
+        self.supervisor.lost("DSPNM_IMON_CLOSED")
+
+    def DSPNM_HW_CONNECTED(self, payload):
+        self.api.invalidateShadow()
+        self.connection.hwConnected()
+        if self.connection.isConnected():
+            self.recover()
+        else:
+            self.supervisor.retryNow()
+
+    def DSPNM_HW_DISCONNECTED(self, payload):
+        self.connection.hwDisconnected()
+        self.supervisor.lost("DSPNM_HW_DISCONNECTED")
+
+# Client ###################################
+
+class ClientBackend(Backend):
+    """
+    A backend making its calls through a DisplayDaemon. Writes are sent
+    without waiting for the daemon, the other calls wait for its answer.
+
+    Attributes
+    ----------
+    onNotify : callable
+        Called with (wParam, lParam) for the notifications the daemon relays.
+        When the daemon goes away, a DSPNM_IMON_CLOSED is made up, so the
+        application reconnects like it would to iMON.
+    timeout : float
+        Seconds to wait for the daemon to answer.
+
+    """
+
+    name = "client"
+
+    def __init__(self, address=None, name=u"", priority=0, subscribe=True, timeout=5.0):
+        """
+        Constructor. Connects on init.
+
+        Parameters
+        ----------
+        address : tuple
+            (host, port) of the daemon, DEFAULT_ADDRESS if None.
+        name : string
+            Shown in the daemon's log.
+        priority : int
+            Clients with a higher priority show over clients with a lower one.
+        subscribe : bool
+            Receive notifications.
+        timeout : float
+
+        """
+        self.onNotify = None
+        self.notifications = []
+        self.address = address or DEFAULT_ADDRESS
+        self.clientName = name
+        self.priority = priority
+        self.subscribe = subscribe
+        self.timeout = timeout
+        self.inited = False
+        self.sock = None
+        self._results = queue.Queue()
+        self._sendLock = threading.Lock()
+        self._queryLock = threading.Lock()
+        for entryPoint in ENTRY_POINTS:
+            if entryPoint not in QUERY_ENTRY_POINTS:
+                setattr(self, entryPoint, self._writer(entryPoint))
+
+    @classmethod
+    def fromEnvironment(cls):
+        """Creates a client configured by the IMON_DAEMON_* environment variables."""
+        env = os.environ.get
+        return cls(
+            address=parseAddress(env(ADDRESS_ENV)),
+            name=env(NAME_ENV, "").decode('utf-8'),
+            priority=int(env(PRIORITY_ENV, 0))
+        )
+
+    def connect(self):
+        """
+        Raises
+        ------
+        socket.error
+            Raised if the daemon can't be reached.
+
+        """
+        sock = socket.create_connection(self.address, self.timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        name = _encodeName(self.clientName)
+        sock.sendall(encodeFrame(KIND_HELLO, _hello.pack(self.priority, 1 if self.subscribe else 0) + name))
+        self._results = queue.Queue()
+        self.sock = sock
+        thread = threading.Thread(target=self._read, args=(sock,), name="iMON Daemon Client")
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        """Disconnects from the daemon."""
+        sock, self.sock = self.sock, None
+        self.inited = False
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+
+    def _read(self, sock):
+        """Reader thread body."""
+        results = self._results
+        try:
+            while True:
+                frame = readFrame(sock)
+                if frame is None:
+                    break
+                kind, payload = frame
+                if kind == KIND_RESULT:
+                    results.put(_result.unpack(payload)[0])
+                elif kind == KIND_NOTIFY:
+                    self._notify(*_notify.unpack(payload))
+        except (socket.error, struct.error):
+            pass
+        # wakes a query waiting for an answer that won't come
+        results.put(None)
+        if sock is self.sock:
+            inited = self.inited
+            self.close()
+            if inited:
+                self._notify(DSPNotifyCode.DSPNM_IMON_CLOSED.value, 0)
+
+    def _notify(self, wParam, lParam):
+        if self.onNotify is None:
+            self.notifications.append((wParam, lParam))
+        else:
+            self.onNotify(wParam, lParam)
+
+    def _send(self, frame):
+        with self._sendLock:
+            sock = self.sock
+            if sock is None:
+                raise socket.error, "Not connected to the display daemon"
+            sock.sendall(frame)
+
+    def _query(self, entryPoint, *args):
+        """Makes a call and waits for the answer."""
+        with self._queryLock:
+            try:
+                self._send(encodeCall(entryPoint, args))
+                value = self._results.get(timeout=self.timeout)
+            except (socket.error, queue.Empty):
+                value = None
+            if value is None:
+                # a late answer would be taken for the next query's
+                self.close()
+                return DSPResult.DSP_E_FAIL
+            return DSPResult(value)
+
+    def _writer(self, entryPoint):
+        def write(*args):
+            if not self.inited:
+                return DSPResult.DSP_E_NOT_INITED
+            try:
+                self._send(encodeCall(entryPoint, args))
+            except (socket.error, ValueError):
+                # ValueError: too long for a frame, like a failed DLL write
+                return DSPResult.DSP_E_FAIL
+            return DSPResult.DSP_SUCCEEDED
+        write.__name__ = entryPoint
+        return write
+
+    def IMON_Display_Init(self, hwnd, wm):
+        if self.sock is None:
+            try:
+                self.connect()
+            except socket.error:
+                return DSPResult.DSP_E_FAIL
+        result = self._query('IMON_Display_Init', hwnd, wm)
+        self.inited = result == DSPResult.DSP_SUCCEEDED
+        return result
+
+    def IMON_Display_Uninit(self):
+        self.inited = False
+        if self.sock is None:
+            return DSPResult.DSP_SUCCEEDED
+        return self._query('IMON_Display_Uninit')
+
+    def IMON_Display_IsInited(self):
+        if self.sock is None:
+            return DSPResult.DSP_S_NOT_INITED
+        return self._query('IMON_Display_IsInited')
+
+    def IMON_Display_IsPluginModeEnabled(self):
+        if self.sock is None:
+            return DSPResult.DSP_S_NOT_IN_PLUGIN_MODE
+        return self._query('IMON_Display_IsPluginModeEnabled')
+
+registerBackend(ClientBackend.name, ClientBackend.fromEnvironment)
@@ -1,6 +1,6 @@
 from ctypes import c_int
 
-class EnumMember(object):
+class EnumMember(int):
     """
     A storage structure class that represents a single
     Enum Member, containing all relavent information about the enum
@@ -11,6 +11,15 @@ class EnumMember(object):
     -----
     All attributes can not be modified after being set
 
+    Members are ints, so comparing them (such as result == DSPResult.DSP_SUCCEEDED)
+    is a plain integer compare, and they can be passed anywhere an int is expected.
+
+    Equality and hashing only look at the value, not the name or the enum:
+    members of different enums with the same value are equal, such as
+    DSPResult.DSP_SUCCEEDED == EventMode.EVENTS_EACH == 0, and are the same
+    dict key. Compare the names, or check which enum a member came from, where
+    that matters.
+
     Attributes
     ----------
     name : string
@@ -20,7 +29,9 @@ class EnumMember(object):
 
     """
 
-    def __init__(self, name, value):
+    __slots__ = ('name',)
+
+    def __new__(cls, name, value):
         """
         Constructor
 
@@ -32,13 +43,18 @@ class EnumMember(object):
             the value of this enum
 
         """
-        self.__dict__['name'] = name
-        self.__dict__['value'] = value
+        self = int.__new__(cls, value)
+        object.__setattr__(self, 'name', name)
+        return self
 
     def __setattr__(self, name, value):
         """Prevents any modifications from being made the attributes."""
         raise AttributeError, "Attributes can not be modified"
 
+    @property
+    def value(self):
+        """The value of the Enum Member, as a plain int."""
+        return int(self)
 
     def __repr__(self):
         """Machine Readable Output"""
@@ -48,29 +64,9 @@ class EnumMember(object):
         """Human Readable Output"""
         return self.__class__.__name__ + " " + str(self.name) + " (" + str(self.value) + ")"
 
-    def __eq__(self, other):
-        """Comparative / Sorting"""
-        return ((self.name, self.value) == (other.name, other.value))
-
-    def __ne__(self, other):
-        """Comparative / Sorting"""
-        return not self == other
-
-    def __gt__(self, other):
-        """Comparative / Sorting"""
-        return (self.name, self.version) > (other.name, other.value)
-
-    def __lt__(self, other):
-        """Comparative / Sorting"""
-        return (self.name, self.version) < (other.name, other.value)
-
-    def __ge__(self, other):
-        """Comparative / Sorting"""
-        return (self > other) or (self == other)
-
-    def __le__(self, other):
-        """Comparative / Sorting"""
-        return (self < other) or (self == other)
+    def __reduce__(self):
+        """Pickles as a plain (name, value) pair."""
+        return (EnumMember, (self.name, self.value))
 
 class ImonEnum(object):
     """
@@ -87,6 +83,9 @@ class ImonEnum(object):
     ----------
     members : dict
         This dictionary holds all the defined Enum Members
+    byValue : dict
+        Reverse index of the members, by value. Values shared by more than one
+        member map to None, as looking them up would be ambiguous.
 
     Example
     -------
@@ -127,6 +126,7 @@ class ImonEnum(object):
         """
         #set up the members
         self.__dict__['members'] = {}
+        self.__dict__['byValue'] = {}
 
         #add items to the members dict
         for enum in enums:
@@ -135,7 +135,12 @@ class ImonEnum(object):
             # second value, if it exists, is the value, or use the autoval
             value = c_int(enum[1]).value if len(enum)>1 else ImonEnum._nextAutoVal
             ImonEnum._nextAutoVal = value + 1
-            self.__dict__['members'][name] = EnumMember(name, value)
+            member = EnumMember(name, value)
+            self.__dict__['members'][name] = member
+            # members are also plain attributes, so MyEnum.NAME skips __getattr__
+            self.__dict__[name] = member
+            # duplicate values are found here, once, instead of on every lookup
+            self.__dict__['byValue'][value] = None if value in self.byValue else member
 
     def __str__(self):
         """Human Readable Output"""
@@ -194,13 +199,13 @@ class ImonEnum(object):
             The enum that matches the Value provided
 
         """
-        byValue = c_int(byValue).value
-        found = []
-        for name, enum in self.members.iteritems():
-            if enum.value == byValue:
-                found.append(enum)
-        if len(found) > 1:
+        try:
+            found = self.byValue[byValue]
+        except (KeyError, TypeError):
+            # not a plain int (or an unsigned one), normalize it like the constructor does
+            found = self.byValue.get(c_int(byValue).value, False)
+            if found is False:
+                raise LookupError, "No matching items with a matching value"
+        if found is None:
             raise LookupError, "Too many results found with a matching value"
-        if len(found) < 1:
-            raise LookupError, "No matching items with a matching value"
-        return found[0]
+        return found
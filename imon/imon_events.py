@@ -0,0 +1,138 @@
+"""
+Confirmation events of display writes, fired for every write, not at all,
+or summed up into a periodic summary event.
+
+At visualizer frame rates an event per write floods the event queue and
+the log. In summary mode writes are only counted, and every interval a
+single <event>.summary event carries the count, the error count and the
+last content written.
+
+Attributes
+----------
+EventMode : ImonEnum
+    EVENTS_EACH
+        An event for every successful write.
+    EVENTS_NONE
+        No events.
+    EVENTS_SUMMARY
+        A summary event every interval, if anything was written.
+
+Example
+-------
+>>> events = EventBatcher(plugin.TriggerEvent, EventMode.EVENTS_SUMMARY, interval=5)
+>>> events.confirm("vfd.setVfdEqData", levels)
+>>> events.stop()  # fires the pending summaries
+
+"""
+
+import threading
+from imon_enum import ImonEnum
+
+EventMode = ImonEnum(
+    ('EVENTS_EACH', 0),
+    ('EVENTS_NONE',),
+    ('EVENTS_SUMMARY',)
+)
+
+class EventBatcher(object):
+    """
+    Attributes
+    ----------
+    trigger : callable
+        Called with (eventName, payload) to fire an event, such as
+        PluginBase.TriggerEvent.
+    mode : EnumMember
+        The EventMode used when a write doesn't ask for one.
+    interval : float
+        Seconds between summary events.
+
+    """
+
+    def __init__(self, trigger, mode=EventMode.EVENTS_EACH, interval=5.0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        trigger : callable
+        mode : EnumMember
+        interval : float
+
+        """
+        self.trigger = trigger
+        self.mode = mode
+        self.interval = interval
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def confirm(self, eventName, content=None, mode=None):
+        """
+        Confirms a successful write.
+
+        Parameters
+        ----------
+        eventName : string
+        content :
+            What was written, the payload of the summary's last.
+        mode : EnumMember
+            An EventMode, None for the default.
+
+        """
+        if mode is None:
+            mode = self.mode
+        if mode == EventMode.EVENTS_EACH:
+            self.trigger(eventName, None)
+        elif mode == EventMode.EVENTS_SUMMARY:
+            with self._lock:
+                summary = self._summary(eventName)
+                summary['count'] += 1
+                summary['last'] = content
+
+    def error(self, eventName, mode=None):
+        """Counts a failed write, for the summary. Errors never fire events of their own."""
+        if mode is None:
+            mode = self.mode
+        if mode == EventMode.EVENTS_SUMMARY:
+            with self._lock:
+                self._summary(eventName)['errors'] += 1
+
+    def _summary(self, eventName):
+        """The pending summary of eventName. Called with the lock held."""
+        summary = self._summaries.get(eventName)
+        if summary is None:
+            summary = self._summaries[eventName] = {'count': 0, 'errors': 0, 'last': None}
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="iMON Event Summaries")
+                self._thread.daemon = True
+                self._thread.start()
+        return summary
+
+    def flush(self):
+        """Fires the pending summary events now."""
+        with self._lock:
+            summaries, self._summaries = self._summaries, {}
+        for eventName, summary in sorted(summaries.iteritems()):
+            self.trigger(eventName + ".summary", summary)
+
+    def stop(self):
+        """Stops the summary thread, firing the pending summaries."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        """Summary thread body."""
+        while not self._stop.wait(self.interval):
+            self.flush()
+            with self._lock:
+                if not self._summaries:
+                    # nothing is being summed up any more, started again on demand
+                    self._thread = None
+                    return
+        with self._lock:
+            self._thread = None
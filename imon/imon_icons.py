@@ -0,0 +1,267 @@
+"""
+Bit layouts of the LCD icon groups, taken from iMONDisplayAPI.h, and an
+LcdIconState object holding every icon group as packed bytes.
+
+Attributes
+----------
+ICON_GROUPS : tuple
+    The icon group names.
+ICON_LAYOUTS : dict
+    IconLayout of every group, by group name.
+ICON_ENTRY_POINTS : dict
+    The DLL entry point setting each group, by group name.
+
+Example
+-------
+>>> icons = LcdIconState()
+>>> icons.set('audioCodec', mp3=True)
+>>> icons.set('speaker', l=True, r=True)
+>>> icons.commit(imon_api)
+2
+
+"""
+
+ICON_GROUPS = ('orange', 'mediaType', 'speaker', 'videoCodec', 'audioCodec', 'aspectRatio', 'etc')
+
+ICON_ENTRY_POINTS = {
+    'orange': 'IMON_Display_SetLcdOrangeIcon',
+    'mediaType': 'IMON_Display_SetLcdMediaTypeIcon',
+    'speaker': 'IMON_Display_SetLcdSpeakerIcon',
+    'videoCodec': 'IMON_Display_SetLcdVideoCodecIcon',
+    'audioCodec': 'IMON_Display_SetLcdAudioCodecIcon',
+    'aspectRatio': 'IMON_Display_SetLcdAspectRatioIcon',
+    'etc': 'IMON_Display_SetLcdEtcIcon',
+}
+
+class IconLayout(object):
+    """
+    The compiled bit layout of one icon group.
+
+    Attributes
+    ----------
+    group : string
+        The group name.
+    size : int
+        The number of bytes the group takes.
+    names : tuple
+        Icon names, in the order the imon_api setLcd*Icon function takes them.
+    bits : tuple
+        (byte index, bit mask) of every icon, in the same order as names.
+    byName : dict
+        (byte index, bit mask) by icon name.
+    full : tuple
+        The bytes with every icon of the group on.
+
+    """
+
+    def __init__(self, group, size, *icons):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        group : string
+        size : int
+        *icons :
+            (name, byte index, bit number) tuples, bit 7 being the MSB.
+
+        """
+        self.group = group
+        self.size = size
+        self.names = tuple(icon[0] for icon in icons)
+        self.bits = tuple((icon[1], 1 << icon[2]) for icon in icons)
+        self.byName = dict(zip(self.names, self.bits))
+        full = [0] * size
+        for byte, mask in self.bits:
+            full[byte] |= mask
+        self.full = tuple(full)
+
+    def pack(self, values):
+        """
+        Packs icon states into bytes.
+
+        Parameters
+        ----------
+        values : sequence
+            On/off of every icon, in the order of names.
+
+        Returns
+        -------
+        tuple
+            The packed bytes.
+
+        """
+        if self.size == 1:
+            byte = 0
+            for (index, mask), value in zip(self.bits, values):
+                if value:
+                    byte |= mask
+            return (byte,)
+        data = [0] * self.size
+        for (index, mask), value in zip(self.bits, values):
+            if value:
+                data[index] |= mask
+        return tuple(data)
+
+    def unpack(self, data):
+        """
+        Returns
+        -------
+        dict
+            On/off of every icon, by name, from packed bytes.
+
+        """
+        return dict((name, bool(data[index] & mask)) for name, (index, mask) in zip(self.names, self.bits))
+
+ICON_LAYOUTS = dict((layout.group, layout) for layout in (
+    # Byte 1: MSB is the piece on top, the others follow CCW. Byte 2: MSB is the peel.
+    IconLayout('orange', 2,
+        ('slice1', 0, 7), ('slice2', 0, 6), ('slice3', 0, 5), ('slice4', 0, 4),
+        ('slice5', 0, 3), ('slice6', 0, 2), ('slice7', 0, 1), ('slice8', 0, 0),
+        ('peel', 1, 7)),
+    # From MSB: MUSIC, MOVIE, PHOTO, CD/DVD, TV, WEBCASTING and NEWS/WEATHER
+    IconLayout('mediaType', 1,
+        ('music', 0, 7), ('movie', 0, 6), ('photo', 0, 5), ('cd', 0, 4),
+        ('tv', 0, 3), ('web', 0, 2), ('news', 0, 1)),
+    # Byte 1 from MSB: L, C, R, SL, LFE, SR, RL and SPDIF. Byte 2: MSB is RR.
+    IconLayout('speaker', 2,
+        ('l', 0, 7), ('c', 0, 6), ('r', 0, 5), ('sl', 0, 4),
+        ('lfe', 0, 3), ('sr', 0, 2), ('rl', 0, 1), ('spdif', 0, 0),
+        ('rr', 1, 7)),
+    # From MSB: MPG, DIVX, XVID, WMV, MPG (taken as MP3), AC3, DTS and WMA
+    IconLayout('videoCodec', 1,
+        ('mpg', 0, 7), ('divx', 0, 6), ('xvid', 0, 5), ('wmv', 0, 4),
+        ('mp3', 0, 3), ('ac3', 0, 2), ('dts', 0, 1), ('wma', 0, 0)),
+    # From MSB: MP3, OGG, WMA and WAV
+    IconLayout('audioCodec', 1,
+        ('mp3', 0, 7), ('ogg', 0, 6), ('wma', 0, 5), ('wav', 0, 4)),
+    # From MSB: SRC, FIT, TV, HDTV, SCR1 and SCR2
+    IconLayout('aspectRatio', 1,
+        ('src', 0, 7), ('fit', 0, 6), ('tv', 0, 5), ('hdtv', 0, 4),
+        ('scr1', 0, 3), ('scr2', 0, 2)),
+    # From MSB: REPEAT, SHUFFLE, ALARM, REC, VOL and TIME
+    IconLayout('etc', 1,
+        ('repeat', 0, 7), ('shuffle', 0, 6), ('alarm', 0, 5), ('rec', 0, 4),
+        ('vol', 0, 3), ('time', 0, 2)),
+))
+
+class LcdIconState(object):
+    """
+    Every LCD icon group as packed bytes. Icons are changed locally, and
+    commit sends only the groups whose bytes changed since the last commit.
+
+    Attributes
+    ----------
+    groups : dict
+        The packed bytes of every group, as lists, by group name.
+    committed : dict
+        The bytes of every group as of the last commit, None if never sent.
+
+    """
+
+    def __init__(self):
+        self.groups = dict((group, [0] * ICON_LAYOUTS[group].size) for group in ICON_GROUPS)
+        self.committed = dict.fromkeys(ICON_GROUPS)
+
+    def set(self, group, **icons):
+        """
+        Turns icons of a group on or off, leaving the others as they are.
+
+        Parameters
+        ----------
+        group : string
+            One of ICON_GROUPS.
+        **icons :
+            Icon name = on/off.
+
+        Raises
+        ------
+        KeyError
+            Raised for unknown groups or icons.
+
+        """
+        byName = ICON_LAYOUTS[group].byName
+        data = self.groups[group]
+        for name, on in icons.iteritems():
+            index, mask = byName[name]
+            if on:
+                data[index] |= mask
+            else:
+                data[index] &= ~mask
+
+    def replace(self, group, **icons):
+        """Like set, but every icon not given is turned off."""
+        self.groups[group] = [0] * ICON_LAYOUTS[group].size
+        self.set(group, **icons)
+
+    def setBytes(self, group, data):
+        """Sets the packed bytes of a group directly."""
+        if len(data) != ICON_LAYOUTS[group].size:
+            raise ValueError, "Expected " + str(ICON_LAYOUTS[group].size) + " bytes for " + group
+        self.groups[group] = [byte & 0xFF for byte in data]
+
+    def setAll(self, on):
+        """Turns every icon on or off."""
+        for group in ICON_GROUPS:
+            layout = ICON_LAYOUTS[group]
+            self.groups[group] = list(layout.full) if on else [0] * layout.size
+
+    def get(self, group):
+        """
+        Returns
+        -------
+        dict
+            On/off of every icon of the group, by name.
+
+        """
+        return ICON_LAYOUTS[group].unpack(self.groups[group])
+
+    def dirty(self):
+        """
+        Returns
+        -------
+        list
+            The groups changed since the last commit.
+
+        """
+        return [group for group in ICON_GROUPS if self.committed[group] != self.groups[group]]
+
+    def invalidate(self):
+        """Forgets what was committed, so the next commit sends every group."""
+        self.committed = dict.fromkeys(ICON_GROUPS)
+
+    def commit(self, api):
+        """
+        Sends the changed groups to the display. When several groups changed
+        and every icon ends up on (or off), a single setLcdAllIcons is sent
+        instead.
+
+        Parameters
+        ----------
+        api : module
+            Normally imon_api.
+
+        Returns
+        -------
+        int
+            The number of api calls made.
+
+        Raises
+        ------
+        Exception
+            Whatever the api raised. Groups sent before the failure stay committed.
+
+        """
+        dirty = self.dirty()
+        if len(dirty) > 1:
+            for on in (False, True):
+                if all(self.groups[group] == list(ICON_LAYOUTS[group].full if on else [0] * ICON_LAYOUTS[group].size)
+                       for group in ICON_GROUPS):
+                    api.setLcdAllIcons(on)
+                    for group in ICON_GROUPS:
+                        self.committed[group] = list(self.groups[group])
+                    return 1
+        for group in dirty:
+            api.setLcdIconBytes(group, self.groups[group])
+            self.committed[group] = list(self.groups[group])
+        return len(dirty)
@@ -0,0 +1,229 @@
+"""
+A queue of LCD text messages, each shown once the previous one finished
+scrolling.
+
+iMON sends DSPNM_LCD_TEXT_SCROLL_DONE when the LCD is done scrolling a text.
+Passing that notification to scrollDone shows the next message right away,
+without a round trip through an EventGhost macro. If the notification never
+comes (text that doesn't need to scroll, or a lost message) the next
+message is shown after a timeout.
+
+A message that can't be shown stays at the head of the queue, and is tried
+again after a delay, or as soon as retry is called once the display is back.
+
+Example
+-------
+>>> queue = LcdTextQueue(imon_api, timeout=10)
+>>> queue.push(u"Now Playing: Artist - Title")
+>>> queue.push(u"Incoming call", priority=10, ttl=30)
+>>> queue.scrollDone()  # from the DSPNM_LCD_TEXT_SCROLL_DONE handler
+
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+class LcdTextItem(object):
+    """
+    A queued message.
+
+    Attributes
+    ----------
+    text : string
+    priority : int
+        Higher priorities are shown first, equal ones in the order queued.
+    expires : float
+        time.time() after which the message is dropped if not shown yet, or None.
+    cancelled : bool
+        Set when the entry was superseded in the heap.
+
+    """
+
+    __slots__ = ('text', 'priority', 'expires', 'cancelled')
+
+    def __init__(self, text, priority, expires):
+        self.text = text
+        self.priority = priority
+        self.expires = expires
+        self.cancelled = False
+
+class LcdTextQueue(object):
+    """
+    Attributes
+    ----------
+    timeout : float
+        Seconds to wait for DSPNM_LCD_TEXT_SCROLL_DONE before moving on.
+    retryDelay : float
+        Seconds to wait before trying again to show a message that failed.
+    onError : callable
+        Called with the exception when showing a message fails, once until
+        a message is shown again.
+    current : LcdTextItem
+        The message on the display, None when idle.
+    failing : bool
+        Set while the message at the head of the queue can't be shown.
+    stats : dict
+        shown, expired, deduplicated, timedOut and failed counters.
+
+    """
+
+    def __init__(self, api, timeout=15.0, onError=None, retryDelay=2.0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            The module used to write, normally imon_api.
+        timeout : float
+        onError : callable
+        retryDelay : float
+
+        """
+        self.api = api
+        self.timeout = timeout
+        self.retryDelay = retryDelay
+        self.onError = onError
+        self.current = None
+        self.failing = False
+        self.stats = {'shown': 0, 'expired': 0, 'deduplicated': 0, 'timedOut': 0, 'failed': 0}
+        self._heap = []
+        self._queued = {}
+        self._order = itertools.count()
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._queued)
+
+    def push(self, text, priority=0, ttl=None):
+        """
+        Queues a message, showing it right away if nothing is being shown.
+        A message identical to one already queued is merged into it, keeping
+        the higher priority and the later expiry.
+
+        Parameters
+        ----------
+        text : string
+        priority : int
+        ttl : float
+            Seconds the message may wait in the queue, None for no limit.
+
+        """
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            queued = self._queued.get(text)
+            if queued is not None:
+                self.stats['deduplicated'] += 1
+                if expires is None or queued.expires is None:
+                    expires = None
+                else:
+                    expires = max(expires, queued.expires)
+                if priority <= queued.priority:
+                    queued.expires = expires
+                    return
+                # moves up, the old heap entry is skipped when popped
+                queued.cancelled = True
+                priority = max(priority, queued.priority)
+            item = LcdTextItem(text, priority, expires)
+            self._queued[text] = item
+            heapq.heappush(self._heap, (-priority, next(self._order), item))
+            if self.current is None:
+                self._cancelTimer()
+                self._showNext()
+
+    def clear(self):
+        """Drops every queued message, leaving the current one on the display."""
+        with self._lock:
+            self._heap = []
+            self._queued = {}
+
+    def stop(self):
+        """Drops every queued message and stops waiting for the current one."""
+        with self._lock:
+            self.clear()
+            self._cancelTimer()
+            self.current = None
+            self.failing = False
+
+    def retry(self):
+        """
+        Tries again to show the message that failed, such as once the
+        display is back. Does nothing if no message is waiting.
+        """
+        with self._lock:
+            if self.current is not None or not self.failing:
+                return
+            self._cancelTimer()
+            self._showNext()
+
+    def scrollDone(self):
+        """Shows the next message. Call on DSPNM_LCD_TEXT_SCROLL_DONE."""
+        with self._lock:
+            if self.current is None:
+                return
+            self._cancelTimer()
+            self._showNext()
+
+    def _timedOut(self, item):
+        with self._lock:
+            if self.current is not item:
+                return
+            self.stats['timedOut'] += 1
+            self._timer = None
+            self._showNext()
+
+    def _cancelTimer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _pop(self):
+        """The heap entry of the next message due, skipping superseded and expired ones."""
+        now = time.time()
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            item = entry[2]
+            if item.cancelled:
+                continue
+            del self._queued[item.text]
+            if item.expires is not None and item.expires < now:
+                self.stats['expired'] += 1
+                continue
+            return entry
+        return None
+
+    def _showNext(self):
+        """Shows the next message, or goes idle. Called with the lock held."""
+        entry = self._pop()
+        if entry is None:
+            self.current = None
+            self.failing = False
+            return
+        item = entry[2]
+        try:
+            # the same text again still has to be sent, to scroll again
+            self.api.invalidateShadow('lcdText')
+            self.api.setLcdText(item.text)
+        except Exception, msg:
+            # keeps its place at the head of the queue, for the retry
+            heapq.heappush(self._heap, entry)
+            self._queued[item.text] = item
+            self.current = None
+            self.stats['failed'] += 1
+            if not self.failing and self.onError is not None:
+                self.onError(msg)
+            self.failing = True
+            self._startTimer(self.retryDelay, self.retry)
+            return
+        self.current = item
+        self.failing = False
+        self.stats['shown'] += 1
+        self._startTimer(self.timeout, self._timedOut, item)
+
+    def _startTimer(self, delay, function, *args):
+        self._timer = threading.Timer(delay, function, args)
+        self._timer.daemon = True
+        self._timer.start()
@@ -106,8 +106,9 @@ DSPNotifyCode
 
 """
 
+from array import array
 from imon_enum import ImonEnum
-from ctypes import Structure, c_int
+from ctypes import Structure, c_int, sizeof, addressof, memmove
 
 DSPResult = ImonEnum(
     ('DSP_SUCCEEDED', 0),
@@ -151,6 +152,9 @@ DSPNotifyCode = ImonEnum(
 # a Type for a c_int array 16
 BANDINFO = c_int*16
 
+# Number of equalizer bands
+EQ_BANDS = 16
+
 def bandInfoToCType(bandInfo):
     """
     Converts a python dict band info (keys 1 -16) to a ctype int array
@@ -182,3 +186,68 @@ class DSPEQDATA(Structure):
     @param	BandData    It represents Equalizer data for 16 bands. Its range is from 0 to 100.*/
     """
     _fields_ = [('BandData', BANDINFO)]
+
+def isInt32Buffer(bandInfo):
+    """
+    Returns True if bandInfo is a contiguous buffer of exactly 16 native c_int
+    values, which can be used as a DSPEQDATA as is.
+
+    array('i'), memoryview and NumPy int32 arrays are recognized.
+    """
+    if isinstance(bandInfo, array):
+        return bandInfo.itemsize == sizeof(c_int) and bandInfo.typecode in 'il' and len(bandInfo) == EQ_BANDS
+    if isinstance(bandInfo, memoryview):
+        return bandInfo.itemsize == sizeof(c_int) and bandInfo.format in ('i', 'l', '=i', '@i') and \
+            bandInfo.ndim == 1 and len(bandInfo) == EQ_BANDS
+    # NumPy, without importing it
+    dtype = getattr(bandInfo, 'dtype', None)
+    if dtype is not None and getattr(bandInfo, 'flags', None) is not None:
+        return dtype.kind == 'i' and dtype.itemsize == sizeof(c_int) and dtype.isnative and \
+            bandInfo.size == EQ_BANDS and bandInfo.flags['C_CONTIGUOUS']
+    return False
+
+def fillEqData(target, eqData):
+    """
+    Fills an existing DSPEQDATA structure in place with band info of any
+    supported form, without allocating a new structure.
+
+    Parameters
+    ----------
+    target : DSPEQDATA
+        The structure to overwrite.
+    eqData :
+        dict
+            Bands keyed 1 - 16, missing bands are 0. Filled band by band (slow path).
+        array('i'), NumPy int32 array
+            16 contiguous ints, copied in a single memmove.
+        memoryview
+            16 ints, copied as a list.
+        sequence
+            Any other sequence of 16 ints, such as a list or tuple.
+        DSPEQDATA
+            Copied in a single memmove.
+
+    Raises
+    ------
+    ValueError
+        Raised when a sequence doesn't hold exactly 16 bands.
+
+    """
+    bands = target.BandData
+    if isinstance(eqData, dict):
+        for band in xrange(EQ_BANDS):
+            bands[band] = eqData.get(band + 1, 0)
+    elif isinstance(eqData, DSPEQDATA):
+        memmove(addressof(target), addressof(eqData), sizeof(DSPEQDATA))
+    elif isInt32Buffer(eqData):
+        if isinstance(eqData, array):
+            memmove(addressof(target), eqData.buffer_info()[0], sizeof(DSPEQDATA))
+        elif hasattr(eqData, 'ctypes'):
+            # NumPy
+            memmove(addressof(target), eqData.ctypes.data, sizeof(DSPEQDATA))
+        else:
+            bands[:] = eqData.tolist()
+    else:
+        if len(eqData) != EQ_BANDS:
+            raise ValueError, "Expected 16 bands, got " + str(len(eqData))
+        bands[:] = eqData
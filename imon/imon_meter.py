@@ -0,0 +1,151 @@
+"""
+Bar graphs and percentages on a VFD line, for volume, CPU load or progress.
+
+The bar strings of a meter are built once, for every step its width and
+glyph set can show, and looked up by quantising the value to a step. A new
+value that lands on the same step (and the same percentage) changes no
+glyph, so update returns None and nothing needs to be written.
+
+The VFD has no multi-byte characters, so the glyph sets are plain ASCII.
+With more glyphs per set, each column shows more steps.
+
+Example
+-------
+>>> meter = VfdMeter(label="Vol ")
+>>> meter.update(40)
+u'Vol ###      40%'
+>>> meter.update(40.2) is None  # same glyphs, nothing to write
+True
+
+"""
+
+from imon_scroll import VFD_COLUMNS
+
+# Glyph sets by name, from empty to full. A column steps through them in order.
+GLYPH_SETS = (
+    ('Hashes', u" #"),
+    ('Steps', u" -=#"),
+    ('Bars', u" |"),
+)
+
+# Width of the percentage, " 100%".
+PERCENT_COLUMNS = 5
+
+PERCENT_TABLE = tuple(u" %3d%%" % percent for percent in range(101))
+
+_barTables = {}
+
+def barTable(width, glyphs):
+    """
+    Returns
+    -------
+    tuple
+        The bar strings of width columns for every step, from empty to full,
+        width * (len(glyphs) - 1) + 1 of them. Built once for each width and
+        glyph set.
+
+    """
+    table = _barTables.get((width, glyphs))
+    if table is None:
+        levels = len(glyphs) - 1
+        full, empty = glyphs[-1], glyphs[0]
+        bars = []
+        for step in range(width * levels + 1):
+            columns, partial = divmod(step, levels)
+            bar = full * columns
+            if partial:
+                bar += glyphs[partial]
+            bars.append(bar + empty * (width - len(bar)))
+        table = _barTables[(width, glyphs)] = tuple(bars)
+    return table
+
+class VfdMeter(object):
+    """
+    A label, a bar and optionally a percentage, filling a VFD line.
+
+    Attributes
+    ----------
+    minimum : float
+    maximum : float
+        The values shown as an empty and a full bar.
+    resolution : int
+        The number of steps of the bar.
+    text : string
+        The text of the last value.
+
+    """
+
+    __slots__ = ('label', 'minimum', 'maximum', 'percent', 'bars', 'resolution', 'key', 'text')
+
+    def __init__(self, label=u"", minimum=0, maximum=100, glyphs=GLYPH_SETS[0][1], percent=True, width=VFD_COLUMNS):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        label : string
+            Shown before the bar.
+        minimum : float
+        maximum : float
+        glyphs : string
+            The glyphs of a column, from empty to full, see GLYPH_SETS.
+        percent : bool
+            Shows the percentage after the bar.
+        width : int
+            The columns of the line.
+
+        Raises
+        ------
+        ValueError
+            Raised if there are no columns left for the bar, or the range or
+            glyphs are empty.
+
+        """
+        barWidth = width - len(label) - (PERCENT_COLUMNS if percent else 0)
+        if barWidth < 1:
+            raise ValueError, "No room left for the bar"
+        if maximum <= minimum:
+            raise ValueError, "The maximum has to be greater than the minimum"
+        if len(glyphs) < 2:
+            raise ValueError, "At least an empty and a full glyph are needed"
+        self.label = label
+        self.minimum = minimum
+        self.maximum = maximum
+        self.percent = percent
+        self.bars = barTable(barWidth, glyphs)
+        self.resolution = len(self.bars) - 1
+        self.key = None
+        self.text = None
+
+    def quantise(self, value):
+        """
+        Returns
+        -------
+        tuple
+            The bar step and the percentage the value is shown as.
+
+        """
+        fraction = (float(value) - self.minimum) / (self.maximum - self.minimum)
+        fraction = min(1.0, max(0.0, fraction))
+        return int(fraction * self.resolution + 0.5), int(fraction * 100 + 0.5) if self.percent else 0
+
+    def update(self, value):
+        """
+        Returns
+        -------
+        string
+            The text of the value, None if it is the same as the last one.
+
+        """
+        key = self.quantise(value)
+        if key == self.key:
+            return None
+        step, percent = key
+        self.key = key
+        self.text = self.label + self.bars[step] + (PERCENT_TABLE[percent] if self.percent else u"")
+        return self.text
+
+    def render(self, value):
+        """Returns the text of the value, changed or not."""
+        self.update(value)
+        return self.text
@@ -0,0 +1,317 @@
+"""
+Token bucket rate limiting of the DLL entry points, so a burst of triggers
+can't flood iMON Manager.
+
+Every limited entry point has its own budget. A call within budget goes
+through right away. A call over budget is held as the entry point's pending
+call, replacing any call held before it, and is made as soon as the bucket
+has a token again. Only the newest content of a burst reaches the DLL, and
+callers never see an error for being throttled.
+
+Some entry points write the same part of the display, so their calls must
+not overtake each other: a call drops the held calls it overwrites, see
+REPLACES, and waits behind a held call it only partly overwrites, see
+PART_OF.
+
+Attributes
+----------
+DEFAULT_BUDGETS : dict
+    (calls per second, burst size) by entry point name.
+REPLACES : dict
+    The entry points whose writes a call overwrites completely, by entry point.
+PART_OF : dict
+    The entry points writing all of what a call writes, and more, by entry point.
+
+Example
+-------
+>>> limiter = RateLimiter({'IMON_Display_SetVfdText': (5, 2)})
+>>> imon_api.useRateLimiter(limiter)
+>>> for i in range(100):
+...     imon_api.setVfdText(str(i), "")  # 0 and 1 now, 99 when a token frees up
+>>> limiter.getStats()['IMON_Display_SetVfdText']['throttled']
+98
+
+"""
+
+import collections
+import threading
+import time
+
+TEXT_BUDGET = (10.0, 3)
+EQ_BUDGET = (30.0, 2)
+ICON_BUDGET = (10.0, 4)
+PROGRESS_BUDGET = (5.0, 2)
+
+DEFAULT_BUDGETS = {
+    'IMON_Display_SetVfdText': TEXT_BUDGET,
+    'IMON_Display_SetLcdText': TEXT_BUDGET,
+    'IMON_Display_SetVfdEqData': EQ_BUDGET,
+    'IMON_Display_SetLcdEqData': EQ_BUDGET,
+    'IMON_Display_SetLcdAllIcons': ICON_BUDGET,
+    'IMON_Display_SetLcdOrangeIcon': ICON_BUDGET,
+    'IMON_Display_SetLcdMediaTypeIcon': ICON_BUDGET,
+    'IMON_Display_SetLcdSpeakerIcon': ICON_BUDGET,
+    'IMON_Display_SetLcdVideoCodecIcon': ICON_BUDGET,
+    'IMON_Display_SetLcdAudioCodecIcon': ICON_BUDGET,
+    'IMON_Display_SetLcdAspectRatioIcon': ICON_BUDGET,
+    'IMON_Display_SetLcdEtcIcon': ICON_BUDGET,
+    'IMON_Display_SetLcdProgress': PROGRESS_BUDGET,
+}
+
+ICON_ENTRY_POINTS = (
+    'IMON_Display_SetLcdOrangeIcon',
+    'IMON_Display_SetLcdMediaTypeIcon',
+    'IMON_Display_SetLcdSpeakerIcon',
+    'IMON_Display_SetLcdVideoCodecIcon',
+    'IMON_Display_SetLcdAudioCodecIcon',
+    'IMON_Display_SetLcdAspectRatioIcon',
+    'IMON_Display_SetLcdEtcIcon',
+)
+
+# The VFD shows either its text or the equalizer, and all icons on/off sets
+# every icon group.
+REPLACES = {
+    'IMON_Display_SetVfdText': ('IMON_Display_SetVfdEqData',),
+    'IMON_Display_SetVfdEqData': ('IMON_Display_SetVfdText',),
+    'IMON_Display_SetLcdAllIcons': ICON_ENTRY_POINTS,
+}
+
+PART_OF = dict((key, ('IMON_Display_SetLcdAllIcons',)) for key in ICON_ENTRY_POINTS)
+
+# Seconds a call waits after the held call it is part of is due.
+COVERED_DELAY = 0.01
+
+# Seconds over which the effective rate is measured.
+RATE_WINDOW = 1.0
+
+class TokenBucket(object):
+    """
+    Attributes
+    ----------
+    rate : float
+        Tokens added per second.
+    burst : int
+        The most tokens the bucket holds.
+    tokens : float
+
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """Takes a token, returns False if there is none."""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def wait(self, now):
+        """Seconds until the next token is available."""
+        self._refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+class RateLimiter(object):
+    """
+    Per entry point token buckets, holding over budget calls until their
+    next slot.
+
+    Attributes
+    ----------
+    onError : callable
+        Called with (entry point, exception) when a held call fails once it
+        is made. Held calls are made from a timer thread, so there is no
+        caller to raise to.
+
+    """
+
+    def __init__(self, budgets=None, onError=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        budgets : dict
+            (calls per second, burst size) by entry point name, DEFAULT_BUDGETS
+            if None. Entry points without a budget are never limited.
+        onError : callable
+
+        """
+        if budgets is None:
+            budgets = DEFAULT_BUDGETS
+        self.onError = onError
+        self.buckets = dict((key, TokenBucket(rate, burst)) for key, (rate, burst) in budgets.iteritems())
+        self._pending = {}
+        self._timers = {}
+        self._sent = dict((key, collections.deque(maxlen=int(rate * RATE_WINDOW) + burst + 1))
+                          for key, (rate, burst) in budgets.iteritems())
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.resetStats()
+
+    def admit(self, key, function, args):
+        """
+        Decides whether a call may be made now.
+
+        Parameters
+        ----------
+        key : string
+            The entry point the call ends up in.
+        function : callable
+            Called with args once a slot frees up, if the call is held.
+        args : tuple
+
+        Returns
+        -------
+        bool
+            True if the caller should go ahead. False if the call is held,
+            in which case the caller must not make it.
+
+        """
+        if getattr(self._local, 'granted', None) == key:
+            # the held call being made, its token was already taken
+            return True
+        bucket = self.buckets.get(key)
+        with self._lock:
+            # held calls this one overwrites would land on top of it
+            self._discardReplaced(key)
+            if bucket is None:
+                return True
+            stats = self.stats[key]
+            now = time.time()
+            # anything newer than a held call has to wait behind it
+            if key not in self._pending and not self._isCovered(key) and bucket.take(now):
+                stats['admitted'] += 1
+                self._sent[key].append(now)
+                return True
+            stats['throttled'] += 1
+            if key in self._pending:
+                stats['merged'] += 1
+            self._pending[key] = (function, args)
+            if key not in self._timers:
+                self._startTimer(key, now)
+        return False
+
+    def pending(self, key):
+        """
+        Returns
+        -------
+        tuple
+            The args of the call held for key, None if there is none.
+
+        """
+        held = self._pending.get(key)
+        if held is None:
+            return None
+        return held[1]
+
+    def discard(self, key):
+        """
+        Drops the call held for key, and the ones it overwrites, if any,
+        because newer content made them obsolete.
+        """
+        with self._lock:
+            if self._pending.pop(key, None) is not None:
+                self.stats[key]['merged'] += 1
+            self._discardReplaced(key)
+
+    def _discardReplaced(self, key):
+        """Drops the held calls a call for key overwrites. Called with the lock held."""
+        for replaced in REPLACES.get(key, ()):
+            if self._pending.pop(replaced, None) is not None:
+                self.stats[replaced]['merged'] += 1
+
+    def _isCovered(self, key):
+        """Returns True if a call for key has to wait behind a held call writing over it too."""
+        for covering in PART_OF.get(key, ()):
+            if covering in self._pending:
+                return True
+        return False
+
+    def _startTimer(self, key, now):
+        """Makes the call held for key once there is a token. Called with the lock held."""
+        wait = self.buckets[key].wait(now)
+        for covering in PART_OF.get(key, ()):
+            if covering in self._pending:
+                # just after the covering call, whose timer is due at its wait
+                wait = max(wait, self.buckets[covering].wait(now) + COVERED_DELAY)
+        timer = threading.Timer(wait, self._release, (key,))
+        timer.daemon = True
+        self._timers[key] = timer
+        timer.start()
+
+    def stop(self):
+        """Drops every held call."""
+        with self._lock:
+            self._pending.clear()
+            for timer in self._timers.itervalues():
+                timer.cancel()
+            self._timers.clear()
+
+    def _release(self, key):
+        """Timer callback, makes the held call for key."""
+        with self._lock:
+            del self._timers[key]
+            held = self._pending.pop(key, None)
+            if held is None:
+                return
+            bucket = self.buckets[key]
+            now = time.time()
+            # woke up early, or an older call writing over it isn't made yet
+            if self._isCovered(key) or not bucket.take(now):
+                self._pending[key] = held
+                self._startTimer(key, now)
+                return
+            self.stats[key]['admitted'] += 1
+            self._sent[key].append(now)
+        function, args = held
+        self._local.granted = key
+        try:
+            function(*args)
+        except Exception, msg:
+            if self.onError is not None:
+                self.onError(key, msg)
+        finally:
+            self._local.granted = None
+
+    def effectiveRate(self, key):
+        """
+        Returns
+        -------
+        float
+            Calls per second made for key over the last RATE_WINDOW seconds.
+
+        """
+        since = time.time() - RATE_WINDOW
+        return sum(1 for sent in list(self._sent[key]) if sent > since) / RATE_WINDOW
+
+    def getStats(self):
+        """
+        Returns
+        -------
+        dict
+            By entry point, a dict of admitted (calls made), throttled (calls
+            held), merged (held calls replaced before being made) and rate
+            (the effective rate, see effectiveRate).
+
+        """
+        with self._lock:
+            stats = dict((key, dict(counters)) for key, counters in self.stats.iteritems())
+        for key, counters in stats.iteritems():
+            counters['rate'] = self.effectiveRate(key)
+        return stats
+
+    def resetStats(self):
+        """Resets the counters to 0."""
+        self.stats = dict((key, {'admitted': 0, 'throttled': 0, 'merged': 0}) for key in self.buckets)
@@ -0,0 +1,383 @@
+"""
+Records the display traffic into a compact, append only binary log, and
+replays such a log through imon_api against any backend.
+
+Every call of the imon_api functions in API_CALLS is written with its
+arguments, its result and the time since the record before it, along with
+the notifications iMON sent. Calls are recorded as the application made
+them, before the shadow framebuffer and the rate limiter, so a replay goes
+through both again. A call takes a few bytes (a VFD text write is 11 bytes
+plus its text), and writes go through a buffered file, so the recorder can
+stay on.
+
+Log Format
+----------
+The file starts with MAGIC. Every record then starts with a kind byte and
+the microseconds since the previous record, as an unsigned 32 bit int
+(longer gaps are shortened to about 71 minutes). All values are little endian.
+
+    kind < len(API_CALLS)
+        A call of the imon_api function API_CALLS[kind]: its DSPResult
+        value (uint16), then every argument, see API_CALLS.
+    KIND_NOTIFY
+        A notification: wParam (uint32) and lParam (int32).
+    KIND_SESSION
+        A recorder was opened: the wall clock time (double).
+
+Example
+-------
+>>> imon_api.useRecorder(Recorder("display.imonrec"))
+>>> imon_api.setVfdText("Hello", "World")
+>>> imon_api.useRecorder(None)
+>>> imon_api.useBackend(createBackend('sim'))
+>>> replay("display.imonrec", imon_api, speed=0)
+{'calls': 1, 'notifications': 0, 'mismatched': 0, 'seconds': ...}
+
+"""
+
+import os
+import struct
+import threading
+import time
+from ctypes import c_int, byref
+from timeit import default_timer
+from imon_message import BANDINFO, DSPEQDATA, DSPResult, EQ_BANDS, fillEqData
+from imon_backend import ENTRY_POINTS, SIGNATURES, HWND, UINT, BOOL, BYTE, LPCTSTR
+
+MAGIC = "IMONREC\x02"
+
+KIND_NOTIFY = 0xFE
+KIND_SESSION = 0xFF
+
+# result value stored for a result that isn't a DSPResult
+NO_RESULT = 0xFFFF
+
+MAX_DELTA = 0xFFFFFFFF
+
+_header = struct.Struct('<BI')
+_result = struct.Struct('<H')
+_notify = struct.Struct('<Ii')
+_session = struct.Struct('<d')
+_bands = struct.Struct('<%dB' % EQ_BANDS)
+_length = struct.Struct('<H')
+
+# Argument Codecs ###################################
+
+def _value(arg):
+    return getattr(arg, 'value', arg)
+
+def _encodeInt(fmt):
+    packer = struct.Struct(fmt)
+    def encode(arg):
+        return packer.pack(_value(arg) or 0)
+    def decode(data, offset):
+        return packer.unpack_from(data, offset)[0], offset + packer.size
+    return encode, decode
+
+def _encodeByte(arg):
+    return chr(_value(arg) & 0xFF)
+
+def _decodeByte(data, offset):
+    return ord(data[offset]), offset + 1
+
+def _encodeText(arg):
+    text = _value(arg)
+    if text is None:
+        return _length.pack(0xFFFF)
+    if isinstance(text, str):
+        text = text.decode('latin-1')
+    text = text.encode('utf-8')[:0xFFFE]
+    return _length.pack(len(text)) + text
+
+def _decodeText(data, offset):
+    length = _length.unpack_from(data, offset)[0]
+    offset += _length.size
+    if length == 0xFFFF:
+        return None, offset
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+def _encodeEq(arg):
+    eqData = getattr(arg, '_obj', arg)
+    return _bands.pack(*[max(0, min(band, 0xFF)) for band in eqData.BandData])
+
+def _decodeEq(data, offset):
+    return list(_bands.unpack_from(data, offset)), offset + _bands.size
+
+def _encodeBands(eqData):
+    """Band info of any form setVfdEqData takes, see imon_message.fillEqData."""
+    structure = DSPEQDATA()
+    fillEqData(structure, eqData)
+    return _encodeEq(structure)
+
+def _encodeBytes(data):
+    return chr(len(data)) + ''.join([chr(byte & 0xFF) for byte in data])
+
+def _decodeBytes(data, offset):
+    length = ord(data[offset])
+    return tuple(ord(byte) for byte in data[offset + 1:offset + 1 + length]), offset + 1 + length
+
+# (encode, decode, ctypes constructor) by DLL argument type. Arguments are
+# encoded from their ctypes form, and decoded into plain python values. The
+# display daemon sends DLL calls to it in this form, see imon_daemon.
+ARG_CODECS = {
+    HWND: _encodeInt('<Q') + (HWND,),
+    UINT: _encodeInt('<I') + (UINT,),
+    BOOL: _encodeInt('<i') + (BOOL,),
+    c_int: _encodeInt('<i') + (c_int,),
+    BYTE: (_encodeByte, _decodeByte, BYTE),
+    LPCTSTR: (_encodeText, _decodeText, LPCTSTR),
+}
+EQ_CODEC = (_encodeEq, _decodeEq, lambda bands: byref(DSPEQDATA(BANDINFO(*bands))))
+
+# The codecs of every argument, by entry point index.
+CALL_CODECS = tuple(
+    tuple(ARG_CODECS.get(argType, EQ_CODEC) for argType in SIGNATURES[entryPoint][0])
+    for entryPoint in ENTRY_POINTS
+)
+
+ENTRY_POINT_INDEX = dict((entryPoint, index) for index, entryPoint in enumerate(ENTRY_POINTS))
+
+# (encode, decode) of the arguments of the imon_api functions, from what the
+# application passed, decoded into values the functions take again.
+TEXT = (_encodeText, _decodeText)
+INT = _encodeInt('<i')
+FLAG = (lambda arg: chr(bool(arg)), lambda data, offset: (bool(ord(data[offset])), offset + 1))
+BANDS = (_encodeBands, _decodeEq)
+BYTES = (_encodeBytes, _decodeBytes)
+
+# The imon_api functions recorded, each with the codecs of its arguments.
+# Only the functions making a DLL call are, the others (setVfdLine, the
+# setLcd*Icon functions) are recorded as the call they make.
+API_CALLS = (
+    ('init', (_encodeInt('<Q'), _encodeInt('<I'))),
+    ('unInit', ()),
+    ('setVfdText', (TEXT, TEXT)),
+    ('setVfdEqData', (BANDS,)),
+    ('setLcdText', (TEXT,)),
+    ('setLcdAllIcons', (FLAG,)),
+    ('setLcdIconBytes', (TEXT, BYTES)),
+    ('setLcdProgress', (INT, INT)),
+    ('setLcdEqData', (BANDS, BANDS)),
+)
+
+API_CALL_INDEX = dict((call[0], index) for index, call in enumerate(API_CALLS))
+
+def resultValue(result):
+    """
+    Returns
+    -------
+    int
+        The DSPResult value of what an api function returned, or raised
+        (the exceptions are named after the result), NO_RESULT for anything
+        else.
+
+    """
+    if isinstance(result, Exception):
+        result = getattr(DSPResult, str(result), None)
+    if isinstance(result, int) and not isinstance(result, bool) and 0 <= result < NO_RESULT:
+        return int(result)
+    return NO_RESULT
+
+# Recording ###################################
+
+class Recorder(object):
+    """
+    Appends records to a log file.
+
+    Attributes
+    ----------
+    path : string
+    records : int
+        Records written since the recorder was opened.
+
+    """
+
+    def __init__(self, path, bufferSize=65536):
+        """
+        Constructor. Opens the log, creating it if needed, and starts a new
+        session in it.
+
+        Parameters
+        ----------
+        path : string
+        bufferSize : int
+            Bytes buffered before they are written out.
+
+        Raises
+        ------
+        ValueError
+            Raised if the file exists and isn't a log.
+
+        """
+        self.path = path
+        self.records = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as existing:
+                if existing.read(len(MAGIC)) != MAGIC:
+                    raise ValueError, path + " is not a display log"
+            self.file = open(path, 'ab', bufferSize)
+        else:
+            self.file = open(path, 'ab', bufferSize)
+            self.file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._last = default_timer()
+        self.file.write(_header.pack(KIND_SESSION, 0) + _session.pack(time.time()))
+
+    def _delta(self):
+        """Microseconds since the previous record. Called with the lock held."""
+        now = default_timer()
+        delta = int((now - self._last) * 1000000)
+        self._last = now
+        return min(max(delta, 0), MAX_DELTA)
+
+    def call(self, function, args, result):
+        """
+        Records a call.
+
+        Parameters
+        ----------
+        function : string
+            The name of the imon_api function, see API_CALLS.
+        args : tuple
+            The arguments it was called with.
+        result : EnumMember or Exception
+            The DSPResult it returned, or what it raised.
+
+        """
+        index = API_CALL_INDEX[function]
+        payload = ''.join([codec[0](arg) for codec, arg in zip(API_CALLS[index][1], args)])
+        result = resultValue(result)
+        with self._lock:
+            if self.file is None:
+                return
+            self.file.write(_header.pack(index, self._delta()) + _result.pack(result) + payload)
+            self.records += 1
+
+    def notification(self, wParam, lParam):
+        """Records a notification."""
+        with self._lock:
+            if self.file is None:
+                return
+            self.file.write(_header.pack(KIND_NOTIFY, self._delta()) + _notify.pack(wParam or 0, lParam or 0))
+            self.records += 1
+
+    def flush(self):
+        """Writes out the buffered records."""
+        with self._lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        """Writes out the buffered records and closes the log."""
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# Replay ###################################
+
+def readLog(path):
+    """
+    Reads a log.
+
+    Parameters
+    ----------
+    path : string
+
+    Returns
+    -------
+    generator
+        A tuple for every record, its 2nd item the seconds since the start
+        of the log (gaps between sessions don't count):
+        ('call', seconds, function, args, result value),
+        ('notify', seconds, wParam, lParam) or
+        ('session', seconds, wall clock time).
+        args are plain python values, strings, ints and lists of bands.
+
+    Raises
+    ------
+    ValueError
+        Raised if the file isn't a log, or is damaged.
+
+    """
+    with open(path, 'rb') as log:
+        data = log.read()
+    if not data.startswith(MAGIC):
+        raise ValueError, path + " is not a display log"
+    offset = len(MAGIC)
+    elapsed = 0.0
+    end = len(data)
+    try:
+        while offset < end:
+            kind, delta = _header.unpack_from(data, offset)
+            offset += _header.size
+            elapsed += delta / 1000000.0
+            if kind == KIND_SESSION:
+                wallTime = _session.unpack_from(data, offset)[0]
+                offset += _session.size
+                yield ('session', elapsed, wallTime)
+            elif kind == KIND_NOTIFY:
+                wParam, lParam = _notify.unpack_from(data, offset)
+                offset += _notify.size
+                yield ('notify', elapsed, wParam, lParam)
+            else:
+                result = _result.unpack_from(data, offset)[0]
+                offset += _result.size
+                args = []
+                function, codecs = API_CALLS[kind]
+                for codec in codecs:
+                    arg, offset = codec[1](data, offset)
+                    args.append(arg)
+                yield ('call', elapsed, function, tuple(args), result)
+    except (struct.error, IndexError, UnicodeDecodeError), msg:
+        # a log cut short by a crash ends in a partial record
+        if offset < end - 64:
+            raise ValueError, "Damaged display log at byte " + str(offset) + ": " + str(msg)
+
+def replay(path, api, speed=1.0, onNotification=None):
+    """
+    Makes every call of a log again.
+
+    Parameters
+    ----------
+    path : string
+    api : module
+        The module called, normally imon_api, with the backend to replay
+        against in use, see imon_api.useBackend. The calls go through its
+        shadow framebuffer and rate limiter again.
+    speed : float
+        1 for the original timing, 2 for twice as fast and so on, 0 for as
+        fast as possible.
+    onNotification : callable
+        Called with (wParam, lParam) for the recorded notifications, at the
+        time they were recorded.
+
+    Returns
+    -------
+    dict
+        calls, notifications, mismatched (calls whose result differs from
+        the recorded one) and seconds (how long the replay took).
+
+    """
+    stats = {'calls': 0, 'notifications': 0, 'mismatched': 0}
+    start = default_timer()
+    for record in readLog(path):
+        if speed:
+            delay = start + record[1] / speed - default_timer()
+            if delay > 0:
+                time.sleep(delay)
+        if record[0] == 'call':
+            function, args, recorded = record[2:]
+            try:
+                result = getattr(api, function)(*args)
+            except Exception, msg:
+                result = msg
+            stats['calls'] += 1
+            if recorded != NO_RESULT and resultValue(result) != recorded:
+                stats['mismatched'] += 1
+        elif record[0] == 'notify':
+            stats['notifications'] += 1
+            if onNotification is not None:
+                onNotification(record[2], record[3])
+    stats['seconds'] = default_timer() - start
+    return stats
@@ -0,0 +1,228 @@
+"""
+A render loop that owns the display. Callers post the content they want on
+the display and return immediately, while a single worker thread writes only
+the newest pending content, at most maxFps times per second.
+
+Content that gets replaced before the worker gets to it is dropped, it never
+reaches the DLL.
+
+Example
+-------
+>>> renderer = RenderLoop(imon_api, maxFps=30)
+>>> renderer.start()
+>>> renderer.post('setVfdEqData', {1: 20, 2: 40})
+>>> renderer.post('setVfdText', "Now Playing", "Some Song")
+>>> renderer.stop()
+
+"""
+
+import threading
+import time
+
+# The imon_api functions that can be posted, in the order they are flushed.
+FRAME_FUNCTIONS = (
+    'setVfdText',
+    'setVfdEqData',
+    'setLcdText',
+    'setLcdEqData',
+    'setLcdAllIcons',
+    'setLcdOrangeIcon',
+    'setLcdMediaTypeIcon',
+    'setLcdSpeakerIcon',
+    'setLcdVideoCodecIcon',
+    'setLcdAudioCodecIcon',
+    'setLcdAspectRatioIcon',
+    'setLcdEtcIcon',
+    'setLcdProgress',
+)
+
+class RenderLoop(object):
+    """
+    Latest-wins coalescing writer for the display.
+
+    Attributes
+    ----------
+    maxFps : float
+        The maximum number of times per second pending content is flushed.
+    onError : callable
+        Called with (functionName, exception) when a flushed write fails.
+        Failures are otherwise ignored, the worker keeps running.
+
+    """
+
+    def __init__(self, api, maxFps=30, onError=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            The module that does the actual writes, normally imon_api.
+        maxFps : float
+            The maximum flush rate.
+        onError : callable
+            Optional error callback, see the class attributes.
+
+        """
+        self.api = api
+        self.maxFps = maxFps
+        self.onError = onError
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self.resetStats()
+
+    def start(self, lazy=False):
+        """
+        Starts the worker thread, if it is not already running.
+
+        Parameters
+        ----------
+        lazy : bool
+            If True, the thread only starts once something is posted, so it
+            costs nothing when nobody posts.
+
+        """
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            if not lazy:
+                self._startThread()
+
+    def _startThread(self):
+        """Starts the worker thread. Called with the lock held."""
+        self._thread = threading.Thread(target=self._run, name="iMON Render Loop")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """
+        Stops the worker thread.
+
+        Parameters
+        ----------
+        flush : bool
+            If True, the content still pending is written before returning,
+            otherwise it is dropped.
+
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            thread, self._thread = self._thread, None
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+        if flush:
+            self.flush()
+        else:
+            self.clear()
+
+    def isRunning(self):
+        return self._running
+
+    def post(self, function, *args):
+        """
+        Queues a write, replacing any write of the same function that was not
+        flushed yet.
+
+        Parameters
+        ----------
+        function : string
+            Name of the imon_api function, one of FRAME_FUNCTIONS.
+        *args :
+            The arguments the function will be called with.
+
+        Raises
+        ------
+        ValueError
+            Raised when the function can not be posted.
+
+        """
+        if function not in FRAME_FUNCTIONS:
+            raise ValueError, "Can not post " + str(function)
+        with self._lock:
+            self.stats['posted'] += 1
+            if function in self._pending:
+                self.stats['dropped'] += 1
+            self._pending[function] = args
+            if self._running and self._thread is None:
+                self._startThread()
+        self._wake.set()
+
+    def clear(self):
+        """Drops all content that was posted but not flushed yet."""
+        with self._lock:
+            self.stats['dropped'] += len(self._pending)
+            self._pending = {}
+
+    def flush(self):
+        """
+        Writes all pending content right away, on the calling thread.
+
+        Returns
+        -------
+        int
+            The number of writes performed.
+
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        errors = 0
+        for function in FRAME_FUNCTIONS:
+            if function not in pending:
+                continue
+            try:
+                getattr(self.api, function)(*pending[function])
+            except Exception, msg:
+                errors += 1
+                if self.onError is not None:
+                    self.onError(function, msg)
+        if pending:
+            # flush also runs on the threads calling it, the counters are shared
+            with self._lock:
+                self.stats['errors'] += errors
+                self.stats['frames'] += 1
+                self.stats['flushed'] += len(pending)
+        return len(pending)
+
+    def getStats(self):
+        """
+        Returns
+        -------
+        dict
+            A copy of the counters:
+            posted - writes posted
+            flushed - posted writes that were written
+            dropped - posted writes that were replaced before being written
+            frames - number of flushes that wrote anything
+            errors - number of written writes that failed
+
+        """
+        with self._lock:
+            return dict(self.stats)
+
+    def resetStats(self):
+        """Resets all the counters to 0."""
+        with self._lock:
+            self.stats = {'posted': 0, 'flushed': 0, 'dropped': 0, 'frames': 0, 'errors': 0}
+
+    def _run(self):
+        """Worker thread body."""
+        lastFlush = 0
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            if not self._running:
+                break
+            # pace the flushes, anything posted while waiting gets merged.
+            delay = lastFlush + 1.0 / self.maxFps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            lastFlush = time.time()
+            self.flush()
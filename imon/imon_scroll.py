@@ -0,0 +1,250 @@
+"""
+Scrolls text that doesn't fit on the 16 column VFD.
+
+Every frame (the 16 characters visible at a time) of a line is computed once
+when the text is set, so scrolling only picks the next precomputed string.
+Each line scrolls on its own, with its own mode and speed, and only a line
+whose frame changed gets sent; the other line is kept as it is, see
+imon_api.setVfdLine.
+
+Attributes
+----------
+ScrollMode : ImonEnum
+    SCROLL_MARQUEE
+        The text runs right to left, wrapping around.
+    SCROLL_BOUNCE
+        The text runs to its end and back again.
+    SCROLL_PAGE
+        The text is shown 16 characters at a time.
+
+Example
+-------
+>>> scroller = VfdScroller(imon_api)
+>>> scroller.setLine(0, "A Very Long Artist Name", ScrollMode.SCROLL_MARQUEE, rate=4)
+>>> scroller.setLine(1, "Some Song Title That Goes On", ScrollMode.SCROLL_PAGE, rate=0.5)
+>>> scroller.stop()
+
+"""
+
+import threading
+import time
+from imon_enum import ImonEnum
+
+VFD_COLUMNS = 16
+
+ScrollMode = ImonEnum(
+    ('SCROLL_MARQUEE', 0),
+    ('SCROLL_BOUNCE',),
+    ('SCROLL_PAGE',)
+)
+
+class LineScroller(object):
+    """
+    The precomputed frames of one scrolling line.
+
+    Attributes
+    ----------
+    frames : tuple
+        Every frame, in display order. Text that fits has a single frame.
+    rate : float
+        Frames per second.
+
+    """
+
+    __slots__ = ('frames', 'rate')
+
+    def __init__(self, text, mode=ScrollMode.SCROLL_MARQUEE, rate=4.0, width=VFD_COLUMNS, gap="   ", hold=0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        text : string
+        mode : EnumMember
+            A ScrollMode.
+        rate : float
+            Frames per second, characters per second for marquee and bounce.
+        width : int
+            Columns of the line.
+        gap : string
+            Separates the end of the text from its start again, in marquee mode.
+        hold : int
+            Extra frames the start (and, bouncing, the end) stays up for.
+
+        """
+        self.rate = float(rate)
+        if len(text) <= width:
+            self.frames = (text,)
+            return
+        if mode == ScrollMode.SCROLL_PAGE:
+            frames = [text[i:i + width].ljust(width) for i in range(0, len(text), width)]
+        elif mode == ScrollMode.SCROLL_BOUNCE:
+            forward = [text[i:i + width] for i in range(len(text) - width + 1)]
+            frames = [forward[0]] * hold + forward + [forward[-1]] * hold + forward[-2:0:-1]
+        else:
+            loop = text + gap
+            doubled = loop + text
+            frames = [doubled[:width]] * hold + [doubled[i:i + width] for i in range(len(loop))]
+        self.frames = tuple(frames)
+
+    def isStatic(self):
+        """Returns True if the text fits, and never changes."""
+        return len(self.frames) == 1
+
+    def frameIndex(self, elapsed):
+        """The index of the frame due elapsed seconds after the text was set."""
+        return int(elapsed * self.rate) % len(self.frames)
+
+class VfdScroller(object):
+    """
+    Drives scrolling of both VFD lines from a single worker thread.
+
+    The worker ticks on a fixed grid measured from when it started, so timing
+    errors never add up, and ticks that are missed are skipped instead of
+    being caught up on.
+
+    Attributes
+    ----------
+    tick : float
+        Seconds between checks for a frame change. Lines scrolling faster
+        than 1 / tick frames per second skip frames.
+    onError : callable
+        Called with the exception when a write fails.
+    writes : int
+        The number of writes made.
+
+    """
+
+    def __init__(self, api, tick=0.05, onError=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            The module used to write, normally imon_api.
+        tick : float
+        onError : callable
+
+        """
+        self.api = api
+        self.tick = tick
+        self.onError = onError
+        self.writes = 0
+        self.lines = [None, None]
+        self.started = [0.0, 0.0]
+        self.shown = [None, None]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def setLine(self, index, text, mode=ScrollMode.SCROLL_MARQUEE, rate=4.0, hold=0):
+        """
+        Starts showing text on a line, scrolling it if it doesn't fit.
+
+        Parameters
+        ----------
+        index : int
+            0 for the 1st line, 1 for the 2nd line.
+        text : string
+        mode : EnumMember
+            A ScrollMode.
+        rate : float
+            Frames per second.
+        hold : int
+            See LineScroller.
+
+        """
+        line = LineScroller(text, mode, rate, hold=hold)
+        with self._lock:
+            self.lines[index] = line
+            self.started[index] = time.time()
+            self.shown[index] = None
+        self.step()
+        if not line.isStatic():
+            self._startThread()
+
+    def clearLine(self, index):
+        """Stops scrolling a line, leaving its current frame on the display."""
+        with self._lock:
+            self.lines[index] = None
+            self.shown[index] = None
+
+    def isScrolling(self):
+        """Returns True if any line scrolls."""
+        return any(line is not None and not line.isStatic() for line in self.lines)
+
+    def stop(self):
+        """Stops scrolling both lines."""
+        self.clearLine(0)
+        self.clearLine(1)
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def step(self, now=None):
+        """
+        Writes the lines whose frame is due to change.
+
+        Returns
+        -------
+        bool
+            True if anything was written.
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            due = [None, None]
+            for index in (0, 1):
+                line = self.lines[index]
+                if line is None:
+                    continue
+                frame = line.frameIndex(now - self.started[index])
+                if frame != self.shown[index]:
+                    self.shown[index] = frame
+                    due[index] = line.frames[frame]
+        try:
+            if due[0] is not None and due[1] is not None:
+                self.api.setVfdText(due[0], due[1])
+            elif due[0] is not None:
+                self.api.setVfdLine(0, due[0])
+            elif due[1] is not None:
+                self.api.setVfdLine(1, due[1])
+            else:
+                return False
+        except Exception, msg:
+            if self.onError is not None:
+                self.onError(msg)
+            return False
+        self.writes += 1
+        return True
+
+    def _startThread(self):
+        with self._lock:
+            # a worker on its way out sees this and keeps going instead
+            self._stop.clear()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="iMON VFD Scroller")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        """Worker thread body."""
+        start = time.time()
+        ticks = 0
+        while True:
+            with self._lock:
+                if self._stop.is_set() or not self.isScrolling():
+                    self._thread = None
+                    return
+            ticks += 1
+            delay = start + ticks * self.tick - time.time()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # fell behind, skip to the current tick
+                ticks = int((time.time() - start) / self.tick)
+            self.step()
@@ -0,0 +1,459 @@
+"""
+An in-process simulated iMON device, usable as an imon_api backend so the
+plugin can be exercised (and measured) without the hardware or iMON Manager.
+
+The simulator keeps a virtual framebuffer of everything written to it, and
+sends the same notifications iMON would, through the onNotify callback,
+instead of posting a window message.
+
+Example
+-------
+>>> sim = SimulatorBackend(latency=0.002, failureRate=0.01)
+>>> sim.onNotify = lambda wParam, lParam: received.append((wParam, lParam))
+>>> imon_api.useBackend(sim)
+>>> imon_api.init(0, 0)
+>>> imon_api.setVfdText("Hello", "World")
+>>> sim.vfdLines
+[u'Hello', u'World']
+
+The 'sim' backend name creates a SimulatorBackend configured from these
+environment variables:
+
+    IMON_SIM_LATENCY        seconds each call takes
+    IMON_SIM_FAILURE_RATE   chance (0 - 1) of a write failing with DSP_E_FAIL
+    IMON_SIM_CONNECT_DELAY  seconds between init and DSPNM_PLUGIN_SUCCEED
+    IMON_SIM_SEED           random seed, for repeatable failures
+    IMON_SIM_PLAN           notifications and scenarios to play after init,
+                            see parsePlan
+    IMON_SIM_PLAN_PERIOD    seconds after which the plan plays again
+
+"""
+
+import os
+import random
+import threading
+import time
+from imon_backend import Backend, registerBackend
+from imon_message import DSPResult, DSPNotifyCode, DSPNInitResult, DSPType
+from imon_icons import ICON_GROUPS, ICON_LAYOUTS
+
+VFD_COLUMNS = 16
+VFD_LINES = 2
+EQ_BANDS = 16
+
+# The scenario methods a plan can play, besides notifications.
+PLAN_SCENARIOS = ('restartImon', 'disconnectHardware', 'connectHardware')
+
+def parsePlan(text):
+    """
+    Parses a plan of notifications and scenarios, such as
+    "5:DSPNM_LCD_TEXT_SCROLL_DONE, 10:restartImon, 20:DSPNM_HW_DISCONNECTED:4".
+
+    Parameters
+    ----------
+    text : string
+        Comma separated entries of seconds after init, a DSPNotifyCode name
+        or one of PLAN_SCENARIOS, and optionally the lParam of a notification.
+
+    Returns
+    -------
+    list
+        (seconds, event, lParam) tuples, see SimulatorBackend.
+
+    Raises
+    ------
+    ValueError
+        Raised for an entry that can't be parsed or an unknown event.
+
+    """
+    plan = []
+    for entry in text.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        fields = entry.split(':')
+        if len(fields) not in (2, 3):
+            raise ValueError, "Plan entries are seconds:event[:lParam]: " + entry
+        plan.append((float(fields[0]), fields[1].strip(), int(fields[2]) if len(fields) == 3 else 0))
+    return plan
+
+def _checkPlan(plan):
+    """Raises ValueError for a plan entry whose event is not known."""
+    for delay, event, lParam in plan:
+        if event not in PLAN_SCENARIOS and event not in DSPNotifyCode.members:
+            raise ValueError, "Unknown plan event: " + str(event)
+
+def _value(arg):
+    """The plain python value of a ctypes argument."""
+    return getattr(arg, 'value', arg)
+
+def _byte(arg):
+    """A BYTE argument as 0 - 255, BYTE may be a signed c_byte."""
+    return _value(arg) & 0xFF
+
+def _bands(arg):
+    """The 16 band values of a byref(DSPEQDATA) / DSPEQDATA argument."""
+    eqData = getattr(arg, '_obj', arg)
+    return list(eqData.BandData)
+
+class SimulatorBackend(Backend):
+    """
+    Simulated iMON Manager + display.
+
+    Attributes
+    ----------
+    onNotify : callable
+        Called with (wParam, lParam) for every notification, from a timer
+        thread, like the window message iMON would post. Notifications
+        are kept in the notifications list when this is None.
+    notifications : list
+        Notifications sent while onNotify was None.
+    displayType : EnumMember
+        The DSPType reported with DSPNM_PLUGIN_SUCCEED.
+    latency : float or callable
+        Seconds every call takes, or a callable returning them.
+    failureRate : float
+        Chance of a write failing with DSP_E_FAIL.
+    connectDelay : float
+        Seconds between init and the plugin mode notification.
+    pluginFailure : EnumMember
+        If set, init is answered with DSPNM_PLUGIN_FAILED and this DSPNInitResult.
+    scrollCharDelay : float
+        Seconds the LCD takes to scroll one character. Text longer than the
+        LCD fires DSPNM_LCD_TEXT_SCROLL_DONE once it is done scrolling.
+    lcdColumns : int
+        Characters the LCD shows without scrolling.
+    plan : list
+        (seconds, event, lParam) tuples played after every init: the event
+        is the name of a DSPNotifyCode sent with lParam, or of a scenario in
+        PLAN_SCENARIOS, such as restartImon. See parsePlan.
+    planPeriod : float
+        Seconds after which the plan plays again, 0 to play it once.
+    calls : dict
+        Number of calls per entry point.
+    failures : int
+        Number of calls failed on purpose.
+    vfdLines : list
+        The 2 lines of VFD text, as displayed (cut at 16 characters).
+    vfdEq : list
+        The 16 VFD equalizer bands.
+    lcdText : string
+    lcdEqLeft : list
+    lcdEqRight : list
+    icons : dict
+        The icon bytes, by group name, each group is a tuple of bytes.
+    progress : tuple
+        (position, total) of the LCD progress bar.
+
+    """
+
+    name = "sim"
+
+    def __init__(self, latency=0, failureRate=0, connectDelay=0, displayType=None,
+                 pluginFailure=None, scrollCharDelay=0.1, lcdColumns=16, seed=None, plan=(), planPeriod=0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        See the class attributes of the same names.
+
+        seed :
+            Seed for the failure random number generator.
+
+        Raises
+        ------
+        ValueError
+            Raised if the plan has an unknown event.
+
+        """
+        _checkPlan(plan)
+        self.onNotify = None
+        self.notifications = []
+        self.latency = latency
+        self.failureRate = failureRate
+        self.connectDelay = connectDelay
+        self.displayType = displayType if displayType is not None else DSPType.DSPN_DSP_VFD
+        self.pluginFailure = pluginFailure
+        self.scrollCharDelay = scrollCharDelay
+        self.lcdColumns = lcdColumns
+        self.plan = list(plan)
+        self.planPeriod = planPeriod
+        self.random = random.Random(seed)
+        self.calls = {}
+        self.failures = 0
+        self.inited = False
+        self.pluginMode = False
+        self.timers = []
+        self.lock = threading.RLock()
+        self.clear()
+
+    @classmethod
+    def fromEnvironment(cls):
+        """Creates a simulator configured by the IMON_SIM_* environment variables."""
+        env = os.environ.get
+        seed = env("IMON_SIM_SEED")
+        return cls(
+            latency=float(env("IMON_SIM_LATENCY", 0)),
+            failureRate=float(env("IMON_SIM_FAILURE_RATE", 0)),
+            connectDelay=float(env("IMON_SIM_CONNECT_DELAY", 0)),
+            seed=int(seed) if seed else None,
+            plan=parsePlan(env("IMON_SIM_PLAN", "")),
+            planPeriod=float(env("IMON_SIM_PLAN_PERIOD", 0))
+        )
+
+    def clear(self):
+        """Blanks the virtual display."""
+        self.vfdLines = [u"", u""]
+        self.vfdEq = [0] * EQ_BANDS
+        self.lcdText = u""
+        self.lcdEqLeft = [0] * EQ_BANDS
+        self.lcdEqRight = [0] * EQ_BANDS
+        self.icons = dict((group, (0,) * ICON_LAYOUTS[group].size) for group in ICON_GROUPS)
+        self.progress = (0, 0)
+
+    # Notifications ###################################
+
+    def notify(self, notifyCode, lParam=0):
+        """
+        Sends a notification right away.
+
+        Parameters
+        ----------
+        notifyCode : EnumMember
+            The DSPNotifyCode to send.
+        lParam : int
+            The notification payload.
+
+        """
+        if self.onNotify is None:
+            self.notifications.append((notifyCode.value, int(lParam)))
+        else:
+            self.onNotify(notifyCode.value, int(lParam))
+
+    def schedule(self, delay, notifyCode, lParam=0, action=None):
+        """
+        Sends a notification after delay seconds, calling action first.
+        Scheduled notifications are cancelled by IMON_Display_Uninit.
+        """
+        def fire():
+            with self.lock:
+                if timer not in self.timers:
+                    return
+                self.timers.remove(timer)
+                if action is not None:
+                    action()
+            self.notify(notifyCode, lParam)
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        with self.lock:
+            self.timers.append(timer)
+        timer.start()
+        return timer
+
+    def after(self, delay, function, *args):
+        """
+        Calls function with args after delay seconds, outside the lock, such
+        as a scenario. Cancelled by IMON_Display_Uninit like notifications.
+        """
+        def fire():
+            with self.lock:
+                if timer not in self.timers:
+                    return
+                self.timers.remove(timer)
+            function(*args)
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        with self.lock:
+            self.timers.append(timer)
+        timer.start()
+        return timer
+
+    def playPlan(self):
+        """Schedules the plan's events, from now, and the plan again after planPeriod."""
+        for delay, event, lParam in self.plan:
+            if event in PLAN_SCENARIOS:
+                self.after(delay, getattr(self, event))
+            else:
+                self.schedule(delay, DSPNotifyCode.members[event], lParam)
+        if self.plan and self.planPeriod > 0:
+            self.after(self.planPeriod, self.playPlan)
+
+    def cancelScheduled(self):
+        """Cancels every scheduled notification."""
+        with self.lock:
+            for timer in self.timers:
+                timer.cancel()
+            self.timers = []
+
+    def _enterPluginMode(self):
+        self.pluginMode = True
+
+    def _requestPluginMode(self, delay):
+        """Answers a plugin mode request, like iMON does after init or a restart."""
+        if self.pluginFailure is not None:
+            self.schedule(delay, DSPNotifyCode.DSPNM_PLUGIN_FAILED, self.pluginFailure)
+        else:
+            self.schedule(delay, DSPNotifyCode.DSPNM_PLUGIN_SUCCEED, self.displayType,
+                          self._enterPluginMode)
+
+    # Scenarios ###################################
+
+    def restartImon(self, downtime=1.0):
+        """Simulates iMON Manager closing, and coming back after downtime seconds."""
+        with self.lock:
+            self.pluginMode = False
+            self.clear()
+        self.notify(DSPNotifyCode.DSPNM_IMON_CLOSED)
+        self.schedule(downtime, DSPNotifyCode.DSPNM_IMON_RESTARTED, self.displayType)
+        self._requestPluginMode(downtime + self.connectDelay)
+
+    def disconnectHardware(self):
+        """Simulates the display being unplugged."""
+        with self.lock:
+            self.pluginMode = False
+            self.clear()
+        self.notify(DSPNotifyCode.DSPNM_HW_DISCONNECTED, DSPNInitResult.DSPN_ERR_HW_DISCONNECTED)
+
+    def connectHardware(self):
+        """Simulates the display being plugged back in."""
+        self.notify(DSPNotifyCode.DSPNM_HW_CONNECTED, self.displayType)
+        self._requestPluginMode(self.connectDelay)
+
+    # Entry Points ###################################
+
+    def _enter(self, entryPoint, write=True):
+        """
+        Common start of every call: counts it, waits out the latency and
+        decides if the call fails.
+
+        Returns
+        -------
+        EnumMember
+            A DSPResult failure, or None if the call should go ahead.
+
+        """
+        with self.lock:
+            self.calls[entryPoint] = self.calls.get(entryPoint, 0) + 1
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        if not write:
+            return None
+        if not self.inited:
+            return DSPResult.DSP_E_NOT_INITED
+        if not self.pluginMode:
+            return DSPResult.DSP_E_FAIL
+        if self.failureRate and self.random.random() < self.failureRate:
+            self.failures += 1
+            return DSPResult.DSP_E_FAIL
+        return None
+
+    def IMON_Display_Init(self, hwnd, wm):
+        self._enter('IMON_Display_Init', False)
+        with self.lock:
+            self.inited = True
+        self._requestPluginMode(self.connectDelay)
+        self.playPlan()
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_Uninit(self):
+        self._enter('IMON_Display_Uninit', False)
+        self.cancelScheduled()
+        with self.lock:
+            self.inited = False
+            self.pluginMode = False
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_IsInited(self):
+        self._enter('IMON_Display_IsInited', False)
+        return DSPResult.DSP_S_INITED if self.inited else DSPResult.DSP_S_NOT_INITED
+
+    def IMON_Display_IsPluginModeEnabled(self):
+        self._enter('IMON_Display_IsPluginModeEnabled', False)
+        if self.pluginMode:
+            return DSPResult.DSP_S_IN_PLUGIN_MODE
+        return DSPResult.DSP_S_NOT_IN_PLUGIN_MODE
+
+    def IMON_Display_SetVfdText(self, line1, line2):
+        failure = self._enter('IMON_Display_SetVfdText')
+        if failure is not None:
+            return failure
+        line1, line2 = _value(line1), _value(line2)
+        if line1 is None or line2 is None:
+            return DSPResult.DSP_E_POINTER
+        self.vfdLines = [line1[:VFD_COLUMNS], line2[:VFD_COLUMNS]]
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_SetVfdEqData(self, eqData):
+        failure = self._enter('IMON_Display_SetVfdEqData')
+        if failure is not None:
+            return failure
+        self.vfdEq = _bands(eqData)
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_SetLcdText(self, text):
+        failure = self._enter('IMON_Display_SetLcdText')
+        if failure is not None:
+            return failure
+        text = _value(text)
+        if text is None:
+            return DSPResult.DSP_E_POINTER
+        self.lcdText = text
+        if len(text) > self.lcdColumns:
+            self.schedule(len(text) * self.scrollCharDelay, DSPNotifyCode.DSPNM_LCD_TEXT_SCROLL_DONE)
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_SetLcdEqData(self, eqDataLeft, eqDataRight):
+        failure = self._enter('IMON_Display_SetLcdEqData')
+        if failure is not None:
+            return failure
+        self.lcdEqLeft = _bands(eqDataLeft)
+        self.lcdEqRight = _bands(eqDataRight)
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_SetLcdAllIcons(self, on):
+        failure = self._enter('IMON_Display_SetLcdAllIcons')
+        if failure is not None:
+            return failure
+        byte = 0xFF if _value(on) else 0
+        for group in ICON_GROUPS:
+            self.icons[group] = (byte,) * len(self.icons[group])
+        return DSPResult.DSP_SUCCEEDED
+
+    def _setIcon(self, entryPoint, group, *data):
+        failure = self._enter(entryPoint)
+        if failure is not None:
+            return failure
+        self.icons[group] = tuple(_byte(byte) for byte in data)
+        return DSPResult.DSP_SUCCEEDED
+
+    def IMON_Display_SetLcdOrangeIcon(self, data1, data2):
+        return self._setIcon('IMON_Display_SetLcdOrangeIcon', 'orange', data1, data2)
+
+    def IMON_Display_SetLcdMediaTypeIcon(self, data):
+        return self._setIcon('IMON_Display_SetLcdMediaTypeIcon', 'mediaType', data)
+
+    def IMON_Display_SetLcdSpeakerIcon(self, data1, data2):
+        return self._setIcon('IMON_Display_SetLcdSpeakerIcon', 'speaker', data1, data2)
+
+    def IMON_Display_SetLcdVideoCodecIcon(self, data):
+        return self._setIcon('IMON_Display_SetLcdVideoCodecIcon', 'videoCodec', data)
+
+    def IMON_Display_SetLcdAudioCodecIcon(self, data):
+        return self._setIcon('IMON_Display_SetLcdAudioCodecIcon', 'audioCodec', data)
+
+    def IMON_Display_SetLcdAspectRatioIcon(self, data):
+        return self._setIcon('IMON_Display_SetLcdAspectRatioIcon', 'aspectRatio', data)
+
+    def IMON_Display_SetLcdEtcIcon(self, data):
+        return self._setIcon('IMON_Display_SetLcdEtcIcon', 'etc', data)
+
+    def IMON_Display_SetLcdProgress(self, position, total):
+        failure = self._enter('IMON_Display_SetLcdProgress')
+        if failure is not None:
+            return failure
+        self.progress = (_value(position), _value(total))
+        return DSPResult.DSP_SUCCEEDED
+
+registerBackend(SimulatorBackend.name, SimulatorBackend.fromEnvironment)
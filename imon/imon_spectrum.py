@@ -0,0 +1,299 @@
+"""
+A streaming spectrum analyzer for the equalizer displays.
+
+PCM audio is read from a WAV file, a pipe or a socket, cut into overlapping
+windows and turned into 16 log spaced bands from 0 - 100 with NumPy FFTs.
+Everything is a generator pipeline working on one block at a time, so memory
+stays bounded no matter how long the stream is.
+
+Requires NumPy, which is only imported when the analyzer is used.
+
+Example
+-------
+>>> sampleRate, channels, blocks = wavSource("song.wav", realtime=True)
+>>> analyzer = SpectrumAnalyzer(sampleRate, channels)
+>>> for levels in analyzer.process(blocks):
+...     renderer.post('setVfdEqData', levels)
+
+With stereo=True each item is a (left, right) pair for setLcdEqData instead.
+The bands are int32 arrays, which the EQ functions take without any per band work.
+
+"""
+
+import socket
+import time
+import wave
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EQ_BANDS = 16
+
+# numpy sample formats by sample width in bytes
+SAMPLE_FORMATS = {
+    1: ('u1', 128.0, 128.0),
+    2: ('<i2', 0.0, 32768.0),
+    4: ('<i4', 0.0, 2147483648.0),
+}
+
+def _requireNumpy():
+    if numpy is None:
+        raise ImportError, "The spectrum analyzer requires NumPy"
+
+# Sources ###################################
+
+def pcmBlocks(stream, channels=2, sampleWidth=2, blockFrames=1024):
+    """
+    Reads interleaved little endian PCM from a file like object (a pipe, a
+    socket file, stdin, ...), until it runs out.
+
+    Parameters
+    ----------
+    stream :
+        Anything with a read(size) method.
+    channels : int
+    sampleWidth : int
+        Bytes per sample, 1 (unsigned), 2 or 4.
+    blockFrames : int
+        Frames per block.
+
+    Returns
+    -------
+    generator
+        float32 arrays of shape (frames, channels), scaled to -1 - 1.
+        The last block can be shorter.
+
+    """
+    _requireNumpy()
+    if sampleWidth not in SAMPLE_FORMATS:
+        raise ValueError, "Unsupported sample width: " + str(sampleWidth)
+    dtype, offset, scale = SAMPLE_FORMATS[sampleWidth]
+    frameSize = channels * sampleWidth
+    blockSize = blockFrames * frameSize
+    pending = ""
+    while True:
+        data = stream.read(blockSize - len(pending))
+        if not data:
+            break
+        pending += data
+        if len(pending) < blockSize:
+            # pipes and sockets return short reads, wait for a whole block
+            continue
+        yield _decode(pending, dtype, offset, scale, channels)
+        pending = ""
+    usable = len(pending) - len(pending) % frameSize
+    if usable:
+        yield _decode(pending[:usable], dtype, offset, scale, channels)
+
+def _decode(data, dtype, offset, scale, channels):
+    samples = numpy.frombuffer(data, dtype=dtype).astype(numpy.float32)
+    if offset:
+        samples -= offset
+    samples /= scale
+    return samples.reshape(-1, channels)
+
+def paced(blocks, sampleRate):
+    """
+    Passes blocks through no faster than they would play, for sources (such
+    as files) that can be read faster than real time.
+    """
+    start = time.time()
+    played = 0
+    for block in blocks:
+        delay = start + played / float(sampleRate) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        yield block
+        played += len(block)
+
+def wavSource(path, blockFrames=1024, realtime=False):
+    """
+    Opens a WAV file.
+
+    Parameters
+    ----------
+    path : string
+    blockFrames : int
+        Frames per block.
+    realtime : bool
+        If True, blocks are produced at the speed the file would play.
+
+    Returns
+    -------
+    tuple
+        (sampleRate, channels, blocks), see pcmBlocks for the blocks.
+
+    """
+    wav = wave.open(path, 'rb')
+    sampleRate = wav.getframerate()
+    channels = wav.getnchannels()
+    sampleWidth = wav.getsampwidth()
+
+    class Reader(object):
+        def read(self, size):
+            return wav.readframes(size // (channels * sampleWidth))
+
+    def blocks():
+        try:
+            for block in pcmBlocks(Reader(), channels, sampleWidth, blockFrames):
+                yield block
+        finally:
+            wav.close()
+
+    source = blocks()
+    if realtime:
+        source = paced(source, sampleRate)
+    return sampleRate, channels, source
+
+def socketSource(address, channels=2, sampleWidth=2, blockFrames=1024):
+    """
+    Connects to a TCP socket streaming raw PCM.
+
+    Parameters
+    ----------
+    address : tuple
+        (host, port)
+
+    Returns
+    -------
+    generator
+        See pcmBlocks. The socket is closed when the generator is.
+
+    """
+    connection = socket.create_connection(address)
+    stream = connection.makefile('rb')
+    try:
+        for block in pcmBlocks(stream, channels, sampleWidth, blockFrames):
+            yield block
+    finally:
+        stream.close()
+        connection.close()
+
+# Analyzer ###################################
+
+class SpectrumAnalyzer(object):
+    """
+    Turns blocks of PCM into equalizer levels.
+
+    Attributes
+    ----------
+    sampleRate : int
+    channels : int
+    fftSize : int
+        Window length in frames. Each block read moves the window along by
+        the block length, so windows overlap when blocks are shorter.
+    stereo : bool
+        If True, levels are (left, right) pairs, otherwise one mono set.
+    floorDb : float
+        The level (dB below full scale) shown as 0, 0 dB is shown as 100.
+    decay : int
+        The most a band can fall per frame, 0 - 100, for smoother bars.
+        100 disables the smoothing.
+
+    """
+
+    def __init__(self, sampleRate, channels=2, fftSize=2048, stereo=False,
+                 minFreq=40.0, maxFreq=16000.0, floorDb=-60.0, decay=8):
+        _requireNumpy()
+        self.sampleRate = sampleRate
+        self.channels = channels
+        self.fftSize = fftSize
+        self.stereo = stereo
+        self.floorDb = floorDb
+        self.decay = decay
+        self.window = numpy.hanning(fftSize).astype(numpy.float32)[:, None]
+        # a full scale sine comes out of the windowed fft at this magnitude
+        self.reference = self.window.sum() / 2.0
+        self.starts, self.stop = self._bandBins(minFreq, min(maxFreq, sampleRate / 2.0))
+        self.buffer = numpy.zeros((fftSize, channels), numpy.float32)
+        self.levels = numpy.zeros((EQ_BANDS, 2 if stereo else 1), numpy.float32)
+
+    def _bandBins(self, minFreq, maxFreq):
+        """
+        Precomputes the first fft bin of every log spaced band, making sure
+        each band gets at least one bin.
+
+        Returns
+        -------
+        tuple
+            (band start bins, first bin past the last band)
+
+        """
+        edges = numpy.logspace(numpy.log10(minFreq), numpy.log10(maxFreq), EQ_BANDS + 1)
+        bins = numpy.floor(edges * self.fftSize / float(self.sampleRate)).astype(int)
+        bins = numpy.maximum(bins, 1)
+        for band in range(1, EQ_BANDS + 1):
+            bins[band] = max(bins[band], bins[band - 1] + 1)
+        return bins[:-1], bins[-1]
+
+    def analyze(self, block):
+        """
+        Moves the window along by one block and computes the levels.
+
+        Parameters
+        ----------
+        block : array
+            float32 frames of shape (frames, channels).
+
+        Returns
+        -------
+        array or tuple
+            16 int32 levels, or a (left, right) pair of them in stereo.
+
+        """
+        frames = min(len(block), self.fftSize)
+        if frames:
+            self.buffer[:-frames] = self.buffer[frames:]
+            self.buffer[-frames:] = block[-frames:]
+        spectrum = numpy.abs(numpy.fft.rfft(self.buffer * self.window, axis=0))[:self.stop]
+        if self.stereo:
+            if self.channels == 1:
+                spectrum = numpy.repeat(spectrum, 2, axis=1)
+            else:
+                spectrum = spectrum[:, :2]
+        else:
+            spectrum = spectrum.mean(axis=1, keepdims=True)
+        bands = numpy.maximum.reduceat(spectrum, self.starts, axis=0)
+        db = 20.0 * numpy.log10(numpy.maximum(bands / self.reference, 1e-9))
+        levels = numpy.clip((db - self.floorDb) * (100.0 / -self.floorDb), 0, 100)
+        self.levels = numpy.maximum(levels, self.levels - self.decay)
+        out = numpy.ascontiguousarray(self.levels.T, dtype=numpy.int32)
+        if self.stereo:
+            return out[0], out[1]
+        return out[0]
+
+    def process(self, blocks):
+        """
+        Generator, analyzes every block.
+
+        Parameters
+        ----------
+        blocks : iterable
+            float32 arrays of shape (frames, channels), such as from wavSource.
+
+        """
+        for block in blocks:
+            yield self.analyze(block)
+
+def feedDisplay(levels, post, stereo=False):
+    """
+    Sends every set of levels to the display.
+
+    Parameters
+    ----------
+    levels : iterable
+        Output of SpectrumAnalyzer.process.
+    post : callable
+        Called like the render loop's post method, such as RenderLoop.post.
+        Use a RenderLoop to drop frames the display can't keep up with.
+    stereo : bool
+        Selects setLcdEqData for (left, right) levels, otherwise setVfdEqData.
+
+    """
+    for frame in levels:
+        if stereo:
+            post('setLcdEqData', frame[0], frame[1])
+        else:
+            post('setVfdEqData', frame)
@@ -0,0 +1,211 @@
+"""
+Instrumentation of the calls made to the display backend.
+
+When instrumentation is on, imon_api puts an InstrumentedBackend in front of
+the backend, which counts every call, its errors by DSPResult name and its
+latency. When it is off the wrapper isn't there at all, so it costs nothing.
+
+Latencies go into histograms with fixed, power of 2 microsecond buckets, so
+memory use doesn't grow with the number of calls.
+
+Example
+-------
+>>> imon_api.useInstrumentation(True)
+>>> imon_api.setVfdText("Hello", "World")
+>>> imon_api.getCallStats().summary()['IMON_Display_SetVfdText']['calls']
+1
+
+"""
+
+import threading
+from timeit import default_timer
+from imon_backend import ENTRY_POINTS
+
+# Bucket i holds latencies of 2 ** (i - 1) up to 2 ** i microseconds, the
+# last one everything longer (about 8 seconds and up).
+HISTOGRAM_BUCKETS = 24
+
+class LatencyHistogram(object):
+    """
+    Attributes
+    ----------
+    buckets : list
+        Call counts by bucket, see HISTOGRAM_BUCKETS.
+    count : int
+    total : float
+        Seconds, summed over every call.
+    max : float
+        Seconds, of the slowest call.
+
+    """
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Records one latency."""
+        self.buckets[min(int(seconds * 1000000).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """
+        Parameters
+        ----------
+        percent : float
+            0 - 100
+
+        Returns
+        -------
+        float
+            Seconds, the upper bound of the bucket holding the percentile,
+            or the slowest call if that is lower. 0 if there were no calls.
+
+        """
+        if not self.count:
+            return 0.0
+        wanted = self.count * percent / 100.0
+        seen = 0
+        for index, calls in enumerate(self.buckets):
+            seen += calls
+            if seen >= wanted and calls:
+                return min((1 << index) / 1000000.0, self.max)
+        return self.max
+
+    def mean(self):
+        """Seconds, 0 if there were no calls."""
+        return self.total / self.count if self.count else 0.0
+
+class CallStats(object):
+    """
+    Counters and latencies of every entry point.
+
+    Attributes
+    ----------
+    calls : dict
+        Calls made, by entry point.
+    errors : dict
+        By entry point, a dict of error counts by DSPResult name. Calls that
+        raised are counted by exception class name.
+    latency : dict
+        LatencyHistogram by entry point.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zeroes every counter."""
+        with self._lock:
+            self.calls = dict.fromkeys(ENTRY_POINTS, 0)
+            self.errors = dict((entryPoint, {}) for entryPoint in ENTRY_POINTS)
+            self.latency = dict((entryPoint, LatencyHistogram()) for entryPoint in ENTRY_POINTS)
+
+    def record(self, entryPoint, seconds, error=None):
+        """
+        Records one call.
+
+        Parameters
+        ----------
+        entryPoint : string
+        seconds : float
+            How long the call took.
+        error : string
+            The error name, None if the call succeeded.
+
+        """
+        with self._lock:
+            self.calls[entryPoint] += 1
+            self.latency[entryPoint].add(seconds)
+            if error is not None:
+                errors = self.errors[entryPoint]
+                errors[error] = errors.get(error, 0) + 1
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dict
+            By entry point called at least once: calls, errors (by name),
+            and the mean, p50, p95, p99 and max latency in milliseconds.
+            Ready for json.dump or an event payload.
+
+        """
+        summary = {}
+        with self._lock:
+            for entryPoint in ENTRY_POINTS:
+                if not self.calls[entryPoint]:
+                    continue
+                latency = self.latency[entryPoint]
+                summary[entryPoint] = {
+                    'calls': self.calls[entryPoint],
+                    'errors': dict(self.errors[entryPoint]),
+                    'meanMs': latency.mean() * 1000.0,
+                    'p50Ms': latency.percentile(50) * 1000.0,
+                    'p95Ms': latency.percentile(95) * 1000.0,
+                    'p99Ms': latency.percentile(99) * 1000.0,
+                    'maxMs': latency.max * 1000.0,
+                }
+        return summary
+
+    def totals(self):
+        """
+        Returns
+        -------
+        tuple
+            (calls, errors) over every entry point.
+
+        """
+        with self._lock:
+            return (sum(self.calls.itervalues()),
+                    sum(sum(errors.itervalues()) for errors in self.errors.itervalues()))
+
+class InstrumentedBackend(object):
+    """
+    Stands in front of a backend, recording every entry point call into a
+    CallStats. Anything else is passed through to the backend.
+
+    Attributes
+    ----------
+    backend : Backend
+        The backend doing the work.
+    stats : CallStats
+
+    """
+
+    def __init__(self, backend, stats):
+        self.backend = backend
+        self.stats = stats
+        for entryPoint in ENTRY_POINTS:
+            setattr(self, entryPoint, self._timed(entryPoint, getattr(backend, entryPoint)))
+
+    def _timed(self, entryPoint, function):
+        record = self.stats.record
+
+        def timed(*args):
+            start = default_timer()
+            try:
+                result = function(*args)
+            except Exception, msg:
+                record(entryPoint, default_timer() - start, msg.__class__.__name__)
+                raise
+            elapsed = default_timer() - start
+            name = getattr(result, 'name', None)
+            if name is not None and name.startswith('DSP_E_'):
+                record(entryPoint, elapsed, name)
+            else:
+                record(entryPoint, elapsed)
+            return result
+        return timed
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
@@ -0,0 +1,192 @@
+"""
+Gets the display back by itself after iMON Manager closes or refuses
+Display Plug-in Mode.
+
+Once the connection is lost, init is called again with exponential backoff
+and jitter, until iMON grants Display Plug-in Mode again. The last content
+of every display region is then written again in one burst, and the time
+the display was gone for is reported.
+
+Example
+-------
+>>> supervisor = ReconnectSupervisor(imon_api, connection, hwnd, wm, onRecovered=report)
+>>> supervisor.lost("DSPNM_IMON_CLOSED")   # from the notification handlers
+>>> supervisor.succeeded()                 # on DSPNM_PLUGIN_SUCCEED
+>>> # report({'seconds': 4.2, 'attempts': 3, 'restored': 5, 'cause': 'DSPNM_IMON_CLOSED'})
+
+"""
+
+import random
+import threading
+import time
+
+class ReconnectSupervisor(object):
+    """
+    Attributes
+    ----------
+    initialDelay : float
+        Seconds before the first attempt.
+    maxDelay : float
+        The most seconds between attempts.
+    factor : float
+        How much longer each wait is than the one before.
+    jitter : float
+        Each wait is randomly made up to this fraction longer or shorter, so
+        several clients don't retry in lockstep.
+    replyTimeout : float
+        Seconds to wait for iMON to answer a successful init before trying
+        again.
+    onRecovered : callable
+        Called with a dict once the display is back: seconds (since the
+        connection was lost), attempts, restored (regions written again) and
+        cause (what lost the connection).
+    onError : callable
+        Called with the exception when writing the last frame fails.
+    attempts : int
+        Attempts made since the connection was lost.
+
+    """
+
+    def __init__(self, api, connection, hwnd, wm, onRecovered=None, onError=None,
+                 initialDelay=1.0, maxDelay=60.0, factor=2.0, jitter=0.25, replyTimeout=10.0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            Normally imon_api.
+        connection : Connection
+            Told about the result of every init.
+        hwnd : HWND
+        wm : UINT
+            Passed to init, see imon_api.init.
+
+        """
+        self.api = api
+        self.connection = connection
+        self.hwnd = hwnd
+        self.wm = wm
+        self.onRecovered = onRecovered
+        self.onError = onError
+        self.initialDelay = initialDelay
+        self.maxDelay = maxDelay
+        self.factor = factor
+        self.jitter = jitter
+        self.replyTimeout = replyTimeout
+        self.attempts = 0
+        self.lostAt = None
+        self.cause = None
+        self.random = random.Random()
+        self._timer = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def isRecovering(self):
+        """Returns True between losing the connection and getting it back."""
+        return self.lostAt is not None
+
+    def nextDelay(self):
+        """Seconds to wait before the next attempt, with backoff and jitter."""
+        delay = min(self.maxDelay, self.initialDelay * self.factor ** self.attempts)
+        return delay * (1.0 + self.random.uniform(-self.jitter, self.jitter))
+
+    def lost(self, cause):
+        """
+        The connection was lost, or an attempt failed. Schedules the next attempt.
+
+        Parameters
+        ----------
+        cause : string
+            What lost the connection, reported once it is back.
+
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            if self.lostAt is None:
+                self.lostAt = time.time()
+                self.cause = cause
+                self.attempts = 0
+            self._schedule(self.nextDelay())
+
+    def retryNow(self):
+        """
+        Attempts right away, with the backoff started over, when iMON or the
+        hardware is back. Does nothing unless recovering.
+        """
+        with self._lock:
+            if self._stopped or self.lostAt is None:
+                return
+            self.attempts = 0
+            self._schedule(0)
+
+    def succeeded(self):
+        """
+        iMON granted Display Plug-in Mode. Writes the last frame again if the
+        connection had been lost.
+        """
+        with self._lock:
+            self._cancel()
+            lostAt, cause, attempts = self.lostAt, self.cause, self.attempts
+            self.lostAt = None
+            self.attempts = 0
+        if lostAt is None:
+            return
+        try:
+            restored = self.api.restoreLastFrame()
+        except Exception, msg:
+            restored = 0
+            if self.onError is not None:
+                self.onError(msg)
+        if self.onRecovered is not None:
+            self.onRecovered({
+                'seconds': time.time() - lostAt,
+                'attempts': attempts,
+                'restored': restored,
+                'cause': cause,
+            })
+
+    def stop(self):
+        """Gives up recovering, for good."""
+        with self._lock:
+            self._stopped = True
+            self._cancel()
+            self.lostAt = None
+
+    def _schedule(self, delay):
+        """Called with the lock held."""
+        self._cancel()
+        self._timer = threading.Timer(delay, self._attempt)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel(self):
+        """Called with the lock held."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _attempt(self):
+        """Timer callback, calls init again."""
+        with self._lock:
+            if self._stopped or self.lostAt is None:
+                return
+            self.attempts += 1
+            self._timer = None
+        try:
+            # the API may still think it is initialized, from before iMON went away
+            self.api.unInit()
+        except Exception:
+            pass
+        try:
+            self.api.init(self.hwnd, self.wm)
+        except Exception:
+            self.lost(self.cause)
+            return
+        self.connection.initialized()
+        with self._lock:
+            if self._stopped or self.lostAt is None:
+                return
+            # iMON answers with DSPNM_PLUGIN_SUCCEED or _FAILED, unless it isn't there
+            self._schedule(self.replyTimeout + self.nextDelay())
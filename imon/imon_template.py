@@ -0,0 +1,294 @@
+"""
+Display text from templates, such as "{artist}" or "{elapsed!t:%M:%S} {volume}%",
+kept up to date as their variables change.
+
+A template is parsed once into a list of literal strings and field getters.
+Each template knows the variables it uses, so updating a variable renders
+again only the lines using it, and only a line whose text changed gets
+written.
+
+Fields use str.format syntax, so "{ratio:.0%}" shows 0.5 as "50%" and a
+datetime takes a strftime format ("{now:%H:%M}"). The !t conversion marks a
+duration: the value is taken as seconds and the format spec is a strftime
+format, so "{elapsed!t:%M:%S}" shows 75 as "01:15". Strings, such as event
+payloads, are turned into numbers for durations and numeric format specs.
+Variables that are not set yet, or can't be formatted, render as nothing.
+
+Example
+-------
+>>> templates = DisplayTemplates(imon_api)
+>>> templates.setTemplates(vfd1="{artist}", vfd2="{elapsed!t:%M:%S} {volume}%")
+>>> templates.update({'artist': "Some Artist", 'elapsed': 0, 'volume': 40})
+2
+>>> templates.update({'elapsed': 1})  # only the 2nd line is written
+1
+
+"""
+
+import string
+import time
+
+_formatter = string.Formatter()
+
+# The display lines templates can be set for.
+TEMPLATE_LINES = ('vfd1', 'vfd2', 'lcd')
+
+# The conversion marking a duration in seconds, formatted with strftime.
+DURATION_CONVERSION = 't'
+
+# Format spec types taking a float, and an int.
+FLOAT_TYPES = 'eEfFgGn%'
+INTEGER_TYPES = 'bcdoxX'
+
+def _formatValue(value, spec, conversion):
+    """Formats a field's value, u"" if it can't be."""
+    try:
+        if conversion == DURATION_CONVERSION:
+            return time.strftime(spec, time.gmtime(float(value)))
+        if conversion == 'r':
+            value = repr(value)
+        elif conversion == 's':
+            value = unicode(value)
+        elif spec and isinstance(value, basestring):
+            if spec[-1] in FLOAT_TYPES:
+                value = float(value)
+            elif spec[-1] in INTEGER_TYPES:
+                value = int(float(value))
+        return format(value, spec)
+    except (TypeError, ValueError):
+        return u""
+
+class TextTemplate(object):
+    """
+    A compiled template.
+
+    Attributes
+    ----------
+    source : string
+        The template as given.
+    variables : frozenset
+        The names of the variables the template uses.
+
+    """
+
+    __slots__ = ('source', 'variables', 'parts')
+
+    def __init__(self, source):
+        """
+        Constructor. Parses the template.
+
+        Raises
+        ------
+        ValueError
+            Raised if the template is not valid str.format syntax, or uses
+            an unknown conversion.
+
+        """
+        self.source = source
+        parts = []
+        variables = set()
+        for literal, field, spec, conversion in _formatter.parse(source):
+            if literal:
+                parts.append(literal)
+            if field is None:
+                continue
+            if not field:
+                raise ValueError, "Template fields need a variable name: " + source
+            if conversion not in (None, 'r', 's', DURATION_CONVERSION):
+                raise ValueError, "Unknown conversion !" + conversion + ": " + source
+            name = field.split('.', 1)[0].split('[', 1)[0]
+            variables.add(name)
+            parts.append(self._field(field, name, spec or '', conversion))
+        self.parts = tuple(parts)
+        self.variables = frozenset(variables)
+
+    @staticmethod
+    def _field(field, name, spec, conversion):
+        """Compiles a field into a function of the variables."""
+        if field == name:
+            def get(values):
+                return values[name]
+        else:
+            def get(values):
+                return _formatter.get_field(field, (), values)[0]
+
+        def render(values):
+            try:
+                value = get(values)
+            except (KeyError, AttributeError, IndexError, TypeError):
+                return u""
+            return _formatValue(value, spec, conversion)
+        return render
+
+    def render(self, values):
+        """
+        Parameters
+        ----------
+        values : dict
+            Variable values by name.
+
+        Returns
+        -------
+        string
+            The text of the template.
+
+        """
+        return u"".join([part if isinstance(part, basestring) else part(values) for part in self.parts])
+
+class DisplayTemplates(object):
+    """
+    Templates for the VFD lines and the LCD text, and the variables they use.
+
+    Attributes
+    ----------
+    templates : dict
+        TextTemplate by line, see TEMPLATE_LINES.
+    values : dict
+        The variables by name.
+    users : dict
+        The lines using each variable, by name.
+    shown : dict
+        The text last written by line.
+    pending : set
+        Lines to write that haven't been, because the write failed. They are
+        written with the next update, or when the update is tried again.
+    writes : int
+        The number of writes made.
+
+    """
+
+    def __init__(self, api):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+            The module used to write, normally imon_api.
+
+        """
+        self.api = api
+        self.templates = {}
+        self.values = {}
+        self.users = {}
+        self.shown = {}
+        self.pending = set()
+        self.writes = 0
+
+    def setTemplates(self, vfd1=None, vfd2=None, lcd=None):
+        """
+        Replaces the templates, and writes the lines they render.
+
+        Parameters
+        ----------
+        vfd1, vfd2 : string
+            Templates of the VFD lines, None (or blank) to leave a line alone.
+        lcd : string
+            Template of the LCD text.
+
+        Returns
+        -------
+        int
+            The number of writes made.
+
+        Raises
+        ------
+        ValueError
+            Raised if a template is not valid, nothing changes then.
+
+        """
+        sources = {'vfd1': vfd1, 'vfd2': vfd2, 'lcd': lcd}
+        templates = dict((line, TextTemplate(source)) for line, source in sources.iteritems() if source)
+        users = {}
+        for line, template in templates.iteritems():
+            for name in template.variables:
+                users.setdefault(name, []).append(line)
+        self.templates = templates
+        self.users = users
+        self.shown = {}
+        self.pending = set()
+        return self._write(templates.keys())
+
+    def update(self, values):
+        """
+        Sets variables, and writes the lines using the ones that changed.
+
+        Parameters
+        ----------
+        values : dict
+            New variable values by name.
+
+        Returns
+        -------
+        int
+            The number of writes made.
+
+        """
+        lines = set()
+        current = self.values
+        users = self.users
+        for name, value in values.iteritems():
+            if name in current and current[name] == value:
+                continue
+            current[name] = value
+            if name in users:
+                lines.update(users[name])
+        if not lines and not self.pending:
+            return 0
+        return self._write(lines)
+
+    def clear(self):
+        """Drops the templates and variables, leaving the display as it is."""
+        self.templates = {}
+        self.values = {}
+        self.users = {}
+        self.shown = {}
+        self.pending = set()
+
+    def _write(self, lines):
+        """Renders lines, writing the ones whose text changed."""
+        texts = {}
+        for line in self.pending.union(lines):
+            text = self.templates[line].render(self.values)
+            if self.shown.get(line) != text:
+                texts[line] = text
+        self.pending = set(texts)
+        writes = 0
+        if 'vfd1' in texts and 'vfd2' in texts:
+            self.api.setVfdText(texts['vfd1'], texts['vfd2'])
+            writes += self._written(texts, 'vfd1', 'vfd2')
+        elif 'vfd1' in texts:
+            self.api.setVfdLine(0, texts['vfd1'])
+            writes += self._written(texts, 'vfd1')
+        elif 'vfd2' in texts:
+            self.api.setVfdLine(1, texts['vfd2'])
+            writes += self._written(texts, 'vfd2')
+        if 'lcd' in texts:
+            self.api.setLcdText(texts['lcd'])
+            writes += self._written(texts, 'lcd')
+        return writes
+
+    def _written(self, texts, *lines):
+        """Marks lines as written, returns 1 for the write."""
+        for line in lines:
+            self.shown[line] = texts[line]
+            self.pending.discard(line)
+        self.writes += 1
+        return 1
+
+    def usesVfd(self, names=None):
+        """
+        Returns True if a VFD line has a template.
+
+        Parameters
+        ----------
+        names : iterable
+            Only count the templates using one of these variables, None for
+            all of them.
+
+        """
+        if names is None:
+            lines = self.templates
+        else:
+            lines = set(line for name in names for line in self.users.get(name, ()))
+        return 'vfd1' in lines or 'vfd2' in lines
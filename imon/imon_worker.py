@@ -0,0 +1,354 @@
+"""
+A display owner thread, making the api calls handed to it one at a time, so
+the threads handing them over never wait on the DLL.
+
+Each call handed over returns a DisplayFuture, which is resolved with the
+DSPResult the call returned, or the exception it raised. AsyncDisplay puts
+asyncio futures on top, for callers running an event loop.
+
+The worker keeps callers from waiting, it isn't what keeps the DLL to one
+call at a time: the render loop, scroller, clock, compositor and others
+write from threads of their own, and imon_api makes every DLL call under
+one lock, see imon_api.dllLock.
+
+Example
+-------
+>>> worker = DisplayWorker(imon_api)
+>>> worker.start()
+>>> future = worker.setVfdText("Now Playing", "Some Song")
+>>> future.result(timeout=1)
+DSP_SUCCEEDED
+
+From a coroutine, with asyncio (or trollius, its Python 2 backport, using
+yield From(...) in place of await):
+
+>>> display = AsyncDisplay(worker)
+>>> result = await display.setVfdText("Now Playing", "Some Song")
+
+"""
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+# The imon_api functions that can be called through the worker by name.
+API_FUNCTIONS = (
+    'init',
+    'unInit',
+    'isInited',
+    'isPluginModeEnabled',
+    'setVfdText',
+    'setVfdLine',
+    'setVfdEqData',
+    'setLcdText',
+    'setLcdAllIcons',
+    'setLcdIconBytes',
+    'setLcdOrangeIcon',
+    'setLcdMediaTypeIcon',
+    'setLcdSpeakerIcon',
+    'setLcdVideoCodecIcon',
+    'setLcdAudioCodecIcon',
+    'setLcdAspectRatioIcon',
+    'setLcdEtcIcon',
+    'setLcdProgress',
+    'setLcdEqData',
+)
+
+class DisplayFuture(object):
+    """
+    The pending result of a call handed to a DisplayWorker.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        """Returns True once the call was made."""
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Waits for the call to be made.
+
+        Parameters
+        ----------
+        timeout : float
+            Seconds to wait, None to wait for as long as it takes.
+
+        Returns
+        -------
+        DSPResult
+            Whatever the call returned.
+
+        Raises
+        ------
+        Exception
+            Whatever the call raised, or an Exception if it timed out.
+
+        """
+        if not self._done.wait(timeout):
+            raise Exception, "Timed out waiting for the display"
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Like result, but returns the exception the call raised, or None."""
+        if not self._done.wait(timeout):
+            raise Exception, "Timed out waiting for the display"
+        return self._exception
+
+    def addDoneCallback(self, callback):
+        """
+        Calls callback with this future once the call was made, from the
+        worker thread, or right away if it already was.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _resolve(self, result, exception):
+        with self._lock:
+            self._result = result
+            self._exception = exception
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                # a broken callback mustn't take the worker down
+                pass
+
+class DisplayWorker(object):
+    """
+    Makes the calls handed to it, in order, from a single thread.
+
+    The api functions in API_FUNCTIONS are available as methods that hand
+    the call over and return a DisplayFuture, worker.setVfdText(a, b).
+
+    Attributes
+    ----------
+    api : module
+        Normally imon_api.
+    submitted : int
+        The number of calls handed over.
+
+    """
+
+    def __init__(self, api, maxQueue=0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        api : module
+        maxQueue : int
+            The most calls that can wait, submit blocks once there are that
+            many. 0 for no limit.
+
+        """
+        self.api = api
+        self.submitted = 0
+        self._queue = queue.Queue(maxQueue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts the worker thread, if it is not already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="iMON Display Worker")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Makes every call already handed over, then stops the worker thread.
+        """
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+        if thread is not threading.current_thread():
+            thread.join()
+
+    def isRunning(self):
+        """Returns True if the worker thread is running."""
+        return self._thread is not None
+
+    def isWorkerThread(self):
+        """Returns True when called from the worker thread."""
+        thread = self._thread
+        return thread is not None and thread is threading.current_thread()
+
+    def submit(self, function, *args):
+        """
+        Hands a call over to the worker thread.
+
+        Parameters
+        ----------
+        function : callable or string
+            A callable, or the name of an api function.
+        *args :
+            The arguments passed to the function.
+
+        Returns
+        -------
+        DisplayFuture
+
+        Raises
+        ------
+        Exception
+            Raised if the worker is not running.
+
+        """
+        future = DisplayFuture()
+        with self._lock:
+            if self._thread is None:
+                raise Exception, "The display worker is not running"
+            self._queue.put((future, function, args))
+            self.submitted += 1
+        return future
+
+    def call(self, function, *args):
+        """
+        Makes a call on the worker thread and waits for it. Called from the
+        worker thread itself, the call is made right away.
+
+        Returns
+        -------
+        DSPResult
+            Whatever the call returned.
+
+        Raises
+        ------
+        Exception
+            Whatever the call raised.
+
+        """
+        if self.isWorkerThread():
+            if isinstance(function, basestring):
+                function = getattr(self.api, function)
+            return function(*args)
+        return self.submit(function, *args).result()
+
+    def __getattr__(self, name):
+        if name not in API_FUNCTIONS:
+            raise AttributeError, name
+
+        def submitter(*args):
+            return self.submit(name, *args)
+        submitter.__name__ = name
+        return submitter
+
+    def _run(self):
+        """Worker thread body."""
+        api = self.api
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, function, args = item
+            try:
+                if isinstance(function, basestring):
+                    function = getattr(api, function)
+                result = function(*args)
+            except Exception, msg:
+                future._resolve(None, msg)
+            else:
+                future._resolve(result, None)
+        with self._lock:
+            self._thread = None
+            # calls handed over while stopping won't be made any more
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0]._resolve(None, Exception("The display worker stopped"))
+
+class AsyncDisplay(object):
+    """
+    asyncio front end of a DisplayWorker. The api functions in API_FUNCTIONS
+    are available as methods returning asyncio futures, to be awaited:
+    await display.setVfdText(a, b). The futures resolve on the event loop,
+    with the DSPResult the call returned or the exception it raised.
+
+    Attributes
+    ----------
+    worker : DisplayWorker
+    loop : AbstractEventLoop
+
+    """
+
+    def __init__(self, worker, loop=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        worker : DisplayWorker
+            Has to be started.
+        loop : AbstractEventLoop
+            The loop the futures belong to, the current event loop if None.
+
+        Raises
+        ------
+        ImportError
+            Raised if neither asyncio nor trollius is available.
+
+        """
+        if asyncio is None:
+            raise ImportError, "AsyncDisplay requires asyncio or trollius"
+        self.worker = worker
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+
+    def submit(self, function, *args):
+        """
+        Like DisplayWorker.submit, but returns an asyncio future.
+        """
+        loop = self.loop
+        future = asyncio.Future(loop=loop)
+
+        def transfer(done):
+            if future.cancelled():
+                return
+            exception = done.exception()
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(done.result())
+
+        self.worker.submit(function, *args).addDoneCallback(
+            lambda done: loop.call_soon_threadsafe(transfer, done))
+        return future
+
+    def __getattr__(self, name):
+        if name not in API_FUNCTIONS:
+            raise AttributeError, name
+
+        def submitter(*args):
+            return self.submit(name, *args)
+        submitter.__name__ = name
+        return submitter
@@ -0,0 +1,57 @@
+"""
+setVfdEqData and setLcdEqData fill preallocated buffers, so a frame must not
+make any ctypes objects, see benchmarks/bench_eq_alloc.py.
+"""
+
+import sys
+import unittest
+from array import array
+from os.path import dirname, join, abspath
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, join(ROOT, "benchmarks"))
+import imon
+from bench_eq_alloc import InstanceCounter, LEFT, RIGHT, legacyFrame
+
+FRAMES = 50
+
+def arrayInput(bands):
+    return array('i', [bands[band] for band in range(1, 17)])
+
+def listInput(bands):
+    return [bands[band] for band in range(1, 17)]
+
+class EqAllocationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = imon.useBackend(imon.createBackend('null'))
+        imon.init(0, 0)
+
+    def tearDown(self):
+        imon.unInit()
+        imon.useBackend(None)
+
+    def countFrames(self, function, inputs):
+        """The ctypes objects made by FRAMES frames, alternating inputs so each is written."""
+        with InstanceCounter() as counter:
+            for i in range(FRAMES):
+                function(*inputs[i % len(inputs)])
+        return counter.count
+
+    def testCounterCountsLegacyFrames(self):
+        inputs = [(self.backend, left, right) for left, right in zip(LEFT, RIGHT)]
+        self.assertEqual(self.countFrames(legacyFrame, inputs), 6 * FRAMES)
+
+    def testLcdEqFramesAllocateNothing(self):
+        for convert in (dict, listInput, arrayInput):
+            inputs = [(convert(left), convert(right)) for left, right in zip(LEFT, RIGHT)]
+            self.assertEqual(self.countFrames(imon.setLcdEqData, inputs), 0, convert.__name__)
+
+    def testVfdEqFramesAllocateNothing(self):
+        for convert in (dict, listInput, arrayInput):
+            inputs = [(convert(left),) for left in LEFT]
+            self.assertEqual(self.countFrames(imon.setVfdEqData, inputs), 0, convert.__name__)
+
+if __name__ == "__main__":
+    unittest.main()
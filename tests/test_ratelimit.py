@@ -0,0 +1,67 @@
+"""
+Ordering of rate limited writes to the parts of the display that overlap.
+"""
+
+import sys
+import time
+import unittest
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import imon
+
+# Long enough for every held call to be made.
+SETTLE = 0.3
+
+class OverlappingRegionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = imon.SimulatorBackend()
+        self.sim.inited = True
+        self.sim.pluginMode = True
+        imon.useBackend(self.sim)
+        budgets = dict((key, (20, 1)) for key in imon.DEFAULT_BUDGETS)
+        imon.useRateLimiter(imon.RateLimiter(budgets))
+
+    def tearDown(self):
+        imon.useRateLimiter(None)
+        imon.useBackend(None)
+
+    def testHeldTextDoesNotOverwriteNewerEq(self):
+        imon.setVfdText(u"a", u"b")
+        imon.setVfdText(u"c", u"d")  # held
+        imon.setVfdEqData(range(16))  # admitted
+        time.sleep(SETTLE)
+        self.assertEqual(self.sim.vfdEq, range(16))
+        self.assertEqual(self.sim.vfdLines, [u"a", u"b"])
+        self.assertEqual(imon.lastFrame.keys(), ['vfdEq'])
+        self.assertEqual(imon.shadow.keys(), ['vfdEq'])
+
+    def testHeldEqDoesNotOverwriteNewerText(self):
+        imon.setVfdEqData(range(16))
+        imon.setVfdEqData([50] * 16)  # held
+        imon.setVfdText(u"c", u"d")  # admitted
+        time.sleep(SETTLE)
+        self.assertEqual(self.sim.vfdEq, range(16))
+        self.assertEqual(imon.lastFrame.keys(), ['vfdText'])
+
+    def testHeldAllIconsDoesNotOverwriteNewerIcon(self):
+        imon.setLcdAllIcons(False)
+        imon.setLcdAllIcons(True)  # held
+        imon.setLcdMediaTypeIcon(music=True)  # held behind all icons
+        time.sleep(SETTLE)
+        self.assertEqual(self.sim.icons['mediaType'], (0x80,))
+        self.assertEqual(self.sim.icons['etc'], (0xFF,))
+        self.assertEqual(imon.lastFrame['mediaTypeIcon'], (0x80,))
+        self.assertNotIn('allIcons', imon.lastFrame)
+
+    def testHeldIconIsDroppedByNewerAllIcons(self):
+        imon.setLcdMediaTypeIcon(music=True)
+        imon.setLcdMediaTypeIcon(movie=True)  # held
+        imon.setLcdAllIcons(False)  # admitted
+        time.sleep(SETTLE)
+        self.assertEqual(self.sim.icons['mediaType'], (0,))
+        self.assertEqual(imon.lastFrame.keys(), ['allIcons'])
+
+if __name__ == "__main__":
+    unittest.main()